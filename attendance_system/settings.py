@@ -224,6 +224,89 @@ MAX_CAMERAS = 10
 DETECTION_INTERVAL = 1.0
 YOLO_MODEL_PATH = 'yolov8n.pt'
 
+# Captura: 'grab' decodifica solo los frames que alguien consume, 'read' todos
+CAMERA_CAPTURE_MODE = 'grab'
+CAMERA_DISPLAY_FPS = 5.0
+
+# Inferencia YOLO por lotes entre cámaras
+YOLO_BATCH_INFERENCE = True
+YOLO_MAX_BATCH_SIZE = 8
+YOLO_MAX_BATCH_WAIT = 0.05  # segundos
+
+# Backend de inferencia: 'thread' (en el proceso de Django) o 'process'
+# (workers separados, frames por memoria compartida)
+YOLO_INFERENCE_BACKEND = 'thread'
+YOLO_PROCESS_WORKERS = 2
+YOLO_SHM_SLOTS = 8
+YOLO_SHM_SLOT_BYTES = 1920 * 1080 * 3
+
+# Motor de inferencia: 'torch', 'onnx', 'onnx-int8' u 'openvino'. Los modelos
+# exportados se cachean en YOLO_EXPORT_DIR; INT8 calibra con las imágenes de
+# YOLO_CALIBRATION_DIR. Comparar con: python manage.py compare_engines
+YOLO_ENGINE = 'torch'
+YOLO_IMGSZ = 640
+YOLO_EXPORT_DIR = BASE_DIR / 'model_cache'
+YOLO_CALIBRATION_DIR = BASE_DIR / 'calibration'
+
+# Filtro de movimiento: sin cambios en la escena se reutilizan las últimas
+# detecciones; cada MOTION_MAX_STALENESS segundos se fuerza una inferencia
+MOTION_GATE_ENABLED = True
+MOTION_THRESHOLD = 0.01  # fracción de píxeles que cambian
+MOTION_MAX_STALENESS = 30.0  # segundos
+
+# Presupuesto global de inferencias por segundo, repartido por prioridad
+# (visores, movimiento, ocupación). None desactiva el scheduler.
+INFERENCE_BUDGET = 10.0
+INFERENCE_MIN_RATE = 0.05  # tasa mínima por cámara con sobrecarga
+
+# Tracker: ids estables y cajas previstas entre pasadas de YOLO
+TRACKING_ENABLED = True
+
+# Regiones de interés por cámara: {camera_id: [[(x, y), ...], ...]} en píxeles.
+# YOLO solo procesa el recorte que las contiene y descarta lo que cae fuera.
+CAMERA_ROIS = {}
+
+# Parámetros de predicción (ids COCO: 0 = person). NMS y el post-procesado
+# solo ven estas clases. Con PERSIST_DETECTIONS se añade siempre la clase
+# silla (56), necesaria para la ocupación guardada.
+DETECTION_CLASSES = [0]
+DETECTION_CONF = 0.25
+DETECTION_IOU = 0.7
+
+# Ajustes por cámara sobre los anteriores, p. ej. {'cam_pasillo': {'imgsz': 320}}
+CAMERA_OVERRIDES = {}
+
+# Mapa de asientos (AttendanceDetector): sillas re-detectadas cada N segundos
+# o cuando cambia la escena; por frame solo se detectan personas
+SEAT_MAP_INTERVAL = 300.0
+SEAT_MAP_SCENE_CHANGE = 0.3    # fracción de la miniatura que debe cambiar
+SEAT_OVERLAP_THRESHOLD = 0.3   # fracción del asiento cubierta por la persona
+
+# Historial en memoria de detecciones por cámara (buffer circular)
+DETECTION_HISTORY_FRAMES = 1000   # pasadas de YOLO conservadas
+DETECTION_HISTORY_MAX_AGE = 3600.0  # segundos
+
+# Estadísticas incrementales: constante de tiempo de las medias exponenciales
+STATS_EWMA_TAU = 60.0
+
+# Escritura diferida de muestras de ocupación en DetectionRecord
+PERSIST_DETECTIONS = True
+PERSIST_SAMPLE_INTERVAL = 10.0   # segundos entre muestras por cámara
+PERSIST_BATCH_SIZE = 500         # filas por bulk_create
+PERSIST_FLUSH_INTERVAL = 5.0     # segundos máximos en el buffer
+PERSIST_MAX_QUEUE = 10000        # cola acotada (backpressure)
+
+# Retención (manage.py compact_detections): filas crudas, luego agregados por
+# minuto y después por hora (None = conservar indefinidamente)
+RETENTION_RAW_DAYS = 7
+RETENTION_MINUTE_DAYS = 90
+RETENTION_HOURLY_DAYS = None
+
+# Destino de las muestras de ocupación: 'db' (DetectionRecord), 'timeseries'
+# (archivos append-only por cámara y día leídos con numpy.memmap) o 'both'
+OCCUPANCY_BACKEND = 'db'
+TIMESERIES_DIR = BASE_DIR / 'timeseries'
+
 LOGIN_URL = '/api/web/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/api/web/login/'
@@ -1,7 +1,7 @@
 ﻿# attendance_system/urls.py
 from django.contrib import admin
 from django.urls import path
-from detection import views
+from detection import api_views, views
 
 urlpatterns = [
     # Admin
@@ -31,4 +31,10 @@ urlpatterns = [
     # NUEVAS - Streaming con YOLO bounding boxes
     path('stream/<str:camera_id>/', views.video_feed, name='video_feed'),
     path('api/cameras/<str:camera_id>/stats/', views.camera_stats_api, name='camera_stats_api'),
+    
+    # Historial y estadísticas de ocupación (base de datos)
+    path('api/occupancy/stats/', api_views.occupancy_stats, name='occupancy_stats'),
+    path('api/occupancy/buckets/', api_views.occupancy_buckets, name='occupancy_buckets'),
+    path('api/history/<str:camera_id>/', api_views.detection_history, name='detection_history'),
+    path('api/export/', api_views.export_detections, name='export_detections'),
 ]
\ No newline at end of file
@@ -22,7 +22,7 @@ def camera_detections_view(request, camera_id):
         
         return JsonResponse({
             'camera_id': camera_id,
-            'detections': detections,  # ← SOLO detecciones reales de YOLO
+            'detections': detections.to_dicts(),  # ← SOLO detecciones reales de YOLO
             'count': len(detections),
             'statistics': stats,
             'yolo_enabled': stats.get('yolo_enabled', False),
@@ -119,11 +119,15 @@ def video_feed(request, camera_id):
     URL: /dashboard/stream/<camera_id>/
     """
     def generate():
+        last_sent = None
         while True:
             try:
                 frame_bytes = camera_manager.get_camera_frame(camera_id, with_boxes=True)
                 
-                if frame_bytes:
+                if frame_bytes is not None and frame_bytes is last_sent:
+                    time.sleep(0.02)
+                elif frame_bytes:
+                    last_sent = frame_bytes
                     yield (b'--frame\r\n'
                            b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
                 else:
@@ -150,24 +154,18 @@ def camera_stats_api(request, camera_id):
         if not status:
             return JsonResponse({'error': 'Camera not found'}, status=404)
         
-        detections = camera_manager.get_camera_detections(camera_id)
-        
-        # Contar personas
-        person_count = sum(1 for d in detections if d.get('label') == 'person')
-        
-        # Contar por tipo
-        object_counts = {}
-        for d in detections:
-            label = d.get('label', 'unknown')
-            object_counts[label] = object_counts.get(label, 0) + 1
+        # Estadísticas incrementales (snapshot cacheado por cámara)
+        stats = camera_manager.get_detection_statistics(camera_id)
         
         return JsonResponse({
             'camera_id': camera_id,
             'running': status.get('running', False),
             'fps': status.get('fps', 0),
-            'total_detections': len(detections),
-            'person_count': person_count,
-            'object_counts': object_counts,
+            'total_detections': stats['total_detections'],
+            'person_count': stats['person_count'],
+            'object_counts': stats['label_counts'],
+            'avg_persons_15m': stats['windows']['15m']['avg_persons'],
+            'peak_persons_1h': stats['peak_persons_1h'],
             'timestamp': time.time()
         })
         
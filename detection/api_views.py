@@ -1,17 +1,23 @@
 # detection/api_views.py - VERSIÓN ACTUALIZADA CON YOLO
-from rest_framework import viewsets, status
+from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from django.http import JsonResponse
-import json
-from datetime import datetime, timedelta
+from django.http import StreamingHttpResponse
+from datetime import datetime
 
 # Importar modelos existentes
-from .models import Camera, DetectionRecord, DailyReport
-from .serializers import CameraSerializer, DetectionRecordSerializer
+from .models import Camera, DetectionRecord
+from .serializers import CameraSerializer
 
 # Importar CameraManager para YOLO
 from .camera_manager import camera_manager
+from .export import CONTENT_TYPES, FORMATS, available_formats, iter_export
+from .pagination import (decode_cursor, filter_range, iter_keyset, keyset_page, parse_range,
+                         row_to_dict, stream_json_array)
+from .persistence import sample_from_batch, save_samples
+from .rollups import align_range, bucketed_occupancy, occupancy_totals, parse_bucket
+from . import timeseries
+from .conf import setting
 
 @api_view(['GET'])
 def camera_list(request):
@@ -29,7 +35,7 @@ def camera_list(request):
             camera_id = camera.get('id')
             
             # Buscar información en tiempo real
-            live_info = next((c for c in live_cameras if c['id'] == str(camera_id)), None)
+            live_info = next((c for c in live_cameras if c['camera_id'] == str(camera_id)), None)
             
             if live_info:
                 # Agregar datos en tiempo real
@@ -39,7 +45,7 @@ def camera_list(request):
                 
                 # Obtener detecciones recientes
                 detections = camera_manager.get_camera_detections(str(camera_id), limit=5)
-                camera['recent_detections'] = detections
+                camera['recent_detections'] = detections.to_dicts()
                 camera['detection_count'] = len(detections)
                 
                 # Estadísticas YOLO
@@ -58,13 +64,55 @@ def camera_list(request):
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# Tamaño de página por defecto y máximo del historial de base de datos
+HISTORY_PAGE_SIZE = 500
+HISTORY_MAX_PAGE_SIZE = 5000
+
+
+def _resolve_camera(camera_id):
+    """(pk, nombre) de una cámara dada por nombre (como en vivo) o por pk; (None, camera_id) si no existe"""
+    camera_id = str(camera_id)
+    row = Camera.objects.filter(name=camera_id).values_list('id', 'name').first()
+    if row is None and camera_id.isdigit():
+        row = Camera.objects.filter(pk=int(camera_id)).values_list('id', 'name').first()
+    return row or (None, camera_id)
+
 @api_view(['GET'])
 def detection_history(request, camera_id):
-    """Historial de detecciones combinando DB y YOLO"""
+    """
+    Historial de detecciones combinando DB y YOLO.
+    
+    Los registros de base de datos se paginan por cursor sobre (timestamp, id)
+    (parámetros `cursor` y `page_size`); con `stream=true` y `source=db` se
+    devuelve todo el rango como JSON en streaming, en memoria constante.
+    Con `source=timeseries` se leen las muestras del almacén memmap, también
+    paginadas con `cursor` / `next_cursor`.
+    camera_id puede ser el nombre de la cámara en vivo o el pk en la base de datos.
+    """
     try:
         from_date = request.GET.get('from_date')
         to_date = request.GET.get('to_date')
-        source = request.GET.get('source', 'both')  # 'db', 'yolo', o 'both'
+        source = request.GET.get('source', 'both')  # 'db', 'yolo', 'both' o 'timeseries'
+        
+        try:
+            # Rango semiabierto [from, to): usa el índice (camera, timestamp)
+            start, end = parse_range(from_date, to_date)
+            cursor = request.GET.get('cursor')
+            if cursor:
+                # Cursor de (timestamp, id) en la base de datos o de (ts_ns, n) en el almacén memmap
+                cursor = timeseries.decode_cursor(cursor) if source == 'timeseries' else decode_cursor(cursor)
+            else:
+                cursor = None
+            page_size = min(int(request.GET.get('page_size', HISTORY_PAGE_SIZE)), HISTORY_MAX_PAGE_SIZE)
+            limit = int(request.GET.get('limit', 100))
+            if page_size < 1 or limit < 1:
+                raise ValueError('page_size and limit must be >= 1')
+        except ValueError as e:
+            return Response({'error': str(e) or 'Invalid from_date/to_date'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        # Las filas de DetectionRecord van por pk; el gestor en vivo, por nombre
+        camera_pk, camera_name = _resolve_camera(camera_id)
         
         response_data = {
             'camera_id': camera_id,
@@ -73,71 +121,129 @@ def detection_history(request, camera_id):
         
         # Datos de la base de datos
         if source in ['db', 'both']:
-            records = DetectionRecord.objects.filter(camera_id=camera_id)
+            records = filter_range(DetectionRecord.objects.filter(camera_id=camera_pk), start, end)
             
-            if from_date:
-                records = records.filter(timestamp__date__gte=from_date)
-            if to_date:
-                records = records.filter(timestamp__date__lte=to_date)
-                
-            db_serializer = DetectionRecordSerializer(records.order_by('timestamp'), many=True)
-            response_data['database_records'] = db_serializer.data
-            response_data['db_count'] = records.count()
+            if source == 'db' and request.GET.get('stream', 'false').lower() == 'true':
+                # Camino rápido: tuplas values_list -> JSON, tramo a tramo
+                response = StreamingHttpResponse(
+                    stream_json_array(iter_keyset(records), key='database_records',
+                                      header=response_data, camera_name=camera_name),
+                    content_type='application/json'
+                )
+                response['Cache-Control'] = 'no-cache'
+                return response
+            
+            rows, next_cursor = keyset_page(records, cursor, page_size)
+            response_data['database_records'] = [row_to_dict(row, camera_name=camera_name) for row in rows]
+            response_data['db_count'] = len(rows)
+            response_data['next_cursor'] = next_cursor
+        
+        # Muestras del almacén de series temporales (memmap, sin ORM)
+        if source == 'timeseries':
+            samples, next_cursor = timeseries.get_store().read_page(
+                camera_name, start, end, cursor, limit=page_size)
+            response_data['timeseries_records'] = timeseries.records_to_dicts(camera_name, samples)
+            response_data['timeseries_count'] = len(samples)
+            response_data['next_cursor'] = timeseries.encode_cursor(next_cursor) if next_cursor else None
         
         # Datos de YOLO en tiempo real
         if source in ['yolo', 'both']:
-            # Historial de YOLO
-            yolo_history = camera_manager.get_detection_history(str(camera_id), limit=100)
-            
-            # Filtrar por fecha si es necesario
-            if from_date or to_date:
-                filtered = []
-                from_datetime = datetime.fromisoformat(from_date) if from_date else None
-                to_datetime = datetime.fromisoformat(to_date) if to_date else None
-                
-                for det in yolo_history:
-                    try:
-                        det_time = datetime.fromisoformat(det.get('timestamp', ''))
-                        
-                        include = True
-                        if from_datetime and det_time < from_datetime:
-                            include = False
-                        if to_datetime and det_time > to_datetime:
-                            include = False
-                        
-                        if include:
-                            filtered.append(det)
-                    except:
-                        continue
-                
-                yolo_history = filtered
+            # Historial de YOLO: búsqueda binaria por rango en el buffer de la cámara
+            batches = camera_manager.get_detection_history(
+                camera_name, limit=limit,
+                start=start.timestamp() if start else None,
+                end=end.timestamp() - 1e-6 if end else None,
+            )
+            yolo_history = [det for batch in batches for det in batch.to_dicts()]
             
             response_data['yolo_detections'] = yolo_history
+            response_data['yolo_frames'] = len(batches)
             response_data['yolo_count'] = len(yolo_history)
             
             # Detecciones recientes
-            recent_detections = camera_manager.get_camera_detections(str(camera_id), limit=20)
-            response_data['recent_detections'] = recent_detections
+            recent_detections = camera_manager.get_camera_detections(camera_name, limit=20)
+            response_data['recent_detections'] = recent_detections.to_dicts()
         
         return Response(response_data)
         
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+def export_detections(request):
+    """
+    Exporta DetectionRecord en streaming. Parámetros: file_format (csv, parquet,
+    arrow), cameras (nombres separados por comas), from_date, to_date.
+    Parquet y Arrow requieren pyarrow (opcional); sin él se responde 400 con
+    los formatos disponibles.
+    """
+    fmt = request.GET.get('file_format', 'csv')
+    if fmt not in available_formats():
+        error = f'Unsupported format: {fmt}'
+        if fmt in FORMATS:
+            error = f'Format {fmt} requires the optional pyarrow package (pip install pyarrow)'
+        return Response({'error': error, 'available': list(available_formats())},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        start, end = parse_range(request.GET.get('from_date'), request.GET.get('to_date'))
+    except ValueError:
+        return Response({'error': 'Invalid from_date/to_date'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    cameras = [c for c in request.GET.get('cameras', '').split(',') if c] or None
+    extension = {'csv': 'csv', 'parquet': 'parquet', 'arrow': 'arrows'}[fmt]
+    response = StreamingHttpResponse(iter_export(fmt, cameras, start, end),
+                                     content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="detections.{extension}"'
+    return response
+
+@api_view(['GET'])
+def occupancy_buckets(request):
+    """
+    Ocupación agregada por buckets de tiempo para gráficos. Parámetros:
+    from_date y to_date (obligatorios), bucket (1m..1d, p. ej. 15m), cameras
+    (nombres separados por comas) y storage ('db' o 'timeseries'; por
+    defecto según OCCUPANCY_BACKEND).
+    """
+    from_date = request.GET.get('from_date')
+    to_date = request.GET.get('to_date')
+    if not from_date or not to_date:
+        return Response({'error': 'from_date and to_date are required'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        start, end = parse_range(from_date, to_date)
+        bucket_seconds = parse_bucket(request.GET.get('bucket', '1h'))
+        cameras = [c for c in request.GET.get('cameras', '').split(',') if c] or None
+        default_storage = 'timeseries' if setting('OCCUPANCY_BACKEND', 'db') == 'timeseries' else 'db'
+        if request.GET.get('storage', default_storage) == 'timeseries':
+            start, end = align_range(start, end, bucket_seconds)
+            store = timeseries.get_store()
+            data = {
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'bucket_seconds': bucket_seconds,
+                'source_granularity': 'timeseries',
+                'cameras': {camera: store.aggregate(camera, start, end, bucket_seconds)
+                            for camera in (cameras or store.cameras())},
+            }
+        else:
+            data = bucketed_occupancy(start, end, bucket_seconds, cameras)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return Response(data)
+
 @api_view(['GET'])
 def occupancy_stats(request):
     """Estadísticas combinadas de ocupación"""
     try:
-        from django.db.models import Avg, Max, Count
-        
-        # Estadísticas de base de datos
-        db_stats = DetectionRecord.objects.values('camera__name').annotate(
-            avg_occupancy=Avg('occupancy_rate'),
-            peak_occupancy=Max('person_count'),
-            total_records=Count('id')
-        )
-        
-        db_stats_list = list(db_stats)
+        if setting('OCCUPANCY_BACKEND', 'db') == 'timeseries':
+            # Agregados directos sobre los archivos memmap de cada cámara
+            store = timeseries.get_store()
+            db_stats_list = [store.summary(camera) for camera in store.cameras()]
+        else:
+            # Estadísticas de base de datos: rollups diarios + filas aún sin agregar
+            db_stats_list = occupancy_totals()
         
         # Estadísticas de YOLO en tiempo real
         live_cameras = camera_manager.get_cameras_info()
@@ -147,7 +253,7 @@ def occupancy_stats(request):
         active_yolo_cameras = 0
         
         for camera in live_cameras:
-            camera_id = camera['id']
+            camera_id = camera['camera_id']
             person_count = camera.get('person_count', 0)
             
             stats = camera_manager.get_detection_statistics(camera_id)
@@ -158,6 +264,8 @@ def occupancy_stats(request):
                 'total_detections': stats.get('total_detections', 0),
                 'avg_confidence': stats.get('avg_confidence', 0),
                 'last_hour_count': stats.get('last_hour_count', 0),
+                'peak_persons_1h': stats.get('peak_persons_1h', 0),
+                'ewma_persons': stats.get('ewma_persons', 0.0),
                 'status': camera.get('status', 'unknown')
             })
             
@@ -207,7 +315,7 @@ def yolo_detections(request, camera_id):
         
         response_data = {
             'camera_id': camera_id,
-            'detections': detections,
+            'detections': detections.to_dicts(),
             'statistics': stats,
             'count': len(detections),
             'timestamp': datetime.now().isoformat()
@@ -247,7 +355,12 @@ def yolo_frame(request, camera_id):
 
 @api_view(['POST'])
 def sync_yolo_to_db(request):
-    """Sincronizar detecciones YOLO a base de datos"""
+    """
+    Sincronizar detecciones YOLO a base de datos. Con la escritura diferida
+    activa (PERSIST_DETECTIONS) las muestras ya se guardan solas y esto no
+    hace nada; si no, guarda solo las pasadas posteriores a la última
+    sincronización de la cámara.
+    """
     try:
         data = request.data
         camera_id = data.get('camera_id')
@@ -256,46 +369,34 @@ def sync_yolo_to_db(request):
             return Response({'error': 'camera_id is required'}, 
                           status=status.HTTP_400_BAD_REQUEST)
         
-        # Obtener detecciones recientes de YOLO
-        detections = camera_manager.get_camera_detections(str(camera_id), limit=50)
-        
-        # Guardar en base de datos
-        saved_count = 0
-        for detection in detections:
-            try:
-                # Buscar o crear cámara en DB
-                camera_obj, created = Camera.objects.get_or_create(
-                    id=camera_id,
-                    defaults={
-                        'name': f'Camera_{camera_id}',
-                        'stream_url': f'http://youtube.com/watch?v={camera_id}',
-                        'is_active': True
-                    }
-                )
-                
-                # Crear registro de detección
-                DetectionRecord.objects.create(
-                    camera=camera_obj,
-                    person_count=1,  # Cada detección es una persona
-                    occupancy_rate=100,  # Placeholder
-                    confidence=detection.get('confidence', 0.5),
-                    timestamp=datetime.fromisoformat(detection.get('timestamp')),
-                    metadata=json.dumps(detection)
-                )
-                
-                saved_count += 1
-                
-            except Exception as e:
-                print(f"Error saving detection: {e}")
-                continue
+        cam = camera_manager.cameras.get(str(camera_id))
+        if cam is None:
+            return Response({'error': 'Camera not found'},
+                          status=status.HTTP_404_NOT_FOUND)
+        
+        if camera_manager.writer is not None:
+            return Response({
+                'message': 'Detections are already persisted by the background writer',
+                'camera_id': camera_id,
+                'saved_count': 0,
+                'total_detections': 0,
+            })
+        
+        # Una muestra de ocupación por pasada reciente aún no sincronizada, en un único bulk_create
+        batches = camera_manager.get_detection_history(str(camera_id), limit=int(data.get('limit', 50)))
+        batches = [batch for batch in batches if batch.timestamp_ns > cam.synced_until_ns]
+        samples = [sample_from_batch(cam.camera_id, cam.original_source, batch) for batch in batches]
+        saved_count = save_samples(samples)
+        if batches:
+            cam.synced_until_ns = batches[-1].timestamp_ns
         
         return Response({
             'message': f'Synced {saved_count} detections to database',
             'camera_id': camera_id,
             'saved_count': saved_count,
-            'total_detections': len(detections)
+            'total_detections': sum(len(batch) for batch in batches)
         })
         
     except Exception as e:
         return Response({'error': str(e)}, 
-                       status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+                       status=status.HTTP_500_INTERNAL_SERVER_ERROR)
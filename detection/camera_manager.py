@@ -1,6 +1,7 @@
 # detection/camera_manager.py - VERSIÓN DEFINITIVA
 import threading
 import time
+from collections import deque
 from datetime import datetime
 import traceback
 
@@ -12,44 +13,184 @@ except Exception:
 import numpy as np
 import logging
 
+from . import model_registry
+from .conf import setting as _setting
+from .detections import DetectionBatch
+from .history import DetectionHistory
+from .inference import (CHAIR_CLASS, PERSON_CLASS, BatchInferenceService, predict_kwargs,
+                        predict_options, result_to_arrays)
+from .motion import MotionGate
+from .persistence import DetectionWriter, sample_from_batch
+from .roi import RegionMask
+from .scheduler import DetectionScheduler
+from .stats import RollingStats
+from .tracker import Tracker
+from .process_inference import ProcessInferenceService
+
 logger = logging.getLogger(__name__)
 
-# YOLO detection
-DETECTION_ENABLED = False
-YOLO_MODEL = None
-YOLO_MODEL_PATH = "yolov8n.pt"
+# Modos de captura: 'read' decodifica todo, 'grab' solo lo que se consume
+CAPTURE_MODES = ('read', 'grab')
 
-try:
-    from ultralytics import YOLO
-    try:
-        YOLO_MODEL = YOLO(YOLO_MODEL_PATH)
-        DETECTION_ENABLED = True
-        print("[OK] Ultralytics YOLO cargado correctamente - DETECCION REAL HABILITADA")
-    except Exception as e:
-        print(f"[ERROR] No se pudo cargar YOLO: {e}")
-        DETECTION_ENABLED = False
-except Exception:
-    print("[ERROR] ultralytics no está instalado - pip install ultralytics")
-    DETECTION_ENABLED = False
+# Protocolos en vivo: el propio stream marca el ritmo de grab()/read()
+LIVE_SCHEMES = ('rtsp://', 'rtsps://', 'rtmp://', 'udp://', 'tcp://', 'srt://')
+
+# FPS supuesto para archivos/HTTP progresivo que no informan CAP_PROP_FPS
+DEFAULT_SOURCE_FPS = 25.0
+
+# Segundos sin peticiones de frame tras los cuales no hay visor activo
+VIEWER_TIMEOUT = 5.0
+
+# Opciones por cámara configurables desde CameraManager
+CAMERA_OPTIONS = ('detection_interval', 'display_fps', 'capture_mode', 'motion_gating',
+                  'priority', 'tracking', 'roi', 'classes', 'conf_threshold',
+                  'iou_threshold', 'imgsz')
+
+# Ventana (segundos) para medir la tasa real de detecciones
+RATE_WINDOW = 30.0
+
+
+def _draw_detections(frame, detections):
+    """Dibuja bounding boxes y etiquetas sobre el frame (in-place)"""
+    boxes = detections.xyxy.astype(np.int32).tolist()
+    for (x1, y1, x2, y2), conf, class_id, track_id in zip(
+            boxes, detections.conf.tolist(), detections.cls.tolist(), detections.track_ids.tolist()):
+        label = detections.label_of(class_id)
+        
+        # Verde para personas, naranja para otros
+        color = (0, 255, 0) if label == 'person' else (0, 165, 255)
+        
+        # Rectángulo
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        
+        # Etiqueta (con id de track si lo hay)
+        text = f"{label} {conf:.2f}"
+        if track_id >= 0:
+            text = f"#{track_id} {text}"
+        (text_width, text_height), baseline = cv2.getTextSize(
+            text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2
+        )
+        cv2.rectangle(frame, (x1, y1 - text_height - 5), 
+                    (x1 + text_width, y1), color, -1)
+        cv2.putText(frame, text, (x1, y1 - 5), 
+                  cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+    return frame
+
+
+def _draw_regions(frame, roi):
+    """Contorno de las regiones de interés (in-place)"""
+    polygons = [p.astype(np.int32).reshape(-1, 1, 2) for p in roi.polygons]
+    cv2.polylines(frame, polygons, True, (255, 200, 0), 1)
+    return frame
 
 
 class Camera:
-    def __init__(self, camera_id: str, source: str, detection_interval: float = 1.0):
+    def __init__(self, camera_id: str, source: str, detection_interval: float = 1.0,
+                 display_fps: float = 5.0, capture_mode: str = 'grab',
+                 motion_gating: bool = True, priority: float = 1.0, tracking: bool = True,
+                 roi=None, classes=None, conf_threshold: float = None,
+                 iou_threshold: float = None, imgsz: int = None):
+        if capture_mode not in CAPTURE_MODES:
+            raise ValueError(f"capture_mode inválido: {capture_mode}")
         self.camera_id = camera_id
         self.source = source
         self.original_source = source
         self.detection_interval = detection_interval
+        self.display_fps = display_fps
+        self.capture_mode = capture_mode
+        self.motion_gating = motion_gating
+        self.priority = priority
+        self.tracking = tracking
+        self.tracker = Tracker()
+        self.roi = roi
+
+        # Parámetros de predicción: clases permitidas, umbrales y tamaño de
+        # entrada (None = valor por defecto de ultralytics)
+        self.classes = classes
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.imgsz = imgsz
+        self.scheduler = None
+        self._inference_times = deque()
+        self.motion_gate = MotionGate(
+            threshold=_setting('MOTION_THRESHOLD', 0.01),
+            max_staleness=_setting('MOTION_MAX_STALENESS', 30.0),
+        )
         self._capture = None
+        self._frame_period = 0.0
+        self._packet_due = 0.0
         self._thread = None
+        self._detect_thread = None
         self._running = False
         self._lock = threading.RLock()
-        self.last_frame = None
         self.last_frame_ts = None
-        self.last_detections = []
+        self.last_detections = DetectionBatch.empty(camera_id)
+        self.history = DetectionHistory(
+            max_frames=_setting('DETECTION_HISTORY_FRAMES', 1000),
+            max_age=_setting('DETECTION_HISTORY_MAX_AGE', 3600.0),
+        )
+        self.stats = RollingStats(tau=_setting('STATS_EWMA_TAU', 60.0))
+
+        # Persistencia diferida: una muestra de ocupación cada persist_interval
+        self.writer = None
+        self.persist_interval = _setting('PERSIST_SAMPLE_INTERVAL', 10.0)
+        self._last_persist = 0.0
+        self.synced_until_ns = 0   # última pasada guardada por sync_yolo_to_db
         self.last_error = None
         self.fps = 0.0
         self._last_detection_time = 0.0
         self.status = 'stopped'
+        self.inference_service = None
+
+        # Handoff captura -> detección: solo se conserva el frame más reciente
+        self._latest_raw = None
+        self._latest_raw_time = 0.0
+        self.frame_seq = 0
+        self._new_frame = threading.Event()
+        self._detected_seq = 0
+        self.frames_dropped = 0
+        self.failed_passes = 0
+        self.detection_latency = 0.0
+        self._detect_busy = False
+
+        # Decodificación bajo demanda (modo 'grab')
+        self._last_view_time = 0.0
+        self._last_display_decode = 0.0
+        self.frames_grabbed = 0
+        self.frames_decoded = 0
+
+        # JPEG bajo demanda, cacheado por número de secuencia
+        self._encode_lock = threading.Lock()
+        self._jpeg_seq = 0
+        self._jpeg_bytes = None
+        self.jpeg_requests = 0
+        self.jpeg_encodes = 0
+        self.jpeg_cache_hits = 0
+
+        # JPEG anotado, cacheado por (secuencia de frame, versión de detecciones)
+        self.detection_version = 0
+        self._annotate_lock = threading.Lock()
+        self._annotated_key = None
+        self._annotated_bytes = None
+        self.annotated_renders = 0
+        self.annotated_cache_hits = 0
+
+    @property
+    def roi(self):
+        return self._roi
+
+    @roi.setter
+    def roi(self, polygons):
+        """Polígonos de interés en píxeles (None = frame completo)"""
+        if polygons is None or isinstance(polygons, RegionMask):
+            self._roi = polygons
+        else:
+            self._roi = RegionMask(polygons)
+        if hasattr(self, 'motion_gate'):
+            # El fondo del detector de movimiento depende del recorte y el
+            # overlay dibuja las regiones
+            self.motion_gate.reset()
+            self._annotated_key = None
 
     def start(self):
         with self._lock:
@@ -58,12 +199,20 @@ class Camera:
                 return True
             self._running = True
             self.status = 'starting'
+            self._new_frame.clear()
+            self.tracker.reset()
             self._thread = threading.Thread(
                 target=self._loop_safe, 
                 name=f"CameraThread-{self.camera_id}", 
                 daemon=True
             )
+            self._detect_thread = threading.Thread(
+                target=self._detect_loop_safe,
+                name=f"DetectThread-{self.camera_id}",
+                daemon=True
+            )
             self._thread.start()
+            self._detect_thread.start()
             print(f"[{self.camera_id}] Thread iniciado")
             return True
 
@@ -74,9 +223,15 @@ class Camera:
             self._running = False
             self.status = 'stopped'
         
+        # Despertar al hilo de detección para que termine
+        self._new_frame.set()
+        
         if self._thread and self._thread.is_alive():
             self._thread.join(timeout=3.0)
         
+        if self._detect_thread and self._detect_thread.is_alive():
+            self._detect_thread.join(timeout=3.0)
+        
         if self._capture:
             try:
                 self._capture.release()
@@ -155,6 +310,39 @@ class Camera:
         
         raise RuntimeError("No se pudo abrir VideoCapture después de 3 intentos")
 
+    def _is_live_source(self) -> bool:
+        source = str(self.source).strip().lower()
+        return source.isdigit() or source.startswith(LIVE_SCHEMES)
+
+    def _source_frame_period(self) -> float:
+        """
+        Segundos por frame para fuentes que no se marcan solas (archivos,
+        HTTP progresivo como el de YouTube): sin esto grab() corre al 100% de
+        CPU hasta el final del archivo. 0 para fuentes en vivo.
+        """
+        if self._is_live_source():
+            return 0.0
+        fps = self._capture.get(cv2.CAP_PROP_FPS) or 0.0
+        if not 1.0 <= fps <= 240.0:
+            fps = DEFAULT_SOURCE_FPS
+        return 1.0 / fps
+
+    def _pace(self):
+        """Espera hasta la hora de reloj que le toca al paquete recién leído"""
+        if not self._frame_period:
+            return
+        self._packet_due += self._frame_period
+        wait = self._packet_due - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        elif wait < -1.0:
+            # Muy atrasados (decodificación lenta, pausa): no acumular deuda
+            self._packet_due = time.time()
+
+    def _start_pacing(self):
+        self._frame_period = self._source_frame_period()
+        self._packet_due = time.time()
+
     def _loop_safe(self):
         """Loop principal PROTEGIDO - NO mata el servidor si falla"""
         try:
@@ -171,9 +359,10 @@ class Camera:
             print(f"[{self.camera_id}] Thread terminado (servidor OK)")
 
     def _loop(self):
-        """Loop principal"""
+        """Loop de captura: lee frames sin esperar a YOLO"""
         try:
             self._capture = self._open_capture()
+            self._start_pacing()
             with self._lock:
                 self.status = 'running'
         except Exception as e:
@@ -187,7 +376,25 @@ class Camera:
 
         while self._running:
             try:
-                ret, frame = self._capture.read()
+                if self.capture_mode == 'grab':
+                    # grab() mantiene el stream sincronizado sin decodificar
+                    ret = self._capture.grab()
+                    frame = None
+                    if ret:
+                        self.frames_grabbed += 1
+                        self._pace()
+                        if not self._needs_decode():
+                            frame_count += 1
+                            elapsed = time.time() - read_start
+                            if elapsed > 0:
+                                self.fps = frame_count / elapsed
+                            continue
+                        ret, frame = self._capture.retrieve()
+                else:
+                    ret, frame = self._capture.read()
+                    if ret:
+                        self.frames_grabbed += 1
+                        self._pace()
                 
                 if not ret or frame is None:
                     print(f"[{self.camera_id}] Sin frame - reconectando...")
@@ -198,6 +405,7 @@ class Camera:
                     time.sleep(0.5)
                     try:
                         self._capture = self._open_capture()
+                        self._start_pacing()
                         continue
                     except Exception as e:
                         with self._lock:
@@ -207,35 +415,21 @@ class Camera:
                         continue
 
                 frame_count += 1
+                self.frames_decoded += 1
                 elapsed = time.time() - read_start
                 if elapsed > 0:
                     self.fps = frame_count / elapsed
 
-                # Encode JPEG
-                try:
-                    _, buf = cv2.imencode('.jpg', frame)
-                    jpeg_bytes = buf.tobytes()
-                    with self._lock:
-                        self.last_frame = jpeg_bytes
-                        self.last_frame_ts = datetime.utcnow().isoformat() + "Z"
-                        if self.status != 'running':
-                            self.status = 'running'
-                except Exception as e:
-                    print(f"[{self.camera_id}] Error JPEG: {e}")
-
-                # Detección YOLO
-                now = time.time()
-                if (now - self._last_detection_time) >= self.detection_interval:
-                    self._last_detection_time = now
-                    try:
-                        detections = self._run_detection(frame)
-                        with self._lock:
-                            self.last_detections = detections
-                    except Exception as e:
-                        with self._lock:
-                            self.last_detections = []
-
-                time.sleep(0.01)
+                # Guardar el frame crudo (reemplaza el anterior); el JPEG se
+                # genera solo si alguien lo pide
+                with self._lock:
+                    self._latest_raw = frame
+                    self._latest_raw_time = time.time()
+                    self.frame_seq += 1
+                    self.last_frame_ts = datetime.utcnow().isoformat() + "Z"
+                    if self.status != 'running':
+                        self.status = 'running'
+                self._new_frame.set()
 
             except Exception as e:
                 print(f"[{self.camera_id}] Error loop: {e}")
@@ -253,50 +447,281 @@ class Camera:
         with self._lock:
             self.status = 'stopped'
 
-    def _run_detection(self, frame):
-        """Detección YOLO con logs detallados"""
-        if not DETECTION_ENABLED or YOLO_MODEL is None:
-            return []
+    def get_jpeg(self):
+        """JPEG del frame más reciente, codificado una sola vez por secuencia"""
+        with self._lock:
+            frame = self._latest_raw
+            seq = self.frame_seq
+            self.jpeg_requests += 1
+            if frame is None:
+                return None
+            if self._jpeg_seq == seq:
+                self.jpeg_cache_hits += 1
+                return self._jpeg_bytes
+
+        # Codificar fuera del lock de la cámara; _encode_lock evita que
+        # varios visores codifiquen el mismo frame a la vez
+        with self._encode_lock:
+            with self._lock:
+                if self._jpeg_seq == seq:
+                    self.jpeg_cache_hits += 1
+                    return self._jpeg_bytes
+            ok, buf = cv2.imencode('.jpg', frame)
+            if not ok:
+                return None
+            jpeg_bytes = buf.tobytes()
+            with self._lock:
+                self.jpeg_encodes += 1
+                if seq >= self._jpeg_seq:
+                    self._jpeg_seq = seq
+                    self._jpeg_bytes = jpeg_bytes
+            return jpeg_bytes
+
+    def get_annotated_jpeg(self):
+        """JPEG con bounding boxes, renderizado una vez por (frame, detecciones)"""
+        with self._lock:
+            frame = self._latest_raw
+            frame_time = self._latest_raw_time
+            detections = self.last_detections
+            key = (self.frame_seq, self.detection_version)
+            if frame is not None and len(detections) and self._annotated_key == key:
+                self.annotated_cache_hits += 1
+                return self._annotated_bytes
+
+        if frame is None or not len(detections):
+            return self.get_jpeg()
+
+        # Dibujar directamente sobre una copia del frame crudo, fuera del lock
+        with self._annotate_lock:
+            with self._lock:
+                if self._annotated_key == key:
+                    self.annotated_cache_hits += 1
+                    return self._annotated_bytes
+            try:
+                if self.tracking:
+                    # Cajas con track en la posición prevista para el frame
+                    detections = self.tracked_detections(detections, frame_time)
+                annotated = frame.copy()
+                if self.roi is not None:
+                    _draw_regions(annotated, self.roi)
+                annotated = _draw_detections(annotated, detections)
+                ok, buf = cv2.imencode('.jpg', annotated)
+            except Exception as e:
+                print(f"[{self.camera_id}] Error dibujando boxes: {e}")
+                ok = False
+            if not ok:
+                return self.get_jpeg()
+            jpeg_bytes = buf.tobytes()
+            with self._lock:
+                self.annotated_renders += 1
+                if self._annotated_key is None or key >= self._annotated_key:
+                    self._annotated_key = key
+                    self._annotated_bytes = jpeg_bytes
+            return jpeg_bytes
+
+    def tracked_detections(self, detections, ts=None):
+        """
+        Copia de `detections` con las cajas que tienen track movidas a la
+        posición prevista en `ts`. Las que no tienen track (baja confianza
+        sin pareja) se dibujan donde las vio YOLO: el overlay muestra todas.
+        """
+        records = detections.records.copy()
+        predicted = self.tracker.predict_ids(records['track_id'], ts)
+        moved = ~np.isnan(predicted[:, 0])
+        records['bbox'][moved] = predicted[moved]
+        return DetectionBatch.from_records(self.camera_id, records, detections.timestamp_ns, detections.names)
+
+    def jpeg_cache_stats(self):
+        with self._lock:
+            requests = self.jpeg_requests
+            encodes = self.jpeg_encodes
+            hits = self.jpeg_cache_hits
+        return {
+            'jpeg_requests': requests,
+            'jpeg_encodes': encodes,
+            'jpeg_cache_hits': hits,
+            'jpeg_hit_rate': round(hits / requests, 3) if requests else 0.0,
+            'annotated_renders': self.annotated_renders,
+            'annotated_cache_hits': self.annotated_cache_hits,
+        }
+
+    def mark_viewer(self):
+        """Registra que alguien está mirando la cámara"""
+        self._last_view_time = time.time()
+
+    def has_viewers(self) -> bool:
+        return (time.time() - self._last_view_time) < VIEWER_TIMEOUT
+
+    def _needs_decode(self) -> bool:
+        """Decide si el paquete recién capturado debe decodificarse"""
+        if self.frame_seq == 0:
+            return True
+
+        now = time.time()
+
+        # Detección: solo si está libre, sin frame pendiente y le toca
+        if (not self._detect_busy and not self._new_frame.is_set() and
+                now - self._last_detection_time >= self.current_detection_interval()):
+            return True
+
+        # Visores: limitado a display_fps
+        if self.has_viewers() and self.display_fps > 0:
+            if now - self._last_display_decode >= 1.0 / self.display_fps:
+                self._last_display_decode = now
+                return True
+
+        return False
+
+    def current_detection_interval(self) -> float:
+        if self.scheduler is None:
+            return self.detection_interval
+        return self.scheduler.interval_for(self)
+
+    def effective_detection_rate(self) -> float:
+        """Inferencias reales por segundo en la última ventana"""
+        cutoff = time.time() - RATE_WINDOW
+        times = self._inference_times
+        while times and times[0] < cutoff:
+            times.popleft()
+        return len(times) / RATE_WINDOW
+
+    def _detect_loop_safe(self):
+        """Loop de detección PROTEGIDO - un fallo de YOLO no detiene la captura"""
+        try:
+            self._detect_loop()
+        except Exception as e:
+            print(f"[{self.camera_id}] ❌ ERROR detección: {e}")
+            with self._lock:
+                self.last_error = str(e)
+
+    def _detect_loop(self):
+        """Loop de detección: toma siempre el frame más nuevo disponible"""
+        while self._running:
+            # Respetar el intervalo (fijo o asignado por el scheduler) sin
+            # bloquear la captura
+            wait = self._last_detection_time + self.current_detection_interval() - time.time()
+            if wait > 0:
+                time.sleep(min(wait, 0.5))
+                continue
+
+            if not self._new_frame.wait(timeout=0.5):
+                continue
+            if not self._running:
+                break
+
+            with self._lock:
+                self._new_frame.clear()
+                frame = self._latest_raw
+                frame_time = self._latest_raw_time
+                seq = self.frame_seq
+                if self._detected_seq:
+                    # Frames que llegaron y fueron reemplazados sin analizarse
+                    self.frames_dropped += max(seq - self._detected_seq - 1, 0)
+                self._detected_seq = seq
+
+            if frame is None:
+                continue
+
+            self._last_detection_time = time.time()
+
+            # Solo la zona de interés: recorte sin copia y su offset
+            roi = self.roi
+            region, offset = roi.crop(frame) if roi is not None else (frame, (0, 0))
+
+            # Escena sin cambios: reutilizar las detecciones anteriores
+            if self.motion_gating and not self.motion_gate.should_detect(region):
+                continue
+
+            self._detect_busy = True
+            started = time.time()
+            try:
+                detections = self._run_detection(region, roi, offset)
+            except Exception:
+                detections = None
+            finally:
+                self._detect_busy = False
+
+            if detections is None:
+                self._record_failure()
+            else:
+                self._record_pass(detections, frame_time, started)
+
+    def _record_pass(self, detections, frame_time, started=None):
+        """Publica una pasada correcta: tracker, overlay, historial, estadísticas y persistencia"""
+        self._inference_times.append(time.time() if started is None else started)
+        if self.tracking:
+            # Ids estables entre pasadas; el overlay usa las cajas previstas
+            detections.records['track_id'] = self.tracker.update(
+                detections.xyxy, detections.conf, detections.cls, frame_time)
+
+        with self._lock:
+            self.last_detections = detections
+            self.detection_version += 1
+            self.detection_latency = time.time() - frame_time
+        self.history.append(detections)
+        # Con tracking, las personas son los tracks confirmados: un falso
+        # positivo aislado o un parpadeo de una pasada no mueve el conteo
+        persons = self.tracker.confirmed_count(PERSON_CLASS) if self.tracking else None
+        self.stats.update(detections, persons=persons)
+        self._persist(detections)
+
+    def _record_failure(self):
+        """
+        Pasada fallida (modelo no disponible, error o timeout): el overlay se
+        vacía, pero no cuenta como una muestra de 0 personas ni en el
+        historial, ni en las estadísticas, ni en la tasa efectiva, ni en la
+        base de datos.
+        """
+        with self._lock:
+            self.failed_passes += 1
+            if len(self.last_detections):
+                self.last_detections = DetectionBatch.empty(self.camera_id)
+                self.detection_version += 1
+
+    def _persist(self, detections):
+        """Encola una muestra para DetectionRecord (puede bloquear: backpressure)"""
+        if self.writer is None or detections.timestamp - self._last_persist < self.persist_interval:
+            return
+        self._last_persist = detections.timestamp
+        self.writer.submit(sample_from_batch(self.camera_id, self.original_source, detections))
+
+    def predict_options(self):
+        classes = self.classes
+        if self.writer is not None and classes is not None and CHAIR_CLASS not in classes:
+            # La ocupación guardada es personas / sillas: sin sillas sería siempre 0
+            classes = [*classes, CHAIR_CLASS]
+        return predict_options(classes, self.conf_threshold, self.iou_threshold, self.imgsz)
+
+    def _run_detection(self, frame, roi=None, offset=(0, 0)):
+        """Detección YOLO: extracción vectorizada a un DetectionBatch (None si falla)"""
+        if not model_registry.is_available():
+            return None
 
         try:
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = YOLO_MODEL(rgb, verbose=False)
+            # ultralytics espera BGR para arrays NumPy: el frame va tal cual
+            options = self.predict_options()
+            if self.inference_service is not None:
+                # Servicio compartido (lotes en hilo o workers de proceso)
+                xyxy, confs, classes = self.inference_service.infer(frame, timeout=30.0, options=options)
+                names = self.inference_service.names
+            else:
+                model = model_registry.get_model()
+                result = model(frame, verbose=False, **predict_kwargs(options))[0]
+                xyxy, confs, classes = result_to_arrays(result)
+                names = model.names
+
+            if roi is not None:
+                # Coordenadas del recorte -> frame completo, fuera lo que no esté en la ROI
+                xyxy, confs, classes = roi.filter(xyxy, confs, classes, offset)
             
-            detections = []
-            for r in results:
-                boxes = r.boxes
-                if boxes is None:
-                    continue
-                    
-                for b in boxes:
-                    try:
-                        xyxy = b.xyxy[0].tolist() if hasattr(b, 'xyxy') else list(b.xyxy)
-                    except:
-                        xyxy = [0, 0, 0, 0]
-                    
-                    conf = float(b.conf[0] if hasattr(b, 'conf') else b.conf)
-                    cls = int(b.cls[0] if hasattr(b, 'cls') else b.cls)
-                    label = YOLO_MODEL.names.get(cls, str(cls)) if hasattr(YOLO_MODEL, 'names') else str(cls)
-                    
-                    detections.append({
-                        'id': f"{self.camera_id}_{int(time.time()*1000)}_{len(detections)}",
-                        'label': label,
-                        'confidence': round(conf, 4),
-                        'bbox': [int(xyxy[0]), int(xyxy[1]), int(xyxy[2]), int(xyxy[3])],
-                        'timestamp': datetime.utcnow().isoformat() + "Z"
-                    })
+            # Un único timestamp por frame
+            detections = DetectionBatch(self.camera_id, xyxy, confs, classes, time.time(), names)
             
             # LOGS DETALLADOS para VSCode
-            person_count = sum(1 for d in detections if d.get('label') == 'person')
-            other_count = len(detections) - person_count
-            
-            # Contar por categoría
-            categories = {}
-            for d in detections:
-                label = d.get('label', 'unknown')
-                categories[label] = categories.get(label, 0) + 1
-            
-            if detections:
+            if len(detections):
+                categories = detections.label_counts()
+                person_count = categories.get('person', 0)
+                other_count = len(detections) - person_count
                 categories_str = ', '.join([f"{k}: {v}" for k, v in categories.items()])
                 print(f"[{self.camera_id}] 👁️  DETECTADO: {person_count} personas, {other_count} otros ({categories_str})")
             
@@ -304,33 +729,101 @@ class Camera:
             
         except Exception as e:
             print(f"[{self.camera_id}] Error YOLO: {e}")
-            return []
+            return None
 
 
 class CameraManager:
     def __init__(self):
         self.cameras = {}
         self._lock = threading.RLock()
+        self.inference = None
+        self.scheduler = None
+        self.writer = None
         
-        if not DETECTION_ENABLED:
+        if _setting('PERSIST_DETECTIONS', True):
+            self.writer = DetectionWriter(
+                max_queue=_setting('PERSIST_MAX_QUEUE', 10000),
+                batch_size=_setting('PERSIST_BATCH_SIZE', 500),
+                flush_interval=_setting('PERSIST_FLUSH_INTERVAL', 5.0),
+                backend=_setting('OCCUPANCY_BACKEND', 'db'),
+            )
+        
+        budget = _setting('INFERENCE_BUDGET', 10.0)
+        if budget:
+            self.scheduler = DetectionScheduler(
+                lambda: list(self.cameras.values()),
+                budget=budget,
+                min_rate=_setting('INFERENCE_MIN_RATE', 0.05),
+            )
+        
+        if not model_registry.is_available():
             print("⚠️  YOLO NO DISPONIBLE - pip install ultralytics")
+        elif _setting('YOLO_INFERENCE_BACKEND', 'thread') == 'process':
+            self.inference = ProcessInferenceService(
+                model_registry.default_weights(),
+                num_workers=_setting('YOLO_PROCESS_WORKERS', 2),
+                num_slots=_setting('YOLO_SHM_SLOTS', 8),
+                slot_bytes=_setting('YOLO_SHM_SLOT_BYTES', 1920 * 1080 * 3),
+                max_batch_size=_setting('YOLO_MAX_BATCH_SIZE', 8),
+                engine=model_registry.default_engine(),
+            )
+        elif _setting('YOLO_BATCH_INFERENCE', True):
+            self.inference = BatchInferenceService(
+                model_registry.get_model,
+                max_batch_size=_setting('YOLO_MAX_BATCH_SIZE', 8),
+                max_wait=_setting('YOLO_MAX_BATCH_WAIT', 0.05),
+            )
 
-    def add_camera(self, camera_id: str, source: str) -> bool:
+    def add_camera(self, camera_id: str, source: str, **options) -> bool:
         with self._lock:
             if camera_id in self.cameras:
                 print(f"[{camera_id}] Ya existe")
                 return False
-            cam = Camera(camera_id, source)
+            # Ajustes por cámara (p. ej. imgsz=320 para cámaras de baja resolución)
+            for key, value in _setting('CAMERA_OVERRIDES', {}).get(camera_id, {}).items():
+                options.setdefault(key, value)
+            options.setdefault('detection_interval', _setting('DETECTION_INTERVAL', 1.0))
+            options.setdefault('display_fps', _setting('CAMERA_DISPLAY_FPS', 5.0))
+            options.setdefault('capture_mode', _setting('CAMERA_CAPTURE_MODE', 'grab'))
+            options.setdefault('motion_gating', _setting('MOTION_GATE_ENABLED', True))
+            options.setdefault('tracking', _setting('TRACKING_ENABLED', True))
+            options.setdefault('roi', _setting('CAMERA_ROIS', {}).get(camera_id))
+            options.setdefault('classes', _setting('DETECTION_CLASSES', None))
+            options.setdefault('conf_threshold', _setting('DETECTION_CONF', None))
+            options.setdefault('iou_threshold', _setting('DETECTION_IOU', None))
+            options.setdefault('imgsz', _setting('YOLO_IMGSZ', None))
+            cam = Camera(camera_id, source, **options)
+            cam.inference_service = self.inference
+            cam.scheduler = self.scheduler
+            cam.writer = self.writer
             self.cameras[camera_id] = cam
             print(f"[{camera_id}] ➕ Añadida: {source}")
             return True
 
+    def configure_camera(self, camera_id: str, **options) -> bool:
+        """Actualiza opciones de una cámara (tasas de display/detección, modo)"""
+        cam = self.cameras.get(camera_id)
+        if not cam:
+            return False
+        unknown = set(options) - set(CAMERA_OPTIONS)
+        if unknown:
+            raise ValueError(f"Opciones desconocidas: {', '.join(sorted(unknown))}")
+        if 'capture_mode' in options and options['capture_mode'] not in CAPTURE_MODES:
+            raise ValueError(f"capture_mode inválido: {options['capture_mode']}")
+        with cam._lock:
+            for key, value in options.items():
+                setattr(cam, key, value)
+        return True
+
     def start_camera(self, camera_id: str) -> bool:
         with self._lock:
             cam = self.cameras.get(camera_id)
             if not cam:
                 print(f"[{camera_id}] No encontrada")
                 return False
+            if not isinstance(self.inference, ProcessInferenceService):
+                # Cargar YOLO en segundo plano mientras se abre el stream
+                model_registry.warmup()
             return cam.start()
 
     def stop_camera(self, camera_id: str) -> bool:
@@ -356,8 +849,10 @@ class CameraManager:
         cam = self.cameras.get(camera_id)
         if not cam:
             return None
+        jpeg_stats = cam.jpeg_cache_stats()
         with cam._lock:
             return {
+                **jpeg_stats,
                 'camera_id': cam.camera_id,
                 'source': cam.source,
                 'running': cam._running,
@@ -365,8 +860,28 @@ class CameraManager:
                 'last_frame_ts': cam.last_frame_ts,
                 'last_error': cam.last_error,
                 'fps': round(cam.fps, 2),
+                'capture_mode': cam.capture_mode,
+                'display_fps': cam.display_fps,
+                'detection_interval': cam.detection_interval,
+                'priority': cam.priority,
+                'allocated_detection_rate': round(1.0 / cam.current_detection_interval(), 3),
+                'effective_detection_rate': round(cam.effective_detection_rate(), 3),
+                'frames_grabbed': cam.frames_grabbed,
+                'frames_decoded': cam.frames_decoded,
+                'has_viewers': cam.has_viewers(),
+                'motion_gating': cam.motion_gating,
+                'motion_gate': cam.motion_gate.get_stats(),
+                'tracking': cam.tracking,
+                'active_tracks': cam.tracker.active_count(),
+                'roi': cam.roi.get_stats() if cam.roi is not None else None,
+                'predict_options': predict_kwargs(cam.predict_options()),
+                'history': cam.history.get_stats(),
                 'detections_count': len(cam.last_detections),
-                'yolo_enabled': DETECTION_ENABLED
+                'frame_seq': cam.frame_seq,
+                'frames_dropped': cam.frames_dropped,
+                'failed_passes': cam.failed_passes,
+                'detection_latency_ms': round(cam.detection_latency * 1000, 1),
+                'yolo_enabled': model_registry.is_available()
             }
 
     def get_camera_frame(self, camera_id: str, with_boxes: bool = False):
@@ -375,81 +890,57 @@ class CameraManager:
         if not cam:
             return None
         
-        with cam._lock:
-            if not with_boxes or not cam.last_detections:
-                return cam.last_frame
-            
-            if cam.last_frame:
-                try:
-                    # Decodificar JPEG
-                    nparr = np.frombuffer(cam.last_frame, np.uint8)
-                    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                    
-                    # Dibujar bounding boxes
-                    for det in cam.last_detections:
-                        bbox = det.get('bbox', [])
-                        if len(bbox) == 4:
-                            x1, y1, x2, y2 = bbox
-                            label = det.get('label', 'unknown')
-                            conf = det.get('confidence', 0.0)
-                            
-                            # Verde para personas, naranja para otros
-                            color = (0, 255, 0) if label == 'person' else (0, 165, 255)
-                            
-                            # Rectángulo
-                            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                            
-                            # Etiqueta
-                            text = f"{label} {conf:.2f}"
-                            (text_width, text_height), baseline = cv2.getTextSize(
-                                text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2
-                            )
-                            cv2.rectangle(frame, (x1, y1 - text_height - 5), 
-                                        (x1 + text_width, y1), color, -1)
-                            cv2.putText(frame, text, (x1, y1 - 5), 
-                                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
-                    
-                    # Recodificar
-                    _, buf = cv2.imencode('.jpg', frame)
-                    return buf.tobytes()
-                    
-                except Exception as e:
-                    print(f"[{camera_id}] Error dibujando boxes: {e}")
-            
-            return cam.last_frame
+        cam.mark_viewer()
+        if with_boxes:
+            return cam.get_annotated_jpeg()
+        return cam.get_jpeg()
 
     def get_camera_detections(self, camera_id: str, limit: int = 20):
+        """DetectionBatch compacto (sin copiar); las vistas lo serializan con to_dicts()"""
         cam = self.cameras.get(camera_id)
         if not cam:
-            return []
+            return DetectionBatch.empty(camera_id)
         with cam._lock:
-            detections = list(cam.last_detections)
-            return detections[:limit] if limit else detections
+            detections = cam.last_detections
+        return detections.head(limit)
+
+    def get_detection_history(self, camera_id: str, limit: int = 100, start=None, end=None):
+        """Últimos `limit` DetectionBatch con start <= timestamp <= end (epoch)"""
+        cam = self.cameras.get(camera_id)
+        if not cam:
+            return []
+        return cam.history.query(start, end, limit)
 
     def get_detection_statistics(self, camera_id: str):
+        """Snapshot de RollingStats: lectura en tiempo constante"""
         cam = self.cameras.get(camera_id)
         if not cam:
             return {}
-        
-        with cam._lock:
-            detections = cam.last_detections
-            
-            if not detections:
-                return {
-                    'total_detections': 0,
-                    'avg_confidence': 0.0,
-                    'yolo_enabled': DETECTION_ENABLED
-                }
-            
-            total = len(detections)
-            avg_conf = sum(d.get('confidence', 0) for d in detections) / total if total > 0 else 0
-            
-            return {
-                'total_detections': total,
-                'avg_confidence': round(avg_conf, 3),
-                'yolo_enabled': DETECTION_ENABLED,
-                'labels': list(set(d.get('label', 'unknown') for d in detections))
-            }
+        stats = cam.stats.get_stats()
+        return {
+            **stats,
+            'labels': list(stats['labels']),
+            'label_counts': stats['labels'],
+            'yolo_enabled': model_registry.is_available(),
+        }
+
+    def get_inference_stats(self):
+        """Métricas del servicio de inferencia por lotes"""
+        if self.inference is None:
+            return {'batching': False, 'yolo_enabled': model_registry.is_available()}
+        return {'batching': True, 'yolo_enabled': model_registry.is_available(), **self.inference.get_stats()}
+
+    def get_persistence_stats(self):
+        """Métricas de la escritura diferida en DetectionRecord"""
+        if self.writer is None:
+            return {'enabled': False}
+        return {'enabled': True, **self.writer.get_stats()}
+
+    def get_scheduler_stats(self):
+        """Reparto actual del presupuesto global de inferencias"""
+        if self.scheduler is None:
+            return {'enabled': False}
+        return {'enabled': True, **self.scheduler.get_stats()}
 
     def get_cameras_info(self):
         with self._lock:
@@ -457,8 +948,7 @@ class CameraManager:
             for cid, cam in self.cameras.items():
                 status = self.get_camera_status(cid)
                 if status:
-                    person_count = sum(1 for d in cam.last_detections if d.get('label') == 'person')
-                    status['person_count'] = person_count
+                    status['person_count'] = cam.stats.get_stats()['person_count']
                     out.append(status)
             return out
 
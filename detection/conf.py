@@ -0,0 +1,10 @@
+# detection/conf.py - Acceso a ajustes de Django con valores por defecto
+
+
+def setting(name, default):
+    """Lee un ajuste de Django, con valor por defecto si no está configurado"""
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        return default
@@ -0,0 +1,162 @@
+# detection/detections.py - Detecciones YOLO de un frame en formato compacto
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Registro compacto por detección: id de clase, confianza, caja, timestamp y
+# id de track (-1 sin track). 34 bytes frente a ~1 KB de un dict con strings.
+DETECTION_DTYPE = np.dtype([
+    ('cls', np.int16),
+    ('conf', np.float32),
+    ('bbox', np.float32, (4,)),
+    ('ts_ns', np.int64),
+    ('track_id', np.int32),
+])
+
+
+class DetectionBatch:
+    """
+    Detecciones de un frame guardadas como un array estructurado de NumPy
+    (DETECTION_DTYPE). Los dicts para JSON se generan solo al serializar en
+    las vistas, con to_dicts().
+    """
+
+    __slots__ = ('camera_id', 'records', 'timestamp_ns', 'names', '_counts')
+
+    def __init__(self, camera_id, xyxy, conf, cls, timestamp=None, names=None, track_ids=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        records = np.empty(len(cls), dtype=DETECTION_DTYPE)
+        records['cls'] = cls
+        records['conf'] = conf
+        records['bbox'] = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        records['ts_ns'] = int(timestamp * 1e9)
+        records['track_id'] = -1 if track_ids is None else track_ids
+        self._init(camera_id, records, int(timestamp * 1e9), names)
+
+    def _init(self, camera_id, records, timestamp_ns, names):
+        self.camera_id = camera_id
+        self.records = records
+        self.timestamp_ns = timestamp_ns
+        # Referencia compartida al dict del modelo, no una copia por frame
+        self.names = names or {}
+        self._counts = None
+
+    @classmethod
+    def from_records(cls, camera_id, records, timestamp_ns, names=None):
+        batch = cls.__new__(cls)
+        batch._init(camera_id, records, timestamp_ns, names)
+        return batch
+
+    @classmethod
+    def empty(cls, camera_id='', timestamp=None, names=None):
+        return cls(camera_id,
+                   np.zeros((0, 4), dtype=np.float32),
+                   np.zeros((0,), dtype=np.float32),
+                   np.zeros((0,), dtype=np.int16),
+                   timestamp, names)
+
+    def __len__(self):
+        return len(self.records)
+
+    def head(self, limit=None):
+        """Primeras `limit` detecciones, como vista (sin copiar)"""
+        if not limit or limit >= len(self):
+            return self
+        return DetectionBatch.from_records(self.camera_id, self.records[:limit],
+                                           self.timestamp_ns, self.names)
+
+    @property
+    def xyxy(self):
+        return self.records['bbox']
+
+    @property
+    def conf(self):
+        return self.records['conf']
+
+    @property
+    def cls(self):
+        return self.records['cls']
+
+    @property
+    def track_ids(self):
+        return self.records['track_id']
+
+    @property
+    def timestamp(self):
+        return self.timestamp_ns / 1e9
+
+    @property
+    def nbytes(self):
+        return self.records.nbytes
+
+    def label_of(self, class_id):
+        return self.names.get(class_id, str(class_id))
+
+    def class_id(self, label):
+        """Id de clase para una etiqueta, o None si el modelo no la tiene"""
+        for class_id, name in self.names.items():
+            if name == label:
+                return class_id
+        return None
+
+    def class_counts(self):
+        """Conteo por id de clase (np.bincount, calculado una vez)"""
+        if self._counts is None:
+            self._counts = np.bincount(self.cls.astype(np.intp))
+        return self._counts
+
+    def count(self, label):
+        class_id = self.class_id(label)
+        counts = self.class_counts()
+        if class_id is None or class_id >= len(counts):
+            return 0
+        return int(counts[class_id])
+
+    @property
+    def person_count(self):
+        return self.count('person')
+
+    def label_counts(self):
+        counts = self.class_counts()
+        return {self.label_of(int(class_id)): int(counts[class_id])
+                for class_id in np.flatnonzero(counts)}
+
+    def labels(self):
+        return list(self.label_counts())
+
+    def avg_confidence(self):
+        return float(self.conf.mean()) if len(self) else 0.0
+
+    def iso_timestamp(self):
+        return _iso_from_ns(self.timestamp_ns)
+
+    def to_dicts(self, limit=None):
+        """Convierte a la lista de dicts que devuelven las APIs (solo al serializar)"""
+        records = self.records[:limit] if limit else self.records
+        if not len(records):
+            return []
+        boxes = records['bbox'].astype(np.int32).tolist()
+        confs = np.round(records['conf'].astype(np.float64), 4).tolist()
+        classes = records['cls'].tolist()
+        stamps = records['ts_ns'].tolist()
+        tracks = records['track_id'].tolist()
+        iso_cache = {}
+        out = []
+        for i, (box, conf, class_id, ts_ns, track_id) in enumerate(zip(boxes, confs, classes, stamps, tracks)):
+            if ts_ns not in iso_cache:
+                iso_cache[ts_ns] = _iso_from_ns(ts_ns)
+            out.append({
+                'id': f"{self.camera_id}_{ts_ns // 1_000_000}_{i}",
+                'track_id': track_id if track_id >= 0 else None,
+                'label': self.label_of(class_id),
+                'confidence': conf,
+                'bbox': box,
+                'timestamp': iso_cache[ts_ns],
+            })
+        return out
+
+
+def _iso_from_ns(ts_ns):
+    dt = datetime.fromtimestamp(ts_ns / 1e9, tz=timezone.utc).replace(tzinfo=None)
+    return dt.isoformat() + "Z"
@@ -0,0 +1,278 @@
+# detection/engines.py - Motores de inferencia CPU (ONNX Runtime / OpenVINO)
+#
+# Los pesos .pt se exportan una vez y el resultado se cachea en disco
+# (YOLO_EXPORT_DIR). Los modelos exportados se cargan con ultralytics, así
+# que devuelven los mismos Results que PyTorch y las vistas no cambian.
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .conf import setting
+
+# torch: PyTorch eager | onnx: ONNX Runtime FP32 | onnx-int8: ONNX Runtime
+# cuantizado INT8 con calibración local | openvino: OpenVINO FP32
+ENGINES = ('torch', 'onnx', 'onnx-int8', 'openvino')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def export_dir():
+    path = Path(setting('YOLO_EXPORT_DIR', 'model_cache'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def export_path(weights, engine, imgsz=640):
+    """Ruta del modelo exportado para (pesos, motor, tamaño de entrada)"""
+    stem = Path(weights).stem
+    if engine == 'onnx':
+        return export_dir() / f"{stem}_{imgsz}.onnx"
+    if engine == 'onnx-int8':
+        return export_dir() / f"{stem}_{imgsz}_int8.onnx"
+    if engine == 'openvino':
+        # ultralytics reconoce OpenVINO por el sufijo del directorio
+        return export_dir() / f"{stem}_{imgsz}_openvino_model"
+    raise ValueError(f"El motor {engine} no requiere exportación")
+
+
+def model_path(weights, engine='torch', imgsz=None):
+    """Archivo a cargar con ultralytics para el motor indicado (exporta si falta)"""
+    if engine not in ENGINES:
+        raise ValueError(f"Motor de inferencia desconocido: {engine}")
+    if engine == 'torch':
+        return str(weights)
+    return str(ensure_exported(weights, engine, imgsz or setting('YOLO_IMGSZ', 640)))
+
+
+def load_model(weights, engine='torch', imgsz=None):
+    """Carga el modelo para el motor indicado, exportándolo si hace falta"""
+    path = model_path(weights, engine, imgsz)
+
+    from ultralytics import YOLO
+
+    if engine == 'torch':
+        return YOLO(path)
+    return YOLO(path, task='detect')
+
+
+def ensure_exported(weights, engine, imgsz=640):
+    """Devuelve el modelo exportado desde la caché, generándolo una sola vez"""
+    path = export_path(weights, engine, imgsz)
+    if path.exists():
+        return path
+
+    if engine == 'onnx-int8':
+        fp32 = ensure_exported(weights, 'onnx', imgsz)
+        calibration_dir = setting('YOLO_CALIBRATION_DIR', 'calibration')
+        print(f"[engines] Cuantizando {fp32.name} a INT8 con imágenes de {calibration_dir}...")
+        quantize_int8(fp32, path, calibration_dir, imgsz)
+        return path
+
+    from ultralytics import YOLO
+
+    fmt = 'onnx' if engine == 'onnx' else 'openvino'
+    print(f"[engines] Exportando {weights} a {fmt} (imgsz={imgsz})...")
+    # dynamic=True permite lotes de tamaño variable (BatchInferenceService)
+    exported = YOLO(weights).export(format=fmt, imgsz=imgsz, dynamic=True, verbose=False)
+    shutil.move(str(exported), str(path))
+    print(f"[engines] ✅ Modelo exportado en {path}")
+    return path
+
+
+# ============================================================
+# INT8
+# ============================================================
+
+def _letterbox(image, imgsz):
+    """Redimensiona manteniendo aspecto y rellena a imgsz x imgsz (como YOLO)"""
+    import cv2
+
+    h, w = image.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    resized = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - nh) // 2, (imgsz - nw) // 2
+    canvas[top:top + nh, left:left + nw] = resized
+    return canvas
+
+
+def list_images(directory, limit=None):
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+    images = sorted(p for p in directory.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    return images[:limit] if limit else images
+
+
+def _calibration_reader(onnx_path, calibration_dir, imgsz, limit=200):
+    import cv2
+    import onnxruntime
+    from onnxruntime.quantization import CalibrationDataReader
+
+    images = list_images(calibration_dir, limit)
+    if not images:
+        raise RuntimeError(f"No hay imágenes de calibración en {calibration_dir}")
+
+    input_name = onnxruntime.InferenceSession(
+        str(onnx_path), providers=['CPUExecutionProvider']
+    ).get_inputs()[0].name
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self):
+            self._iter = iter(images)
+
+        def get_next(self):
+            for path in self._iter:
+                image = cv2.imread(str(path))
+                if image is None:
+                    continue
+                # Mismo preprocesado que ultralytics: BGR->RGB, CHW, [0, 1]
+                blob = _letterbox(image, imgsz)[:, :, ::-1].transpose(2, 0, 1)
+                blob = np.ascontiguousarray(blob, dtype=np.float32)[None] / 255.0
+                return {input_name: blob}
+            return None
+
+    return _Reader()
+
+
+def quantize_int8(fp32_path, int8_path, calibration_dir, imgsz=640):
+    """Cuantización estática INT8 (QDQ) con un set de calibración local"""
+    import onnx
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+    reader = _calibration_reader(fp32_path, calibration_dir, imgsz)
+    quantize_static(
+        str(fp32_path), str(int8_path), reader,
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+
+    # Conservar los metadatos de ultralytics (nombres de clase, stride, imgsz)
+    source = onnx.load(str(fp32_path))
+    target = onnx.load(str(int8_path))
+    del target.metadata_props[:]
+    target.metadata_props.extend(source.metadata_props)
+    onnx.save(target, str(int8_path))
+    print(f"[engines] ✅ Modelo INT8 en {int8_path}")
+
+
+# ============================================================
+# Comparación de motores
+# ============================================================
+
+def box_iou(a, b):
+    """IoU entre dos conjuntos de cajas xyxy: matriz (len(a), len(b))"""
+    if not len(a) or not len(b):
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(br - tl, 0, None).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).clip(0).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).clip(0).prod(axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def _average_precision(recall, precision):
+    """AP con interpolación en todos los puntos (estilo VOC/COCO)"""
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.maximum.accumulate(mpre[::-1])[::-1]
+    idx = np.flatnonzero(mrec[1:] != mrec[:-1])
+    return float(np.sum((mrec[idx + 1] - mrec[idx]) * mpre[idx + 1]))
+
+
+def map50(reference, candidate):
+    """
+    mAP@0.5 de `candidate` tomando las detecciones de `reference` como verdad.
+    Ambos son listas (una entrada por imagen) de arrays (xyxy, conf, cls).
+    """
+    classes = set()
+    for _, _, cls in reference:
+        classes.update(cls.tolist())
+    if not classes:
+        return 1.0
+
+    aps = []
+    for class_id in sorted(classes):
+        scores, matches, total_gt = [], [], 0
+        for (ref_xyxy, _, ref_cls), (xyxy, conf, cls) in zip(reference, candidate):
+            gt = ref_xyxy[ref_cls == class_id]
+            total_gt += len(gt)
+            mask = cls == class_id
+            pred, pred_conf = xyxy[mask], conf[mask]
+            order = np.argsort(-pred_conf)
+            pred, pred_conf = pred[order], pred_conf[order]
+            iou = box_iou(pred, gt)
+            used = np.zeros(len(gt), dtype=bool)
+            for i in range(len(pred)):
+                hit = False
+                if len(gt):
+                    candidates = np.where(~used, iou[i], 0.0)
+                    j = int(candidates.argmax())
+                    if candidates[j] >= 0.5:
+                        used[j] = True
+                        hit = True
+                scores.append(float(pred_conf[i]))
+                matches.append(hit)
+        if total_gt == 0:
+            continue
+        if not scores:
+            aps.append(0.0)
+            continue
+        order = np.argsort(-np.asarray(scores))
+        tp = np.asarray(matches, dtype=np.float64)[order]
+        tp_cum = np.cumsum(tp)
+        fp_cum = np.cumsum(1.0 - tp)
+        recall = tp_cum / total_gt
+        precision = tp_cum / np.maximum(tp_cum + fp_cum, 1e-9)
+        aps.append(_average_precision(recall, precision))
+    return float(np.mean(aps)) if aps else 1.0
+
+
+def compare_engines(weights, engines, images, imgsz=640, conf=0.25):
+    """
+    Ejecuta cada motor sobre las mismas imágenes y reporta latencia y deriva
+    de mAP@0.5 respecto al primer motor de la lista (referencia).
+    """
+    import cv2
+    from .inference import result_to_arrays
+
+    frames = [f for f in (cv2.imread(str(p)) for p in images) if f is not None]
+    if not frames:
+        raise RuntimeError("No hay imágenes válidas para comparar")
+
+    report = []
+    reference = None
+    for engine in engines:
+        model = load_model(weights, engine, imgsz)
+        model(frames[0], verbose=False, imgsz=imgsz, conf=conf)  # warmup
+
+        outputs, latencies = [], []
+        for frame in frames:
+            start = time.perf_counter()
+            result = model(frame, verbose=False, imgsz=imgsz, conf=conf)[0]
+            latencies.append(time.perf_counter() - start)
+            outputs.append(result_to_arrays(result))
+
+        latencies = np.asarray(latencies) * 1000
+        row = {
+            'engine': engine,
+            'images': len(frames),
+            'mean_ms': round(float(latencies.mean()), 2),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+            'images_per_sec': round(1000.0 / float(latencies.mean()), 2),
+            'detections': int(sum(len(cls) for _, _, cls in outputs)),
+        }
+        if reference is None:
+            reference = outputs
+            row['map50_vs_ref'] = 1.0
+        else:
+            row['map50_vs_ref'] = round(map50(reference, outputs), 4)
+        row['map50_drift'] = round(1.0 - row['map50_vs_ref'], 4)
+        report.append(row)
+    return report
@@ -0,0 +1,162 @@
+# detection/export.py - Exportación por columnas de DetectionRecord (CSV / Parquet / Arrow IPC)
+#
+# Los registros se leen por tramos keyset (memoria constante) y cada tramo se
+# escribe como un bloque de columnas. pyarrow es opcional: sin él solo está
+# disponible CSV con el módulo csv estándar.
+import csv
+import io
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pa_parquet
+except Exception:
+    pa = None
+
+from .models import Camera, DetectionRecord
+from .pagination import filter_range, iter_keyset
+
+FORMATS = ('csv', 'parquet', 'arrow')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+EXPORT_FIELDS = ('id', 'camera_id', 'person_count', 'chair_count', 'occupancy_rate', 'timestamp')
+COLUMNS = ('id', 'camera', 'person_count', 'chair_count', 'occupancy_rate', 'timestamp')
+
+
+def available_formats():
+    return FORMATS if pa is not None else ('csv',)
+
+
+class ChunkSink(io.RawIOBase):
+    """Archivo de solo escritura que acumula bytes para entregarlos por tramos"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _schema():
+    return pa.schema([
+        ('id', pa.int64()),
+        ('camera', pa.string()),
+        ('person_count', pa.int32()),
+        ('chair_count', pa.int32()),
+        ('occupancy_rate', pa.float32()),
+        ('timestamp', pa.timestamp('us', tz='UTC')),
+    ])
+
+
+def _to_columns(rows, camera_names):
+    ids, camera_ids, persons, chairs, rates, stamps = zip(*rows)
+    return [list(ids), [camera_names.get(c) for c in camera_ids],
+            list(persons), list(chairs), list(rates), list(stamps)]
+
+
+class _CsvWriter:
+    def __init__(self, sink):
+        self._sink = io.TextIOWrapper(sink, encoding='utf-8', newline='', write_through=True)
+        self._writer = csv.writer(self._sink)
+        self._writer.writerow(COLUMNS)
+
+    def write(self, columns):
+        self._writer.writerows(zip(*columns[:5], (ts.isoformat() for ts in columns[5])))
+
+    def close(self):
+        self._sink.flush()
+        self._sink.detach()
+
+
+class _ArrowWriter:
+    """CSV, Parquet o Arrow IPC (formato stream) con pyarrow"""
+
+    def __init__(self, fmt, sink):
+        self.schema = _schema()
+        if fmt == 'parquet':
+            self._writer = pa_parquet.ParquetWriter(sink, self.schema, compression='zstd')
+        elif fmt == 'arrow':
+            self._writer = pa_ipc.new_stream(sink, self.schema)
+        else:
+            self._writer = pa_csv.CSVWriter(sink, self.schema)
+
+    def write(self, columns):
+        batch = pa.record_batch(
+            [pa.array(col, type=field.type) for col, field in zip(columns, self.schema)],
+            schema=self.schema,
+        )
+        if isinstance(self._writer, pa_parquet.ParquetWriter):
+            self._writer.write_batch(batch)
+        else:
+            self._writer.write(batch)
+
+    def close(self):
+        self._writer.close()
+
+
+def _open_writer(fmt, sink):
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato desconocido: {fmt}")
+    if pa is None:
+        if fmt != 'csv':
+            raise ValueError(f"El formato {fmt} requiere pyarrow (pip install pyarrow)")
+        return _CsvWriter(sink)
+    return _ArrowWriter(fmt, sink)
+
+
+def export_queryset(cameras=None, start=None, end=None):
+    """Queryset de DetectionRecord filtrado por nombres de cámara y rango [start, end)"""
+    records = DetectionRecord.objects.all()
+    if cameras:
+        records = records.filter(camera__name__in=cameras)
+    return filter_range(records, start, end)
+
+
+def iter_export(fmt, cameras=None, start=None, end=None, chunk_size=50000):
+    """
+    Genera los bytes del archivo exportado tramo a tramo (para escribir a
+    disco o devolver en un StreamingHttpResponse).
+    """
+    camera_names = dict(Camera.objects.values_list('id', 'name'))
+    sink = ChunkSink()
+    writer = _open_writer(fmt, sink)
+    for rows in iter_keyset(export_queryset(cameras, start, end), chunk_size, EXPORT_FIELDS):
+        writer.write(_to_columns(rows, camera_names))
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def export_to_file(path, fmt, cameras=None, start=None, end=None, chunk_size=50000):
+    """Escribe la exportación en `path`; devuelve los bytes escritos"""
+    written = 0
+    with open(path, 'wb') as out:
+        for data in iter_export(fmt, cameras, start, end, chunk_size):
+            out.write(data)
+            written += len(data)
+    return written
@@ -0,0 +1,141 @@
+# detection/history.py - Historial acotado de detecciones por cámara
+import threading
+import time
+
+import numpy as np
+
+from .detections import DETECTION_DTYPE
+
+
+class DetectionHistory:
+    """
+    Buffer circular con los DetectionBatch de las últimas pasadas de YOLO.
+    La retención se limita por número de frames (`max_frames`) y por edad
+    (`max_age` segundos). Los timestamps viven en un array int64 ordenado
+    (dos segmentos dentro del anillo), así que las consultas por rango de
+    tiempo son búsquedas binarias y no un recorrido en Python. Los totales
+    de get_stats() se mantienen al añadir y descartar, sin recorrer el anillo.
+    """
+
+    def __init__(self, max_frames: int = 1000, max_age: float = 3600.0):
+        self.max_frames = max(1, int(max_frames))
+        self.max_age = max_age
+        self._ts = np.zeros(self.max_frames, dtype=np.int64)
+        self._batches = [None] * self.max_frames
+        self._start = 0   # posición del más antiguo
+        self._size = 0
+        self._lock = threading.Lock()
+        self.appended = 0
+        self._detections = 0
+        self._nbytes = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, batch):
+        with self._lock:
+            ts = batch.timestamp_ns
+            if self._size:
+                # Mantener el orden aunque el reloj retroceda
+                ts = max(ts, int(self._ts[(self._start + self._size - 1) % self.max_frames]))
+            if self._size == self.max_frames:
+                pos = self._start
+                self._discard(self._batches[pos])
+                self._start = (self._start + 1) % self.max_frames
+            else:
+                pos = (self._start + self._size) % self.max_frames
+                self._size += 1
+            self._ts[pos] = ts
+            self._batches[pos] = batch
+            self._detections += len(batch)
+            self._nbytes += batch.nbytes
+            self.appended += 1
+            self._expire()
+
+    def _expire(self):
+        """Descarta del principio las entradas más viejas que max_age"""
+        if not self.max_age or not self._size:
+            return
+        cutoff = int((time.time() - self.max_age) * 1e9)
+        drop = self._count_before(cutoff)
+        for i in range(drop):
+            pos = (self._start + i) % self.max_frames
+            self._discard(self._batches[pos])
+            self._batches[pos] = None
+        self._start = (self._start + drop) % self.max_frames
+        self._size -= drop
+
+    def _discard(self, batch):
+        self._detections -= len(batch)
+        self._nbytes -= batch.nbytes
+
+    def _segments(self):
+        """(inicio, fin) en el array físico de los dos tramos ordenados del anillo"""
+        end = self._start + self._size
+        if end <= self.max_frames:
+            return [(self._start, end)]
+        return [(self._start, self.max_frames), (0, end - self.max_frames)]
+
+    def _count_before(self, ts_ns):
+        """Número de entradas con timestamp < ts_ns"""
+        count = 0
+        for lo, hi in self._segments():
+            n = int(np.searchsorted(self._ts[lo:hi], ts_ns, side='left'))
+            count += n
+            if n < hi - lo:
+                break
+        return count
+
+    def _count_through(self, ts_ns):
+        """Número de entradas con timestamp <= ts_ns"""
+        count = 0
+        for lo, hi in self._segments():
+            n = int(np.searchsorted(self._ts[lo:hi], ts_ns, side='right'))
+            count += n
+            if n < hi - lo:
+                break
+        return count
+
+    def query(self, start=None, end=None, limit=None):
+        """
+        Batches con start <= timestamp <= end (segundos epoch; None = sin
+        límite), en orden cronológico. Con `limit` se devuelven los más recientes.
+        """
+        with self._lock:
+            self._expire()
+            first = self._count_before(int(start * 1e9)) if start is not None else 0
+            last = self._count_through(int(end * 1e9)) if end is not None else self._size
+            if limit:
+                first = max(first, last - int(limit))
+            return [self._batches[(self._start + i) % self.max_frames]
+                    for i in range(first, last)]
+
+    def records(self, start=None, end=None):
+        """Todas las detecciones del rango como un único array DETECTION_DTYPE"""
+        batches = self.query(start, end)
+        if not batches:
+            return np.zeros(0, dtype=DETECTION_DTYPE)
+        return np.concatenate([batch.records for batch in batches])
+
+    def clear(self):
+        with self._lock:
+            self._batches = [None] * self.max_frames
+            self._start = 0
+            self._size = 0
+            self._detections = 0
+            self._nbytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            frames = self._size
+            detections = self._detections
+            nbytes = self._nbytes
+            oldest = int(self._ts[self._start]) if self._size else None
+        return {
+            'frames': frames,
+            'detections': detections,
+            'nbytes': nbytes,
+            'max_frames': self.max_frames,
+            'max_age': self.max_age,
+            'oldest_age_s': round(time.time() - oldest / 1e9, 1) if oldest else None,
+        }
@@ -0,0 +1,202 @@
+# detection/inference.py - Inferencia YOLO por lotes entre cámaras
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+def empty_arrays():
+    """Resultado vacío en formato compacto"""
+    return (np.zeros((0, 4), dtype=np.float32),
+            np.zeros((0,), dtype=np.float32),
+            np.zeros((0,), dtype=np.int16))
+
+
+# Ids de clase COCO usados para la ocupación
+PERSON_CLASS = 0
+CHAIR_CLASS = 56
+
+
+def predict_options(classes=None, conf=None, iou=None, imgsz=None):
+    """
+    Parámetros de predicción normalizados a una tupla hashable (clave de
+    agrupación de lotes). Los None se omiten y quedan los valores por defecto
+    de ultralytics.
+    """
+    options = []
+    if classes is not None:
+        options.append(('classes', tuple(sorted(int(c) for c in classes))))
+    if conf is not None:
+        options.append(('conf', float(conf)))
+    if iou is not None:
+        options.append(('iou', float(iou)))
+    if imgsz is not None:
+        options.append(('imgsz', int(imgsz)))
+    return tuple(options)
+
+
+def predict_kwargs(options):
+    """Tupla de predict_options() -> kwargs para model(...)"""
+    kwargs = dict(options)
+    if 'classes' in kwargs:
+        kwargs['classes'] = list(kwargs['classes'])
+    return kwargs
+
+
+def result_to_arrays(result):
+    """Convierte un Results de ultralytics en arrays compactos (xyxy, conf, cls)"""
+    boxes = getattr(result, 'boxes', None)
+    if boxes is None or len(boxes) == 0:
+        return empty_arrays()
+    return (boxes.xyxy.cpu().numpy().astype(np.float32, copy=False),
+            boxes.conf.cpu().numpy().astype(np.float32, copy=False),
+            boxes.cls.cpu().numpy().astype(np.int16, copy=False))
+
+
+class BatchInferenceService:
+    """
+    Servicio central de inferencia: junta los frames pendientes de todas las
+    cámaras y los pasa por el modelo en un único forward pass.
+
+    Un lote se dispara cuando hay max_batch_size frames en cola o cuando el
+    frame más antiguo lleva max_wait segundos esperando. Cada resultado se
+    entrega como arrays compactos (xyxy, conf, cls). Solo se agrupan frames
+    con los mismos parámetros de predicción (clases, umbrales, imgsz).
+    """
+
+    def __init__(self, model_loader, max_batch_size: int = 8, max_wait: float = 0.05):
+        # model_loader: callable sin argumentos; el modelo se resuelve en el
+        # primer lote, no al construir el servicio
+        self.model_loader = model_loader
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait))
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+
+        # Métricas
+        self.batches = 0
+        self.images = 0
+        self.last_batch_size = 0
+        self.last_batch_time = 0.0
+
+    @property
+    def model(self):
+        return self.model_loader()
+
+    @property
+    def names(self):
+        return self.model.names
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(
+                target=self._loop,
+                name="BatchInferenceThread",
+                daemon=True
+            )
+            self._thread.start()
+            print(f"[inference] Servicio por lotes iniciado (batch={self.max_batch_size}, espera={self.max_wait}s)")
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            pending, self._pending = self._pending, []
+            self._cond.notify_all()
+        for _, _, future, _ in pending:
+            future.cancel()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=3.0)
+
+    def submit(self, frame, options=()) -> Future:
+        """Encola un frame y devuelve un Future con sus arrays (xyxy, conf, cls)"""
+        if not self._running:
+            self.start()
+        future = Future()
+        with self._cond:
+            self._pending.append((frame, time.time(), future, options))
+            self._cond.notify_all()
+        return future
+
+    def infer(self, frame, timeout: float = None, options=()):
+        """Versión bloqueante de submit() para los hilos de cámara"""
+        return self.submit(frame, options).result(timeout=timeout)
+
+    def _matching(self, options):
+        return sum(1 for item in self._pending if item[3] == options)
+
+    def _next_batch(self):
+        """Espera a que haya un lote listo (tamaño o tiempo) y lo extrae"""
+        with self._cond:
+            while self._running and not self._pending:
+                self._cond.wait(timeout=0.5)
+            if not self._running:
+                return []
+
+            # El lote se forma con los frames que comparten parámetros con el
+            # más antiguo; el resto espera al siguiente lote
+            _, oldest, _, options = self._pending[0]
+            deadline = oldest + self.max_wait
+            while self._running and self._matching(options) < self.max_batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(timeout=remaining)
+
+            batch, rest = [], []
+            for item in self._pending:
+                if item[3] == options and len(batch) < self.max_batch_size:
+                    batch.append(item)
+                else:
+                    rest.append(item)
+            self._pending = rest
+            return batch
+
+    def _loop(self):
+        while self._running:
+            batch = self._next_batch()
+            if batch:
+                self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        frames = [frame for frame, _, _, _ in batch]
+        options = batch[0][3]
+        start = time.time()
+        try:
+            results = self.model(frames, verbose=False, **predict_kwargs(options))
+        except Exception as e:
+            print(f"[inference] Error en lote de {len(frames)}: {e}")
+            for _, _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result_to_arrays(result))
+
+        self.batches += 1
+        self.images += len(frames)
+        self.last_batch_size = len(frames)
+        self.last_batch_time = time.time() - start
+
+    def get_stats(self):
+        with self._cond:
+            queued = len(self._pending)
+        return {
+            'backend': 'thread',
+            'running': self._running,
+            'max_batch_size': self.max_batch_size,
+            'max_wait': self.max_wait,
+            'queued': queued,
+            'batches': self.batches,
+            'images': self.images,
+            'avg_batch_size': round(self.images / self.batches, 2) if self.batches else 0.0,
+            'last_batch_size': self.last_batch_size,
+            'last_batch_ms': round(self.last_batch_time * 1000, 1),
+        }
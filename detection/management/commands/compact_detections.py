@@ -0,0 +1,34 @@
+# detection/management/commands/compact_detections.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from detection.retention import compact
+
+
+class Command(BaseCommand):
+    help = 'Aplica la retención: compacta DetectionRecord a minutos y borra agregados caducados'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--raw-days', type=int, default=None, help='Días de filas crudas (RETENTION_RAW_DAYS)')
+        parser.add_argument('--minute-days', type=int, default=None, help='Días de MinuteRollup (RETENTION_MINUTE_DAYS)')
+        parser.add_argument('--hourly-days', type=int, default=None, help='Días de HourlyRollup (RETENTION_HOURLY_DAYS)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Filas por transacción')
+        parser.add_argument('--pause', type=float, default=0.05, help='Pausa entre tramos (segundos)')
+        parser.add_argument('--vacuum', action='store_true', help='Ejecutar VACUUM al terminar (SQLite)')
+    
+    def handle(self, *args, **options):
+        start = time.time()
+        summary = compact(
+            raw_days=options['raw_days'],
+            minute_days=options['minute_days'],
+            hourly_days=options['hourly_days'],
+            chunk_size=options['chunk_size'],
+            pause=options['pause'],
+            vacuum=options['vacuum'],
+        )
+        self.stdout.write(
+            f"Compactadas {summary['raw_compacted']} filas en {summary['minutes_written']} minutos; "
+            f"borrados {summary['minutes_deleted']} minutos y {summary['hours_deleted']} horas "
+            f"en {time.time() - start:.1f}s"
+        )
@@ -0,0 +1,45 @@
+# detection/management/commands/compare_engines.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from detection.engines import ENGINES, compare_engines, list_images
+
+
+class Command(BaseCommand):
+    help = 'Compara latencia y deriva de mAP@0.5 entre motores de inferencia YOLO'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--engines',
+            nargs='+',
+            default=['torch', 'onnx'],
+            choices=ENGINES,
+            help='Motores a comparar; el primero es la referencia'
+        )
+        parser.add_argument(
+            '--images',
+            type=str,
+            default=str(getattr(settings, 'YOLO_CALIBRATION_DIR', 'calibration')),
+            help='Directorio con imágenes de prueba'
+        )
+        parser.add_argument('--limit', type=int, default=50, help='Máximo de imágenes')
+        parser.add_argument('--imgsz', type=int, default=getattr(settings, 'YOLO_IMGSZ', 640))
+        parser.add_argument('--weights', type=str, default=getattr(settings, 'YOLO_MODEL_PATH', 'yolov8n.pt'))
+    
+    def handle(self, *args, **options):
+        images = list_images(options['images'], options['limit'])
+        if not images:
+            raise CommandError(f"No hay imágenes en {options['images']}")
+        
+        self.stdout.write(f"Comparando {', '.join(options['engines'])} sobre {len(images)} imágenes...")
+        report = compare_engines(options['weights'], options['engines'], images, imgsz=options['imgsz'])
+        
+        header = f"{'motor':<10} {'media ms':>9} {'p95 ms':>8} {'img/s':>7} {'dets':>6} {'mAP50':>7} {'deriva':>7}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in report:
+            self.stdout.write(
+                f"{row['engine']:<10} {row['mean_ms']:>9.2f} {row['p95_ms']:>8.2f} "
+                f"{row['images_per_sec']:>7.2f} {row['detections']:>6} "
+                f"{row['map50_vs_ref']:>7.4f} {row['map50_drift']:>7.4f}"
+            )
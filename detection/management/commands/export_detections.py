@@ -0,0 +1,35 @@
+# detection/management/commands/export_detections.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from detection.export import FORMATS, available_formats, export_to_file
+from detection.pagination import parse_range
+
+
+class Command(BaseCommand):
+    help = 'Exporta DetectionRecord a CSV, Parquet o Arrow IPC leyendo por tramos'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('output', type=str, help='Archivo de salida')
+        parser.add_argument('--format', choices=FORMATS, default='parquet')
+        parser.add_argument('--cameras', nargs='*', default=None, help='Nombres de cámara (todas si se omite)')
+        parser.add_argument('--from', dest='from_date', type=str, default=None, help='Inicio ISO (incluido)')
+        parser.add_argument('--to', dest='to_date', type=str, default=None, help='Fin ISO (excluido; una fecha sola incluye el día)')
+        parser.add_argument('--chunk-size', type=int, default=50000)
+    
+    def handle(self, *args, **options):
+        fmt = options['format']
+        if fmt not in available_formats():
+            raise CommandError(f"El formato {fmt} requiere pyarrow (pip install pyarrow)")
+        try:
+            start, end = parse_range(options['from_date'], options['to_date'])
+        except ValueError as e:
+            raise CommandError(f"Fecha inválida: {e}")
+        
+        began = time.time()
+        written = export_to_file(options['output'], fmt, options['cameras'], start, end,
+                                 options['chunk_size'])
+        self.stdout.write(
+            f"Exportado {options['output']} ({fmt}, {written / 1e6:.1f} MB) en {time.time() - began:.1f}s"
+        )
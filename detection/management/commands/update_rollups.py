@@ -0,0 +1,35 @@
+# detection/management/commands/update_rollups.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from detection.rollups import update_rollups
+
+
+class Command(BaseCommand):
+    help = 'Actualiza HourlyRollup y DailyReport con los DetectionRecord nuevos desde la marca de agua'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Ids por transacción')
+        parser.add_argument(
+            '--every',
+            type=float,
+            default=0,
+            help='Repetir cada N segundos (0 = una sola pasada)'
+        )
+    
+    def handle(self, *args, **options):
+        while True:
+            start = time.time()
+            rows, hours, days = update_rollups(options['chunk_size'])
+            self.stdout.write(
+                f"Rollups: {rows} filas nuevas, {hours} horas y {days} días actualizados "
+                f"en {time.time() - start:.2f}s"
+            )
+            if not options['every']:
+                break
+            try:
+                time.sleep(options['every'])
+            except KeyboardInterrupt:
+                self.stdout.write('Rollups detenidos')
+                break
@@ -0,0 +1,105 @@
+# detection/model_registry.py - Registro de modelos YOLO con carga perezosa
+#
+# torch/ultralytics solo se importan la primera vez que alguien pide un
+# modelo, y se comparte una única instancia por (pesos, motor) entre
+# CameraManager y AttendanceDetector.
+import importlib.util
+import threading
+
+from .conf import setting
+from .engines import ENGINES, load_model
+
+_models = {}
+_errors = {}
+_lock = threading.Lock()
+_warmup_threads = {}
+_installed = None
+
+
+def default_weights():
+    return setting('YOLO_MODEL_PATH', 'yolov8n.pt')
+
+
+def default_engine():
+    return setting('YOLO_ENGINE', 'torch')
+
+
+def _key(weights, engine):
+    return (weights or default_weights(), engine or default_engine())
+
+
+def is_available(weights=None, engine=None) -> bool:
+    """True si ultralytics está instalado y el modelo no ha fallado al cargar"""
+    global _installed
+    if _key(weights, engine) in _errors:
+        return False
+    if _installed is None:
+        # find_spec no importa el paquete: no paga el coste de torch
+        _installed = importlib.util.find_spec('ultralytics') is not None
+    return _installed
+
+
+def is_loaded(weights=None, engine=None) -> bool:
+    return _key(weights, engine) in _models
+
+
+def _load(weights, engine):
+    if engine not in ENGINES:
+        raise ValueError(f"Motor de inferencia desconocido: {engine}")
+    return load_model(weights, engine)
+
+
+def get_model(weights=None, engine=None):
+    """Devuelve el modelo compartido para (pesos, motor), cargándolo si hace falta"""
+    key = _key(weights, engine)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _models.get(key)
+        if model is not None:
+            return model
+        try:
+            model = _load(*key)
+        except Exception as e:
+            _errors[key] = str(e)
+            print(f"[ERROR] No se pudo cargar YOLO {key[0]} ({key[1]}): {e}")
+            raise
+        _errors.pop(key, None)
+        _models[key] = model
+        print(f"[OK] YOLO {key[0]} ({key[1]}) cargado - DETECCION REAL HABILITADA")
+        return model
+
+
+def get_error(weights=None, engine=None):
+    return _errors.get(_key(weights, engine))
+
+
+def warmup(weights=None, engine=None):
+    """Carga el modelo y hace una inferencia de prueba en segundo plano"""
+    key = _key(weights, engine)
+    if key in _models or not is_available(*key):
+        return None
+
+    with _lock:
+        thread = _warmup_threads.get(key)
+        if thread is not None and thread.is_alive():
+            return thread
+
+        def _run():
+            try:
+                import numpy as np
+                model = get_model(*key)
+                model(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+            except Exception as e:
+                print(f"[ERROR] Warmup de YOLO falló: {e}")
+
+        thread = threading.Thread(target=_run, name="YOLOWarmupThread", daemon=True)
+        _warmup_threads[key] = thread
+        thread.start()
+        return thread
+
+
+def loaded_models():
+    return [{'weights': w, 'engine': e} for (w, e) in _models]
@@ -27,4 +27,49 @@ class DailyReport(models.Model):
     date = models.DateField()
     avg_occupancy = models.FloatField()
     peak_occupancy = models.IntegerField()
-    total_detections = models.IntegerField()
\ No newline at end of file
+    total_detections = models.IntegerField()
+    
+    class Meta:
+        unique_together = [('camera', 'date')]
+
+class HourlyRollup(models.Model):
+    """Agregado por cámara y hora de DetectionRecord (sumas para poder fusionar)"""
+    camera = models.ForeignKey(Camera, on_delete=models.CASCADE)
+    hour = models.DateTimeField()  # inicio de la hora (UTC)
+    samples = models.IntegerField(default=0)
+    person_sum = models.BigIntegerField(default=0)
+    person_max = models.IntegerField(default=0)
+    person_min = models.IntegerField(default=0)
+    occupancy_sum = models.FloatField(default=0.0)
+    occupancy_max = models.FloatField(default=0.0)
+    occupancy_min = models.FloatField(default=0.0)
+    
+    class Meta:
+        unique_together = [('camera', 'hour')]
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+
+class MinuteRollup(models.Model):
+    """Agregado por cámara y minuto de los DetectionRecord ya compactados"""
+    camera = models.ForeignKey(Camera, on_delete=models.CASCADE)
+    minute = models.DateTimeField()  # inicio del minuto (UTC)
+    samples = models.IntegerField(default=0)
+    person_sum = models.BigIntegerField(default=0)
+    person_max = models.IntegerField(default=0)
+    person_min = models.IntegerField(default=0)
+    occupancy_sum = models.FloatField(default=0.0)
+    occupancy_max = models.FloatField(default=0.0)
+    occupancy_min = models.FloatField(default=0.0)
+    
+    class Meta:
+        unique_together = [('camera', 'minute')]
+        indexes = [
+            models.Index(fields=['minute']),
+        ]
+
+class RollupWatermark(models.Model):
+    """Último DetectionRecord.id ya incorporado a los rollups"""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
\ No newline at end of file
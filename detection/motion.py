@@ -0,0 +1,93 @@
+# detection/motion.py - Detector de cambios barato para saltar YOLO en escenas estáticas
+import time
+
+import numpy as np
+
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+
+class MotionGate:
+    """
+    Compara frames reducidos en escala de grises contra un modelo de fondo
+    (media exponencial). Si la fracción de píxeles que cambian es menor que
+    `threshold`, la escena se considera estática y se reutilizan las
+    detecciones anteriores; cada `max_staleness` segundos se fuerza una
+    inferencia real aunque no haya movimiento.
+    """
+
+    def __init__(self, threshold: float = 0.01, pixel_delta: int = 25,
+                 alpha: float = 0.05, max_staleness: float = 30.0, width: int = 64):
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.alpha = alpha
+        self.max_staleness = max_staleness
+        self.width = width
+        self._background = None
+        self._last_inference = 0.0
+
+        # Métricas
+        self.evaluated = 0
+        self.skipped = 0
+        self.last_decision = None
+        self.last_motion_ratio = 0.0
+        self.last_motion_time = 0.0
+
+    def _small_gray(self, frame):
+        h, w = frame.shape[:2]
+        height = max(1, int(round(h * self.width / w)))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.float32)
+
+    def should_detect(self, frame, now: float = None) -> bool:
+        """True si hay que ejecutar YOLO sobre este frame"""
+        now = time.time() if now is None else now
+        gray = self._small_gray(frame)
+        self.evaluated += 1
+
+        if self._background is None or self._background.shape != gray.shape:
+            self._background = gray
+            self.last_motion_ratio = 1.0
+            return self._decide(True, 'first', now)
+
+        changed = np.abs(gray - self._background) > self.pixel_delta
+        ratio = float(changed.mean())
+        self.last_motion_ratio = ratio
+
+        # El fondo se adapta despacio (cambios de luz, objetos que se quedan)
+        self._background += self.alpha * (gray - self._background)
+
+        if ratio >= self.threshold:
+            self.last_motion_time = now
+            return self._decide(True, 'motion', now)
+        if now - self._last_inference >= self.max_staleness:
+            return self._decide(True, 'stale', now)
+        return self._decide(False, 'static', now)
+
+    def _decide(self, run: bool, reason: str, now: float) -> bool:
+        self.last_decision = reason
+        if run:
+            self._last_inference = now
+        else:
+            self.skipped += 1
+        return run
+
+    def had_recent_motion(self, window: float = 60.0) -> bool:
+        return (time.time() - self.last_motion_time) < window
+
+    def reset(self):
+        self._background = None
+        self._last_inference = 0.0
+
+    def get_stats(self):
+        return {
+            'last_decision': self.last_decision,
+            'motion_ratio': round(self.last_motion_ratio, 4),
+            'evaluated': self.evaluated,
+            'skipped': self.skipped,
+            'skip_ratio': round(self.skipped / self.evaluated, 3) if self.evaluated else 0.0,
+        }
@@ -0,0 +1,128 @@
+# detection/pagination.py - Paginación por cursor (keyset) y JSON en streaming
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+from django.db.models import Q
+
+# Columnas de DetectionRecord que devuelven las APIs, en orden
+RECORD_FIELDS = ('id', 'person_count', 'chair_count', 'occupancy_rate', 'timestamp')
+
+
+def parse_range(from_date=None, to_date=None):
+    """
+    Rango semiabierto [inicio, fin) en datetimes UTC a partir de fechas ISO.
+    Una fecha sola como `to_date` incluye el día completo. Los filtros
+    timestamp__gte / timestamp__lt usan el índice (camera, timestamp), a
+    diferencia de timestamp__date.
+    """
+    def parse(value):
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed
+
+    start = parse(from_date) if from_date else None
+    end = None
+    if to_date:
+        end = parse(to_date)
+        if len(to_date) == 10:
+            end += timedelta(days=1)
+    return start, end
+
+
+def filter_range(queryset, start=None, end=None, field='timestamp'):
+    if start is not None:
+        queryset = queryset.filter(**{f'{field}__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{f'{field}__lt': end})
+    return queryset
+
+
+def encode_cursor(timestamp, pk):
+    raw = f"{timestamp.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Cursor opaco -> (timestamp, id); ValueError si no es válido"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(pk)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def after_cursor(queryset, cursor):
+    """Filas estrictamente posteriores a (timestamp, id) en orden (timestamp, id)"""
+    if cursor is None:
+        return queryset
+    timestamp, pk = cursor
+    return queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk))
+
+
+def keyset_page(queryset, cursor=None, page_size=500, fields=RECORD_FIELDS):
+    """
+    Una página de tuplas values_list ordenadas por (timestamp, id) y el
+    cursor de la siguiente (None si no hay más). `fields` debe empezar por
+    'id' y contener 'timestamp'.
+    """
+    ts_index = fields.index('timestamp')
+    rows = list(
+        after_cursor(queryset, cursor)
+        .order_by('timestamp', 'id')
+        .values_list(*fields)[:page_size + 1]
+    )
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[ts_index], last[0])
+    return rows, next_cursor
+
+
+def iter_keyset(queryset, chunk_size=2000, fields=RECORD_FIELDS):
+    """Recorre todo el queryset por tramos keyset: memoria constante"""
+    ts_index = fields.index('timestamp')
+    cursor = None
+    while True:
+        rows = list(
+            after_cursor(queryset, cursor)
+            .order_by('timestamp', 'id')
+            .values_list(*fields)[:chunk_size]
+        )
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        cursor = (rows[-1][ts_index], rows[-1][0])
+
+
+def row_to_dict(row, fields=RECORD_FIELDS, **extra):
+    out = dict(zip(fields, row))
+    out['timestamp'] = out['timestamp'].isoformat()
+    out.update(extra)
+    return out
+
+
+def stream_json_array(chunks, key='records', fields=RECORD_FIELDS, header=None, **extra):
+    """
+    Genera un objeto JSON {…header, key: [filas]} pieza a pieza para un
+    StreamingHttpResponse; las filas se serializan directamente desde las
+    tuplas de values_list.
+    """
+    header = dict(header or {})
+    prefix = json.dumps(header)[:-1]
+    yield (prefix + ', ' if header else '{') + json.dumps(key) + ': ['
+    first = True
+    count = 0
+    for rows in chunks:
+        parts = [json.dumps(row_to_dict(row, fields, **extra), separators=(',', ':')) for row in rows]
+        if not parts:
+            continue
+        count += len(parts)
+        yield ('' if first else ',') + ','.join(parts)
+        first = False
+    yield '], "count": ' + str(count) + '}'
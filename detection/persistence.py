@@ -0,0 +1,201 @@
+# detection/persistence.py - Escritura diferida de detecciones en DetectionRecord
+#
+# Las cámaras encolan muestras de ocupación y un hilo las guarda con
+# bulk_create dentro de una única transacción por lote: en SQLite eso es un
+# fsync por lote en lugar de uno por fila.
+import atexit
+import queue
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+BACKENDS = ('db', 'timeseries', 'both')
+
+# Muestra de ocupación de una cámara en un instante
+OccupancySample = namedtuple(
+    'OccupancySample',
+    ['camera_name', 'source', 'timestamp', 'person_count', 'chair_count', 'occupancy_rate'],
+)
+
+
+def sample_from_batch(camera_name, source, batch):
+    """Convierte un DetectionBatch en una muestra de ocupación"""
+    persons = batch.person_count
+    chairs = batch.count('chair')
+    rate = round(persons / chairs * 100, 2) if chairs else 0.0
+    timestamp = datetime.fromtimestamp(batch.timestamp, tz=timezone.utc)
+    return OccupancySample(camera_name, source, timestamp, persons, chairs, rate)
+
+
+class CameraCache:
+    """Caché nombre -> pk de Camera para no consultar la FK en cada fila"""
+
+    def __init__(self):
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, samples):
+        """pk por nombre de cámara; crea las que no existan (una consulta por lote)"""
+        from .models import Camera
+
+        with self._lock:
+            missing = {s.camera_name: s.source for s in samples if s.camera_name not in self._ids}
+            if missing:
+                for pk, name in Camera.objects.filter(name__in=list(missing)).values_list('id', 'name'):
+                    self._ids.setdefault(name, pk)
+                for name, source in missing.items():
+                    if name not in self._ids:
+                        camera = Camera.objects.create(name=name, stream_url=source or '', is_active=True)
+                        self._ids[name] = camera.pk
+            return dict(self._ids)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+
+def save_samples(samples, cameras=None):
+    """Guarda las muestras con bulk_create en una sola transacción; devuelve cuántas"""
+    from django.db import transaction
+    from .models import DetectionRecord
+
+    if not samples:
+        return 0
+    cameras = cameras or CameraCache()
+    with transaction.atomic():
+        ids = cameras.resolve(samples)
+        DetectionRecord.objects.bulk_create([
+            DetectionRecord(
+                camera_id=ids[s.camera_name],
+                person_count=s.person_count,
+                chair_count=s.chair_count,
+                occupancy_rate=s.occupancy_rate,
+                timestamp=s.timestamp,
+            )
+            for s in samples
+        ])
+    return len(samples)
+
+
+class DetectionWriter:
+    """
+    Hilo de escritura diferida. submit() encola una muestra; el hilo vacía
+    el buffer al llegar a `batch_size` muestras o cuando la más antigua lleva
+    `flush_interval` segundos esperando. La cola está acotada: si la base de
+    datos no da abasto, submit() bloquea hasta `put_timeout` (backpressure
+    sobre el hilo de detección) y después descarta la muestra.
+
+    `backend` elige el destino: 'db' (DetectionRecord), 'timeseries'
+    (archivos memmap por cámara y día, ver timeseries.py) o 'both'.
+    """
+
+    def __init__(self, max_queue: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 5.0, put_timeout: float = 1.0,
+                 backend: str = 'db'):
+        if backend not in BACKENDS:
+            raise ValueError(f"backend inválido: {backend}")
+        self.backend = backend
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._cameras = CameraCache()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+
+        # Métricas
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.errors = 0
+        self.last_flush_ms = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(
+                target=self._loop,
+                name="DetectionWriterThread",
+                daemon=True
+            )
+            self._thread.start()
+            # Vaciar el buffer al salir del proceso
+            atexit.register(self.stop)
+            print(f"[persistence] Escritura diferida iniciada (lote={self.batch_size}, cada {self.flush_interval}s)")
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=self.flush_interval + 5.0)
+
+    def submit(self, sample) -> bool:
+        if not self._running:
+            self.start()
+        try:
+            self._queue.put(sample, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _next_batch(self):
+        """Espera la primera muestra y junta hasta batch_size o flush_interval"""
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not self._running:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        from django.db import close_old_connections
+
+        while self._running or not self._queue.empty():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            start = time.time()
+            try:
+                if self.backend in ('timeseries', 'both'):
+                    from .timeseries import get_store
+                    written = get_store().append_samples(batch)
+                if self.backend in ('db', 'both'):
+                    close_old_connections()
+                    written = save_samples(batch, self._cameras)
+                self.written += written
+                self.flushes += 1
+            except Exception as e:
+                # La caché puede apuntar a cámaras borradas: se recarga en el siguiente lote
+                self._cameras.clear()
+                self.errors += 1
+                self.dropped += len(batch)
+                print(f"[persistence] ❌ Error guardando {len(batch)} muestras: {e}")
+            self.last_flush_ms = round((time.time() - start) * 1000, 1)
+        close_old_connections()
+
+    def get_stats(self):
+        return {
+            'backend': self.backend,
+            'running': self._running,
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'flushes': self.flushes,
+            'errors': self.errors,
+            'avg_batch_size': round(self.written / self.flushes, 1) if self.flushes else 0.0,
+            'last_flush_ms': self.last_flush_ms,
+        }
@@ -0,0 +1,349 @@
+# detection/process_inference.py - Inferencia YOLO en procesos separados
+#
+# Los frames viajan a los workers a través de slots de memoria compartida
+# (multiprocessing.shared_memory); por las colas solo pasan índices de slot y
+# las detecciones vuelven como arrays compactos (xyxy, conf, cls).
+import atexit
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .engines import model_path
+
+# Reinicios permitidos por worker antes de darlo por perdido (OOM repetido, etc.)
+MAX_WORKER_RESTARTS = 3
+
+
+def _worker_main(worker_id, model_file, shm_name, slot_bytes, max_batch_size, task_q, result_q):
+    """Proceso worker: carga el modelo una vez y procesa slots de memoria compartida"""
+    # Importar aquí para que el proceso padre no pague torch/ultralytics
+    from ultralytics import YOLO
+    from detection.inference import predict_kwargs, result_to_arrays
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        model = YOLO(model_file, task='detect')
+        result_q.put(('ready', worker_id, dict(model.names)))
+    except Exception as e:
+        result_q.put(('failed', worker_id, str(e)))
+        shm.close()
+        return
+
+    while True:
+        task = task_q.get()
+        if task is None:
+            break
+        tasks = [task]
+        # Vaciar lo que ya esté en cola para aprovechar un forward pass por lotes
+        while len(tasks) < max_batch_size:
+            try:
+                extra = task_q.get_nowait()
+            except queue.Empty:
+                break
+            if extra is None:
+                task_q.put(None)
+                break
+            tasks.append(extra)
+
+        # Un forward pass por grupo de parámetros de predicción
+        groups = {}
+        for job in tasks:
+            groups.setdefault(job[3], []).append(job)
+
+        for options, jobs in groups.items():
+            frames = [
+                np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+                for _, slot, shape, _ in jobs
+            ]
+            results = None
+            try:
+                results = model(frames, verbose=False, **predict_kwargs(options))
+                for (job_id, _, _, _), result in zip(jobs, results):
+                    result_q.put(('ok', job_id, result_to_arrays(result)))
+            except Exception as e:
+                for job_id, _, _, _ in jobs:
+                    result_q.put(('error', job_id, str(e)))
+            finally:
+                # Soltar las vistas sobre la memoria compartida (y los Results
+                # que las referencian) antes de reutilizar el slot
+                del frames, results
+
+    shm.close()
+
+
+class ProcessInferenceService:
+    """
+    Backend de inferencia con N procesos worker. Cada worker carga el modelo
+    una vez; los frames se copian a slots de un anillo de memoria compartida y
+    el número de slots limita cuántos frames pueden estar en vuelo.
+
+    Cada worker tiene su propia cola de tareas y submit() anota a qué worker
+    va cada trabajo (y su slot) al despacharlo. El colector vigila los
+    workers: si uno muere, los trabajos que tenía asignados fallan y sus
+    slots se liberan, y se reinicia con una cola nueva hasta
+    MAX_WORKER_RESTARTS veces. Si no queda ninguno vivo, el servicio se
+    marca no disponible y submit() falla al instante en lugar de esperar al
+    timeout.
+    """
+
+    def __init__(self, weights: str, num_workers: int = 2, num_slots: int = 8,
+                 slot_bytes: int = 1920 * 1080 * 3, max_batch_size: int = 4,
+                 engine: str = 'torch'):
+        self.weights = weights
+        self.engine = engine
+        self.num_workers = max(1, int(num_workers))
+        self.num_slots = max(self.num_workers, int(num_slots))
+        self.slot_bytes = int(slot_bytes)
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.names = {}
+
+        self._lock = threading.Lock()
+        self._running = False
+        self._shm = None
+        self._workers = []
+        self._task_qs = []
+        self._dispatch_lock = threading.Lock()
+        self._result_q = None
+        self._collector = None
+        self._free_slots = queue.Queue()
+        self._futures = {}
+        self._job_ids = itertools.count(1)
+        self._ctx = None
+        self._model_file = None
+        self._assigned = {}      # worker_id -> ids de trabajos despachados y sin resultado
+        self._job_worker = {}    # job_id -> worker_id
+        self._failed_workers = set()
+        self._restarts = {}
+        self.available = True
+        self.last_error = None
+
+        # Métricas
+        self.images = 0
+        self.errors = 0
+        self.workers_ready = 0
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            # La exportación ONNX/OpenVINO (si falta) se hace una vez aquí y
+            # los workers solo cargan el archivo cacheado
+            self._model_file = model_path(self.weights, self.engine)
+            self._ctx = mp.get_context('spawn')
+            self._shm = shared_memory.SharedMemory(create=True, size=self.num_slots * self.slot_bytes)
+            self._result_q = self._ctx.Queue()
+            self._free_slots = queue.Queue()
+            for slot in range(self.num_slots):
+                self._free_slots.put(slot)
+            self._assigned = {}
+            self._job_worker = {}
+            self._failed_workers = set()
+            self._restarts = {}
+            self.available = True
+            self.last_error = None
+
+            self._task_qs = [None] * self.num_workers
+            self._workers = [self._spawn_worker(worker_id) for worker_id in range(self.num_workers)]
+
+            self._running = True
+            self._collector = threading.Thread(
+                target=self._collect_loop,
+                name="InferenceCollectorThread",
+                daemon=True
+            )
+            self._collector.start()
+            atexit.register(self.stop)
+            print(f"[inference] {self.num_workers} workers de proceso iniciados ({self.num_slots} slots compartidos)")
+
+    def _spawn_worker(self, worker_id):
+        """Arranca un worker con una cola de tareas nueva (lo encolado al anterior se descarta)"""
+        task_q = self._ctx.Queue()
+        self._task_qs[worker_id] = task_q
+        self._assigned[worker_id] = set()
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self._model_file, self._shm.name, self.slot_bytes,
+                  self.max_batch_size, task_q, self._result_q),
+            name=f"InferenceWorker-{worker_id}",
+            daemon=True
+        )
+        proc.start()
+        return proc
+
+    def stop(self):
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            for proc, task_q in zip(self._workers, self._task_qs):
+                if proc is not None:
+                    task_q.put(None)
+
+        for proc in self._workers:
+            if proc is None:
+                continue
+            proc.join(timeout=3.0)
+            if proc.is_alive():
+                proc.terminate()
+        self._workers = []
+
+        for future, _ in list(self._futures.values()):
+            future.cancel()
+        self._futures.clear()
+
+        if self._collector and self._collector.is_alive():
+            self._collector.join(timeout=1.0)
+
+        try:
+            self._shm.close()
+            self._shm.unlink()
+        except Exception:
+            pass
+        self._shm = None
+
+    def submit(self, frame, options=(), timeout: float = 5.0) -> Future:
+        """Copia el frame a un slot libre y lo encola para los workers"""
+        if not self._running:
+            self.start()
+        if not self.available:
+            raise RuntimeError(f"Inferencia de proceso no disponible: {self.last_error}")
+
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame de {frame.nbytes} bytes excede el slot ({self.slot_bytes})")
+
+        # Sin slots libres = workers saturados: aplicar backpressure
+        slot = self._free_slots.get(timeout=timeout)
+        view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._shm.buf,
+                          offset=slot * self.slot_bytes)
+        view[...] = frame
+        del view
+
+        job_id = next(self._job_ids)
+        future = Future()
+        with self._dispatch_lock:
+            # El worker con menos trabajos pendientes; la propiedad del slot
+            # queda anotada antes de encolar
+            alive = [w for w, proc in enumerate(self._workers) if proc is not None]
+            if not alive or not self.available:
+                self._free_slots.put(slot)
+                raise RuntimeError(f"Inferencia de proceso no disponible: {self.last_error}")
+            worker_id = min(alive, key=lambda w: len(self._assigned[w]))
+            self._futures[job_id] = (future, slot)
+            self._assigned[worker_id].add(job_id)
+            self._job_worker[job_id] = worker_id
+            self._task_qs[worker_id].put((job_id, slot, frame.shape, options))
+        return future
+
+    def infer(self, frame, timeout: float = None, options=()):
+        """Versión bloqueante de submit() para los hilos de cámara"""
+        return self.submit(frame, options).result(timeout=timeout)
+
+    def _fail_jobs(self, job_ids, message):
+        """Falla los Futures pendientes de `job_ids` y devuelve sus slots (con _dispatch_lock)"""
+        for job_id in list(job_ids):
+            self._job_worker.pop(job_id, None)
+            entry = self._futures.pop(job_id, None)
+            if entry is None:
+                continue
+            future, slot = entry
+            self._free_slots.put(slot)
+            self.errors += 1
+            if not future.done():
+                future.set_exception(RuntimeError(message))
+
+    def _check_workers(self):
+        """Detecta workers muertos: falla sus trabajos y los reinicia o los da por perdidos"""
+        for worker_id, proc in enumerate(self._workers):
+            if proc is None or proc.is_alive() or not self._running:
+                continue
+            message = f"Worker {worker_id} terminó (exitcode {proc.exitcode})"
+            with self._dispatch_lock:
+                # Todo lo despachado a este worker (en curso o aún en su cola)
+                self._fail_jobs(self._assigned.pop(worker_id, ()), message)
+                restarts = self._restarts.get(worker_id, 0)
+                if worker_id in self._failed_workers or restarts >= MAX_WORKER_RESTARTS:
+                    # No carga el modelo o muere una y otra vez: no se reinicia
+                    self._workers[worker_id] = None
+                    self.last_error = self.last_error or message
+                    print(f"[inference] ❌ {message}; no se reinicia")
+                    continue
+                self._restarts[worker_id] = restarts + 1
+                print(f"[inference] ⚠️  {message}; reiniciando ({restarts + 1}/{MAX_WORKER_RESTARTS})")
+                self._workers[worker_id] = self._spawn_worker(worker_id)
+
+        with self._dispatch_lock:
+            if self._running and self.available and not any(self._workers):
+                # Sin workers vivos nadie resolverá lo que queda pendiente
+                self.available = False
+                print(f"[inference] ❌ Sin workers de inferencia: {self.last_error}")
+                self._fail_jobs(list(self._futures), f"Inferencia de proceso no disponible: {self.last_error}")
+
+    def _collect_loop(self):
+        """Recibe resultados de los workers y resuelve los Futures"""
+        last_check = 0.0
+        while self._running:
+            # Vigilar los workers también cuando la cola no se vacía nunca
+            if time.time() - last_check >= 0.5:
+                self._check_workers()
+                last_check = time.time()
+            try:
+                kind, key, payload = self._result_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            if kind == 'ready':
+                self.names = payload
+                self.workers_ready += 1
+                continue
+            if kind == 'failed':
+                print(f"[inference] Worker {key} no pudo cargar el modelo: {payload}")
+                self._failed_workers.add(key)
+                self.last_error = payload
+                continue
+            with self._dispatch_lock:
+                worker_id = self._job_worker.pop(key, None)
+                if worker_id is not None:
+                    self._assigned.get(worker_id, set()).discard(key)
+                entry = self._futures.pop(key, None)
+                if entry is not None:
+                    self._free_slots.put(entry[1])
+            if entry is None:
+                # Trabajo ya fallado (worker reiniciado): su slot ya se liberó
+                continue
+            future, slot = entry
+
+            if kind == 'ok':
+                self.images += 1
+                if not future.done():
+                    future.set_result(payload)
+            else:
+                self.errors += 1
+                if not future.done():
+                    future.set_exception(RuntimeError(payload))
+
+    def get_stats(self):
+        return {
+            'backend': 'process',
+            'engine': self.engine,
+            'running': self._running,
+            'workers': self.num_workers,
+            'workers_ready': self.workers_ready,
+            'workers_alive': sum(1 for proc in self._workers if proc is not None and proc.is_alive()),
+            'worker_restarts': sum(self._restarts.values()),
+            'available': self.available,
+            'last_error': self.last_error,
+            'slots': self.num_slots,
+            'free_slots': self._free_slots.qsize(),
+            'in_flight': len(self._futures),
+            'images': self.images,
+            'errors': self.errors,
+        }
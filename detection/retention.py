@@ -0,0 +1,93 @@
+# detection/retention.py - Retención y compactación de DetectionRecord
+#
+# Política por defecto: filas crudas durante RETENTION_RAW_DAYS, agregados
+# por minuto (MinuteRollup) durante RETENTION_MINUTE_DAYS y agregados por
+# hora (HourlyRollup) después. Todo se hace en transacciones pequeñas por
+# tramos de ids para no bloquear al escritor en vivo.
+import time
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models.functions import TruncMinute
+from django.utils import timezone
+
+from .conf import setting
+from .models import DetectionRecord, HourlyRollup, MinuteRollup
+from .rollups import RAW_AGGREGATES, get_watermark, merge_rollups, update_rollups
+
+
+def _id_chunks(queryset, chunk_size):
+    """Rangos (primer id, último id) de hasta chunk_size filas del queryset, en orden"""
+    while True:
+        ids = list(queryset.order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield ids[0], ids[-1], len(ids)
+        if len(ids) < chunk_size:
+            return
+
+
+def delete_chunked(queryset, chunk_size=5000, pause=0.05):
+    """Borra el queryset por tramos de ids, una transacción corta por tramo"""
+    deleted = 0
+    for first, last, _ in _id_chunks(queryset, chunk_size):
+        with transaction.atomic():
+            deleted += queryset.filter(id__gte=first, id__lte=last).delete()[0]
+        time.sleep(pause)
+    return deleted
+
+
+def compact_raw(cutoff, chunk_size=5000, pause=0.05):
+    """
+    Agrega a MinuteRollup y borra las filas crudas anteriores a `cutoff`.
+    Solo se tocan filas ya incorporadas a HourlyRollup (id <= marca de agua),
+    y agregado y borrado van en la misma transacción.
+    """
+    old = DetectionRecord.objects.filter(timestamp__lt=cutoff, id__lte=get_watermark())
+    compacted = minutes = 0
+    for first, last, _ in _id_chunks(old, chunk_size):
+        chunk = old.filter(id__gte=first, id__lte=last)
+        with transaction.atomic():
+            rows = list(
+                chunk.annotate(minute=TruncMinute('timestamp'))
+                .values('camera_id', 'minute')
+                .annotate(**RAW_AGGREGATES)
+                .order_by()
+            )
+            minutes += len(merge_rollups(MinuteRollup, 'minute', rows))
+            compacted += chunk.delete()[0]
+        time.sleep(pause)
+    return compacted, minutes
+
+
+def compact(raw_days=None, minute_days=None, hourly_days=None, chunk_size=5000,
+            pause=0.05, vacuum=False):
+    """
+    Aplica la política de retención. `hourly_days=None` conserva los
+    rollups horarios indefinidamente. Devuelve un resumen con los conteos.
+    """
+    raw_days = setting('RETENTION_RAW_DAYS', 7) if raw_days is None else raw_days
+    minute_days = setting('RETENTION_MINUTE_DAYS', 90) if minute_days is None else minute_days
+    hourly_days = setting('RETENTION_HOURLY_DAYS', None) if hourly_days is None else hourly_days
+    now = timezone.now()
+
+    # Las horas deben estar agregadas antes de borrar filas crudas
+    update_rollups()
+
+    compacted, minutes = compact_raw(now - timedelta(days=raw_days), chunk_size, pause)
+    summary = {
+        'raw_compacted': compacted,
+        'minutes_written': minutes,
+        'minutes_deleted': delete_chunked(
+            MinuteRollup.objects.filter(minute__lt=now - timedelta(days=minute_days)), chunk_size, pause),
+        'hours_deleted': 0,
+    }
+    if hourly_days:
+        summary['hours_deleted'] = delete_chunked(
+            HourlyRollup.objects.filter(hour__lt=now - timedelta(days=hourly_days)), chunk_size, pause)
+
+    if vacuum and connection.vendor == 'sqlite':
+        # SQLite reutiliza las páginas libres; VACUUM además encoge el archivo
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM')
+    return summary
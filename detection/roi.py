@@ -0,0 +1,99 @@
+# detection/roi.py - Regiones de interés poligonales por cámara
+#
+# La inferencia se hace solo sobre el recorte que contiene los polígonos
+# activos (ultralytics lo redimensiona a imgsz con letterbox); las cajas se
+# devuelven a coordenadas del frame completo y se descartan las que quedan
+# fuera de los polígonos.
+import numpy as np
+
+ANCHORS = ('bottom', 'center')
+
+
+def points_in_polygon(points, polygon):
+    """Test par-impar (ray casting) vectorizado: bool por punto"""
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+    polygon = np.asarray(polygon, dtype=np.float32).reshape(-1, 2)
+    if not len(points) or len(polygon) < 3:
+        return np.zeros(len(points), dtype=bool)
+
+    px, py = points[:, 0:1], points[:, 1:2]
+    xi, yi = polygon[:, 0], polygon[:, 1]
+    xj, yj = np.roll(xi, 1), np.roll(yi, 1)
+    # Aristas horizontales: la división da inf/nan pero crosses ya es False
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = (xj - xi) * (py - yi) / (yj - yi) + xi
+    crosses = ((yi > py) != (yj > py)) & (px < x_cross)
+    return np.count_nonzero(crosses, axis=1) % 2 == 1
+
+
+class RegionMask:
+    """
+    Uno o varios polígonos en píxeles del frame, p. ej.
+    [[(0, 200), (640, 200), (640, 480), (0, 480)]]. Una detección se conserva
+    si su punto de anclaje (centro inferior de la caja = pies, o centro)
+    cae dentro de algún polígono.
+    """
+
+    def __init__(self, polygons, anchor: str = 'bottom'):
+        if anchor not in ANCHORS:
+            raise ValueError(f"anchor inválido: {anchor}")
+        self.polygons = [np.asarray(p, dtype=np.float32).reshape(-1, 2) for p in polygons]
+        if not self.polygons or any(len(p) < 3 for p in self.polygons):
+            raise ValueError("Cada región necesita al menos 3 vértices")
+        self.anchor = anchor
+        points = np.concatenate(self.polygons)
+        self._bounds = np.concatenate([points.min(axis=0), points.max(axis=0)])
+
+        # Métricas
+        self.kept = 0
+        self.dropped = 0
+
+    def bounds(self, frame_shape):
+        """Caja (x1, y1, x2, y2) que contiene todas las regiones, recortada al frame"""
+        h, w = frame_shape[:2]
+        x1, y1 = np.floor(self._bounds[:2]).astype(int)
+        x2, y2 = np.ceil(self._bounds[2:]).astype(int)
+        return (int(np.clip(x1, 0, w)), int(np.clip(y1, 0, h)),
+                int(np.clip(x2, 0, w)), int(np.clip(y2, 0, h)))
+
+    def crop(self, frame):
+        """Recorte del frame (vista, sin copiar) y su offset (x, y)"""
+        x1, y1, x2, y2 = self.bounds(frame.shape)
+        if x2 <= x1 or y2 <= y1:
+            return frame, (0, 0)
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    def anchor_points(self, xyxy):
+        if self.anchor == 'bottom':
+            return np.stack([(xyxy[:, 0] + xyxy[:, 2]) / 2, xyxy[:, 3]], axis=1)
+        return (xyxy[:, :2] + xyxy[:, 2:]) / 2
+
+    def contains(self, xyxy):
+        """Máscara de las cajas (coordenadas del frame) cuyo anclaje está en alguna región"""
+        points = self.anchor_points(np.asarray(xyxy, dtype=np.float32).reshape(-1, 4))
+        inside = np.zeros(len(points), dtype=bool)
+        for polygon in self.polygons:
+            inside |= points_in_polygon(points, polygon)
+        return inside
+
+    def filter(self, xyxy, conf, cls, offset=(0, 0)):
+        """Lleva las cajas del recorte al frame completo y descarta las de fuera"""
+        xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        if offset != (0, 0):
+            xyxy = xyxy + np.asarray(offset * 2, dtype=np.float32)
+        keep = self.contains(xyxy)
+        kept = int(np.count_nonzero(keep))
+        self.kept += kept
+        self.dropped += len(keep) - kept
+        return xyxy[keep], np.asarray(conf)[keep], np.asarray(cls)[keep]
+
+    def to_list(self):
+        return [p.astype(int).tolist() for p in self.polygons]
+
+    def get_stats(self):
+        return {
+            'regions': self.to_list(),
+            'anchor': self.anchor,
+            'kept': self.kept,
+            'dropped': self.dropped,
+        }
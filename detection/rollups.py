@@ -0,0 +1,303 @@
+# detection/rollups.py - Rollups horarios y DailyReport incrementales
+#
+# Solo se procesan los DetectionRecord con id mayor que la marca de agua
+# (RollupWatermark), así que cada pasada cuesta lo que las filas nuevas y no
+# lo que el historial completo.
+from datetime import datetime, timezone
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import Trunc, TruncHour
+
+from .models import DailyReport, DetectionRecord, HourlyRollup, MinuteRollup, RollupWatermark
+
+WATERMARK = 'hourly_rollup'
+
+# Agregados de un grupo de filas crudas, con los nombres de HourlyRollup
+RAW_AGGREGATES = {
+    'samples': Count('id'),
+    'person_sum': Sum('person_count'),
+    'person_max': Max('person_count'),
+    'person_min': Min('person_count'),
+    'occupancy_sum': Sum('occupancy_rate'),
+    'occupancy_max': Max('occupancy_rate'),
+    'occupancy_min': Min('occupancy_rate'),
+}
+
+
+# Los mismos agregados sobre filas de rollup (para reagrupar o fusionar)
+ROLLUP_AGGREGATES = {
+    'samples': Sum('samples'),
+    'person_sum': Sum('person_sum'),
+    'person_max': Max('person_max'),
+    'person_min': Min('person_min'),
+    'occupancy_sum': Sum('occupancy_sum'),
+    'occupancy_max': Max('occupancy_max'),
+    'occupancy_min': Min('occupancy_min'),
+}
+
+
+def get_watermark():
+    """Último id incorporado a los rollups (0 si aún no hay marca); solo lectura"""
+    last_id = RollupWatermark.objects.filter(name=WATERMARK).values_list('last_id', flat=True).first()
+    return last_id or 0
+
+
+def merge_rollups(model, field, rows):
+    """Fusiona agregados (camera_id, `field`) nuevos con los rollups existentes de `model`"""
+    if not rows:
+        return set()
+    keys = {(row['camera_id'], row[field]) for row in rows}
+    existing = {
+        (r.camera_id, getattr(r, field)): r
+        for r in model.objects.filter(**{
+            'camera_id__in': {c for c, _ in keys},
+            f'{field}__gte': min(t for _, t in keys),
+            f'{field}__lte': max(t for _, t in keys),
+        })
+    }
+
+    to_create, to_update = [], []
+    for row in rows:
+        rollup = existing.get((row['camera_id'], row[field]))
+        if rollup is None:
+            to_create.append(model(
+                camera_id=row['camera_id'], **{field: row[field]},
+                **{name: row[name] for name in RAW_AGGREGATES},
+            ))
+            continue
+        rollup.person_max = max(rollup.person_max, row['person_max'])
+        rollup.person_min = min(rollup.person_min, row['person_min']) if rollup.samples else row['person_min']
+        rollup.occupancy_max = max(rollup.occupancy_max, row['occupancy_max'])
+        rollup.occupancy_min = (min(rollup.occupancy_min, row['occupancy_min'])
+                                if rollup.samples else row['occupancy_min'])
+        rollup.samples += row['samples']
+        rollup.person_sum += row['person_sum']
+        rollup.occupancy_sum += row['occupancy_sum']
+        to_update.append(rollup)
+
+    model.objects.bulk_create(to_create)
+    model.objects.bulk_update(to_update, list(RAW_AGGREGATES))
+    return keys
+
+
+def refresh_daily_reports(keys):
+    """Recalcula DailyReport de los (cámara, día) tocados a partir de sus ≤24 rollups"""
+    days = {(camera_id, hour.date()) for camera_id, hour in keys}
+    for camera_id, day in days:
+        totals = HourlyRollup.objects.filter(camera_id=camera_id, hour__date=day).aggregate(
+            samples=Sum('samples'), occupancy_sum=Sum('occupancy_sum'), peak=Max('person_max'),
+        )
+        samples = totals['samples'] or 0
+        DailyReport.objects.update_or_create(
+            camera_id=camera_id, date=day,
+            defaults={
+                'avg_occupancy': round(totals['occupancy_sum'] / samples, 2) if samples else 0.0,
+                'peak_occupancy': totals['peak'] or 0,
+                'total_detections': samples,
+            },
+        )
+    return len(days)
+
+
+def update_rollups(chunk_size: int = 50000):
+    """
+    Incorpora a HourlyRollup/DailyReport las filas nuevas desde la marca de
+    agua, en tramos de `chunk_size` ids (una transacción por tramo).
+    Devuelve (filas procesadas, horas tocadas, días recalculados).
+    """
+    RollupWatermark.objects.get_or_create(name=WATERMARK)
+    max_id = DetectionRecord.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+    processed = hours = days = 0
+
+    while True:
+        with transaction.atomic():
+            # Bloquea la marca de agua (donde se soporte) y reclama el tramo
+            # con un update condicional: si otra pasada concurrente (p. ej.
+            # compact_detections) ya lo movió, no se fusiona dos veces.
+            watermark = RollupWatermark.objects.select_for_update().get(name=WATERMARK)
+            last_id = watermark.last_id
+            if last_id >= max_id:
+                break
+            upper = min(last_id + chunk_size, max_id)
+            claimed = RollupWatermark.objects.filter(
+                name=WATERMARK, last_id=last_id).update(last_id=upper)
+            if not claimed:
+                break
+            rows = list(
+                DetectionRecord.objects.filter(id__gt=last_id, id__lte=upper)
+                .annotate(hour=TruncHour('timestamp'))
+                .values('camera_id', 'hour')
+                .annotate(**RAW_AGGREGATES)
+                .order_by()
+            )
+            keys = merge_rollups(HourlyRollup, 'hour', rows)
+            days += refresh_daily_reports(keys)
+        processed += sum(row['samples'] for row in rows)
+        hours += len(keys)
+
+    return processed, hours, days
+
+
+def occupancy_totals():
+    """
+    Promedio, pico y número de registros por cámara: sumas exactas de
+    HourlyRollup (no los promedios redondeados de DailyReport) más las filas
+    crudas aún no incorporadas a los rollups.
+    """
+    watermark = get_watermark()
+    totals = {}
+    hourly = HourlyRollup.objects.values('camera__name').annotate(
+        occupancy_sum=Sum('occupancy_sum'),
+        peak=Max('person_max'),
+        records=Sum('samples'),
+    ).order_by()
+    for row in hourly:
+        totals[row['camera__name']] = [row['occupancy_sum'] or 0.0, row['peak'] or 0, row['records'] or 0]
+
+    # Bucket parcial: filas posteriores a la marca de agua
+    partial = DetectionRecord.objects.filter(id__gt=watermark).values('camera__name').annotate(
+        occupancy_sum=Sum('occupancy_rate'), peak=Max('person_count'), records=Count('id'),
+    ).order_by()
+    for row in partial:
+        entry = totals.setdefault(row['camera__name'], [0.0, 0, 0])
+        entry[0] += row['occupancy_sum'] or 0.0
+        entry[1] = max(entry[1], row['peak'] or 0)
+        entry[2] += row['records']
+
+    return [
+        {
+            'camera__name': name,
+            'avg_occupancy': occupancy_sum / records if records else None,
+            'peak_occupancy': peak,
+            'total_records': records,
+        }
+        for name, (occupancy_sum, peak, records) in sorted(totals.items())
+    ]
+
+
+# ============================================================
+# Consultas por buckets de tiempo
+# ============================================================
+
+MIN_BUCKET = 60
+MAX_BUCKET = 86400
+MAX_BUCKETS = 10000
+
+# Granularidades que sabe truncar la base de datos, de mayor a menor
+_TRUNCS = ((86400, 'day'), (3600, 'hour'), (60, 'minute'))
+
+
+def parse_bucket(value):
+    """'5m', '1h', '1d' o segundos -> segundos (entre 1 min y 1 día, múltiplo de 60)"""
+    units = {'m': 60, 'h': 3600, 'd': 86400}
+    value = str(value).strip().lower()
+    if value and value[-1] in units:
+        seconds = int(value[:-1]) * units[value[-1]]
+    else:
+        seconds = int(value)
+    if not MIN_BUCKET <= seconds <= MAX_BUCKET or seconds % 60:
+        raise ValueError('bucket debe estar entre 1m y 1d y ser múltiplo de 1m')
+    return seconds
+
+
+def _base_trunc(bucket_seconds):
+    """Mayor granularidad SQL que divide al bucket (el resto se combina en Python)"""
+    for seconds, kind in _TRUNCS:
+        if bucket_seconds % seconds == 0:
+            return seconds, kind
+    return 60, 'minute'
+
+
+def _accumulate(buckets, camera, start_ts, bucket_seconds, row):
+    key = (camera, int(start_ts // bucket_seconds) * bucket_seconds)
+    acc = buckets.get(key)
+    if acc is None:
+        buckets[key] = [row['samples'], row['person_sum'], row['person_max'], row['person_min'],
+                        row['occupancy_sum'], row['occupancy_max'], row['occupancy_min']]
+        return
+    acc[0] += row['samples']
+    acc[1] += row['person_sum']
+    acc[2] = max(acc[2], row['person_max'])
+    acc[3] = min(acc[3], row['person_min'])
+    acc[4] += row['occupancy_sum']
+    acc[5] = max(acc[5], row['occupancy_max'])
+    acc[6] = min(acc[6], row['occupancy_min'])
+
+
+def align_range(start, end, bucket_seconds):
+    """Extiende [start, end) a múltiplos de bucket_seconds (UTC) y limita el número de buckets"""
+    start_ts = int(start.timestamp() // bucket_seconds) * bucket_seconds
+    end_ts = -(-int(end.timestamp()) // bucket_seconds) * bucket_seconds
+    if (end_ts - start_ts) / bucket_seconds > MAX_BUCKETS:
+        raise ValueError(f"El rango pide más de {MAX_BUCKETS} buckets")
+    return (datetime.fromtimestamp(start_ts, tz=timezone.utc),
+            datetime.fromtimestamp(end_ts, tz=timezone.utc))
+
+
+def _rollup_rows(model, field, kind, start, end, cameras=None):
+    """Rollups de `model` en [start, end) reagrupados en SQL a la granularidad `kind`"""
+    rollups = model.objects.filter(**{f'{field}__gte': start, f'{field}__lt': end})
+    if cameras:
+        rollups = rollups.filter(camera__name__in=cameras)
+    return (rollups.annotate(base=Trunc(field, kind, tzinfo=timezone.utc))
+            .values('camera__name', 'base')
+            .annotate(**ROLLUP_AGGREGATES)
+            .order_by())
+
+
+def bucketed_occupancy(start, end, bucket_seconds, cameras=None):
+    """
+    Media, máximo y mínimo de personas y ocupación por cámara y bucket en
+    [start, end). El GROUP BY se hace en SQL sobre timestamps truncados y
+    sobre los rollups (HourlyRollup si el bucket es de horas enteras,
+    MinuteRollup para lo ya compactado), así que el coste
+    depende del número de buckets y no del de filas. Los límites se alinean
+    a múltiplos de `bucket_seconds` (UTC).
+    """
+    start, end = align_range(start, end, bucket_seconds)
+
+    base_seconds, kind = _base_trunc(bucket_seconds)
+    buckets = {}
+
+    raw = DetectionRecord.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    if cameras:
+        raw = raw.filter(camera__name__in=cameras)
+
+    if base_seconds >= 3600:
+        # Horas ya agregadas + filas crudas posteriores a la marca de agua
+        for row in _rollup_rows(HourlyRollup, 'hour', kind, start, end, cameras):
+            _accumulate(buckets, row['camera__name'], row['base'].timestamp(), bucket_seconds, row)
+        raw = raw.filter(id__gt=get_watermark())
+    else:
+        # Minutos ya compactados (sus filas crudas se borraron al agregarlos)
+        for row in _rollup_rows(MinuteRollup, 'minute', kind, start, end, cameras):
+            _accumulate(buckets, row['camera__name'], row['base'].timestamp(), bucket_seconds, row)
+
+    rows = (raw.annotate(base=Trunc('timestamp', kind, tzinfo=timezone.utc))
+            .values('camera__name', 'base')
+            .annotate(**RAW_AGGREGATES)
+            .order_by())
+    for row in rows:
+        _accumulate(buckets, row['camera__name'], row['base'].timestamp(), bucket_seconds, row)
+
+    series = {}
+    for (camera, bucket_start), acc in sorted(buckets.items()):
+        samples, person_sum, person_max, person_min, occ_sum, occ_max, occ_min = acc
+        series.setdefault(camera, []).append({
+            'start': datetime.fromtimestamp(bucket_start, tz=timezone.utc).isoformat(),
+            'samples': samples,
+            'avg_persons': round(person_sum / samples, 2),
+            'max_persons': person_max,
+            'min_persons': person_min,
+            'avg_occupancy': round(occ_sum / samples, 2),
+            'max_occupancy': round(occ_max, 2),
+            'min_occupancy': round(occ_min, 2),
+        })
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'bucket_seconds': bucket_seconds,
+        'source_granularity': kind,
+        'cameras': series,
+    }
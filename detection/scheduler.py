@@ -0,0 +1,104 @@
+# detection/scheduler.py - Presupuesto global de inferencias con prioridades por cámara
+import threading
+import time
+
+
+class DetectionScheduler:
+    """
+    Reparte un presupuesto global de inferencias por segundo entre las
+    cámaras activas. Las cámaras con visores, movimiento reciente u ocupación
+    alta reciben primero su tasa pedida (1 / detection_interval); con
+    sobrecarga, las de menor prioridad bajan hacia `min_rate` en lugar de
+    degradar a todas por igual.
+    """
+
+    def __init__(self, cameras_provider, budget: float = 10.0,
+                 min_rate: float = 0.05, rebalance_interval: float = 1.0):
+        self.cameras_provider = cameras_provider
+        self.budget = float(budget)
+        self.min_rate = float(min_rate)
+        self.rebalance_interval = rebalance_interval
+        self._lock = threading.Lock()
+        self._allocations = {}
+        self._priorities = {}
+        self._last_rebalance = 0.0
+        self.overloaded = False
+
+    @staticmethod
+    def priority(cam) -> float:
+        """Puntuación de prioridad: base configurable + visores + movimiento + ocupación"""
+        score = float(getattr(cam, 'priority', 1.0))
+        if cam.has_viewers():
+            score += 4.0
+        if cam.motion_gate.had_recent_motion():
+            score += 2.0
+        score += min(cam.last_detections.person_count, 20) / 10.0
+        return score
+
+    def rebalance(self):
+        cameras = [cam for cam in self.cameras_provider() if cam._running]
+        priorities = {cam.camera_id: self.priority(cam) for cam in cameras}
+        demands = {cam.camera_id: 1.0 / max(cam.detection_interval, 1e-3) for cam in cameras}
+        ordered = sorted(cameras, key=lambda c: priorities[c.camera_id], reverse=True)
+
+        allocations = {}
+        remaining = self.budget
+        if ordered:
+            # Suelo para que ninguna cámara se quede sin detecciones
+            floor = min(self.min_rate, self.budget / len(ordered))
+            for cam in ordered:
+                allocations[cam.camera_id] = min(floor, demands[cam.camera_id])
+                remaining -= allocations[cam.camera_id]
+
+            # El resto del presupuesto va por orden de prioridad
+            for cam in ordered:
+                extra = min(demands[cam.camera_id] - allocations[cam.camera_id], max(remaining, 0.0))
+                allocations[cam.camera_id] += extra
+                remaining -= extra
+
+        with self._lock:
+            self._allocations = allocations
+            self._priorities = priorities
+            self._last_rebalance = time.time()
+            self.overloaded = sum(demands.values()) > self.budget
+
+    def _maybe_rebalance(self):
+        if time.time() - self._last_rebalance >= self.rebalance_interval:
+            self.rebalance()
+
+    def allocated_rate(self, cam) -> float:
+        self._maybe_rebalance()
+        with self._lock:
+            rate = self._allocations.get(cam.camera_id)
+        if rate is None:
+            return 1.0 / max(cam.detection_interval, 1e-3)
+        return rate
+
+    def interval_for(self, cam) -> float:
+        """Intervalo efectivo entre detecciones para la cámara"""
+        rate = self.allocated_rate(cam)
+        if rate <= 0:
+            return float('inf')
+        return max(1.0 / rate, cam.detection_interval)
+
+    def priority_of(self, cam) -> float:
+        with self._lock:
+            return self._priorities.get(cam.camera_id, 0.0)
+
+    def get_stats(self):
+        self._maybe_rebalance()
+        with self._lock:
+            allocated = sum(self._allocations.values())
+            return {
+                'budget': self.budget,
+                'allocated': round(allocated, 3),
+                'min_rate': self.min_rate,
+                'overloaded': self.overloaded,
+                'cameras': {
+                    camera_id: {
+                        'rate': round(rate, 3),
+                        'priority': round(self._priorities.get(camera_id, 0.0), 2),
+                    }
+                    for camera_id, rate in self._allocations.items()
+                },
+            }
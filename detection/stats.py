@@ -0,0 +1,202 @@
+# detection/stats.py - Estadísticas incrementales por cámara
+import math
+import threading
+import time
+
+import numpy as np
+
+# (nombre, segundos por bucket, número de buckets)
+WINDOWS = (
+    ('1m', 1.0, 60),
+    ('15m', 15.0, 60),
+    ('1h', 60.0, 60),
+)
+
+# Clases COCO; el array crece si el modelo tiene más
+NUM_CLASSES = 80
+
+
+class _Window:
+    """
+    Ventana deslizante de buckets con totales acumulados: al avanzar solo se
+    restan los buckets que caducan, así que actualizar y leer no dependen
+    del número de pasadas dentro de la ventana.
+    """
+
+    def __init__(self, bucket_seconds, num_buckets, num_classes):
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets = num_buckets
+        self.counts = np.zeros((num_buckets, num_classes), dtype=np.int64)
+        self.conf_sum = np.zeros(num_buckets, dtype=np.float64)
+        self.detections = np.zeros(num_buckets, dtype=np.int64)
+        self.passes = np.zeros(num_buckets, dtype=np.int64)
+        self.persons = np.zeros(num_buckets, dtype=np.int64)
+        self.peak = np.zeros(num_buckets, dtype=np.int64)
+        self.total_counts = np.zeros(num_classes, dtype=np.int64)
+        self.total_conf = 0.0
+        self.total_detections = 0
+        self.total_passes = 0
+        self.total_persons = 0
+        self.current = None
+
+    def grow(self, num_classes):
+        extra = num_classes - self.counts.shape[1]
+        self.counts = np.pad(self.counts, ((0, 0), (0, extra)))
+        self.total_counts = np.pad(self.total_counts, (0, extra))
+
+    def advance(self, now):
+        """Mueve la ventana hasta `now` vaciando los buckets caducados"""
+        index = int(now // self.bucket_seconds)
+        if self.current is None:
+            self.current = index
+            return
+        steps = index - self.current
+        if steps <= 0:
+            return
+        for i in range(self.current + 1, self.current + 1 + min(steps, self.num_buckets)):
+            slot = i % self.num_buckets
+            self.total_counts -= self.counts[slot]
+            self.total_conf -= self.conf_sum[slot]
+            self.total_detections -= int(self.detections[slot])
+            self.total_passes -= int(self.passes[slot])
+            self.total_persons -= int(self.persons[slot])
+            self.counts[slot] = 0
+            self.conf_sum[slot] = 0.0
+            self.detections[slot] = 0
+            self.passes[slot] = 0
+            self.persons[slot] = 0
+            self.peak[slot] = 0
+        self.current = index
+
+    def add(self, class_counts, conf_sum, detections, persons):
+        slot = self.current % self.num_buckets
+        n = len(class_counts)
+        self.counts[slot, :n] += class_counts
+        self.total_counts[:n] += class_counts
+        self.conf_sum[slot] += conf_sum
+        self.total_conf += conf_sum
+        self.detections[slot] += detections
+        self.total_detections += detections
+        self.passes[slot] += 1
+        self.total_passes += 1
+        self.persons[slot] += persons
+        self.total_persons += persons
+        self.peak[slot] = max(self.peak[slot], persons)
+
+    def snapshot(self, label_of):
+        return {
+            'passes': self.total_passes,
+            'detections': self.total_detections,
+            'labels': {label_of(int(c)): int(self.total_counts[c])
+                       for c in np.flatnonzero(self.total_counts)},
+            'avg_confidence': round(self.total_conf / self.total_detections, 3)
+            if self.total_detections else 0.0,
+            'avg_persons': round(self.total_persons / self.total_passes, 2)
+            if self.total_passes else 0.0,
+            'peak_persons': int(self.peak.max()),
+        }
+
+
+class RollingStats:
+    """
+    Agregador actualizado una vez por pasada de YOLO: conteos por etiqueta,
+    confianza media y pico de personas en ventanas de 1 min / 15 min / 1 h,
+    más medias exponenciales (constante de tiempo `tau` segundos). Las
+    lecturas devuelven un snapshot cacheado que solo se recalcula si hubo
+    una pasada nueva o avanzó el reloj de alguna ventana.
+    """
+
+    def __init__(self, tau: float = 60.0, num_classes: int = NUM_CLASSES):
+        self.tau = tau
+        self.num_classes = num_classes
+        self._windows = {name: _Window(seconds, buckets, num_classes)
+                         for name, seconds, buckets in WINDOWS}
+        self._lock = threading.Lock()
+        self.names = {}
+        self.passes = 0
+        self.total_detections = 0
+        self.ewma_persons = 0.0
+        self.ewma_counts = np.zeros(num_classes, dtype=np.float64)
+        self._last_update = None
+        self._last = None
+        self._snapshot = None
+        self._snapshot_key = None
+
+    def update(self, batch, now: float = None, persons: int = None):
+        """
+        Incorpora una pasada de detección (DetectionBatch). `persons`
+        sustituye al conteo de personas del batch (p. ej. tracks confirmados).
+        """
+        now = time.time() if now is None else now
+        counts = batch.class_counts()
+        persons = batch.person_count if persons is None else int(persons)
+        conf_sum = float(batch.conf.sum())
+        with self._lock:
+            if len(counts) > self.num_classes:
+                self.num_classes = len(counts)
+                self.ewma_counts = np.pad(self.ewma_counts, (0, self.num_classes - len(self.ewma_counts)))
+                for window in self._windows.values():
+                    window.grow(self.num_classes)
+            if batch.names:
+                self.names = batch.names
+
+            for window in self._windows.values():
+                window.advance(now)
+                window.add(counts, conf_sum, len(batch), persons)
+
+            # EWMA con alpha según el tiempo transcurrido (pasadas irregulares)
+            full = np.zeros(self.num_classes, dtype=np.float64)
+            full[:len(counts)] = counts
+            if self._last_update is None:
+                self.ewma_persons = float(persons)
+                self.ewma_counts = full
+            else:
+                alpha = 1.0 - math.exp(-max(now - self._last_update, 0.0) / self.tau)
+                self.ewma_persons += alpha * (persons - self.ewma_persons)
+                self.ewma_counts += alpha * (full - self.ewma_counts)
+            self._last_update = now
+
+            self.passes += 1
+            self.total_detections += len(batch)
+            self._last = {
+                'person_count': persons,
+                'total_detections': len(batch),
+                'avg_confidence': round(conf_sum / len(batch), 3) if len(batch) else 0.0,
+                'labels': batch.label_counts(),
+                'timestamp': batch.iso_timestamp(),
+            }
+            self._snapshot = None
+
+    def _label_of(self, class_id):
+        return self.names.get(class_id, str(class_id))
+
+    def get_stats(self, now: float = None):
+        """Snapshot de las estadísticas (cacheado hasta la próxima pasada o bucket)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            key = tuple(int(now // seconds) for _, seconds, _ in WINDOWS)
+            if self._snapshot is not None and self._snapshot_key == key:
+                return self._snapshot
+
+            windows = {}
+            for name, window in self._windows.items():
+                window.advance(now)
+                windows[name] = window.snapshot(self._label_of)
+
+            last = self._last or {
+                'person_count': 0, 'total_detections': 0, 'avg_confidence': 0.0,
+                'labels': {}, 'timestamp': None,
+            }
+            self._snapshot = {
+                **last,
+                'passes': self.passes,
+                'lifetime_detections': self.total_detections,
+                'ewma_persons': round(self.ewma_persons, 2),
+                'ewma_labels': {self._label_of(int(c)): round(float(self.ewma_counts[c]), 2)
+                                for c in np.flatnonzero(self.ewma_counts >= 0.01)},
+                'windows': windows,
+                'last_hour_count': windows['1h']['detections'],
+                'peak_persons_1h': windows['1h']['peak_persons'],
+            }
+            self._snapshot_key = key
+            return self._snapshot
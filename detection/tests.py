@@ -1,3 +1,1057 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import math
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+import numpy as np
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import model_registry, pagination
+from .camera_manager import Camera as LiveCamera, camera_manager
+from .detections import DetectionBatch
+from .engines import box_iou, ensure_exported, export_path, map50, model_path
+from .export import COLUMNS, available_formats, iter_export
+from .history import DetectionHistory
+from .inference import BatchInferenceService, predict_kwargs, predict_options, result_to_arrays
+from .models import Camera, DailyReport, DetectionRecord, HourlyRollup, MinuteRollup, RollupWatermark
+from .motion import MotionGate
+from .retention import compact
+from .roi import RegionMask, points_in_polygon
+from .pagination import iter_keyset, keyset_page, parse_range, stream_json_array
+from .persistence import CameraCache, DetectionWriter, sample_from_batch, save_samples
+from .process_inference import ProcessInferenceService
+from .rollups import (RAW_AGGREGATES, ROLLUP_AGGREGATES, align_range, bucketed_occupancy,
+                      occupancy_totals, parse_bucket, update_rollups)
+from .scheduler import DetectionScheduler
+from .stats import RollingStats
+from .timeseries import SAMPLE_DTYPE, TimeSeriesStore, decode_cursor, encode_cursor
+from .tracker import Tracker
+from .views import camera_stats_api
+from .yolo_detector import AttendanceDetector, assign_seats
+
+
+class CompactionTest(TestCase):
+    """La compactación borra filas crudas: los agregados deben quedar idénticos"""
+
+    def setUp(self):
+        # Dos cámaras, tres horas de muestras cada 20 s hace 10 días (fuera de RETENTION_RAW_DAYS)
+        self.start = (timezone.now() - timedelta(days=10)).replace(minute=0, second=0, microsecond=0)
+        self.end = self.start + timedelta(hours=3)
+        records = []
+        for index, name in enumerate(('aula-1', 'aula-2')):
+            camera = Camera.objects.create(name=name, stream_url='http://example.com/stream')
+            for i in range(3 * 180):
+                persons = (i * 7 + index) % 13
+                records.append(DetectionRecord(
+                    camera=camera,
+                    person_count=persons,
+                    chair_count=12,
+                    # Múltiplos de 0.25: las sumas no dependen del orden
+                    occupancy_rate=persons * 2.5 + 0.25 * (i % 4),
+                    timestamp=self.start + timedelta(seconds=20 * i),
+                ))
+        DetectionRecord.objects.bulk_create(records)
+
+    def _snapshot(self):
+        return {
+            seconds: bucketed_occupancy(self.start, self.end, seconds)['cameras']
+            for seconds in (60, 3600)
+        }
+
+    def _hourly_totals(self):
+        return HourlyRollup.objects.aggregate(**ROLLUP_AGGREGATES)
+
+    def test_compaction_preserves_aggregates(self):
+        raw = DetectionRecord.objects.aggregate(**RAW_AGGREGATES)
+
+        update_rollups()
+        self.assertEqual(self._hourly_totals(), raw)
+        before = self._snapshot()
+        daily_before = list(DailyReport.objects.order_by('camera_id', 'date').values(
+            'camera_id', 'date', 'avg_occupancy', 'peak_occupancy', 'total_detections'))
+        self.assertEqual(len(before[60]['aula-1']), 180)
+        self.assertEqual(len(before[3600]['aula-2']), 3)
+
+        summary = compact(raw_days=7, minute_days=90, pause=0)
+
+        self.assertEqual(summary['raw_compacted'], raw['samples'])
+        self.assertFalse(DetectionRecord.objects.exists())
+        self.assertEqual(self._hourly_totals(), raw)
+        self.assertEqual(MinuteRollup.objects.aggregate(**ROLLUP_AGGREGATES), raw)
+        self.assertEqual(self._snapshot(), before)
+        self.assertEqual(list(DailyReport.objects.order_by('camera_id', 'date').values(
+            'camera_id', 'date', 'avg_occupancy', 'peak_occupancy', 'total_detections')), daily_before)
+
+    def test_rerun_is_idempotent(self):
+        update_rollups()
+        compact(raw_days=7, minute_days=90, pause=0)
+        after = self._snapshot()
+        totals = self._hourly_totals()
+
+        # Ni la marca de agua ni los rollups cambian en una segunda pasada
+        self.assertEqual(update_rollups(), (0, 0, 0))
+        compact(raw_days=7, minute_days=90, pause=0)
+        self.assertEqual(self._hourly_totals(), totals)
+        self.assertEqual(self._snapshot(), after)
+
+
+class RollupTest(TestCase):
+    def setUp(self):
+        camera = Camera.objects.create(name='aula-1', stream_url='http://example.com/stream')
+        start = timezone.now() - timedelta(hours=5)
+        DetectionRecord.objects.bulk_create([
+            DetectionRecord(camera=camera, person_count=i % 5, chair_count=3,
+                            occupancy_rate=100 / 3 * (i % 4), timestamp=start + timedelta(minutes=7 * i))
+            for i in range(40)
+        ])
+
+    def test_totals_match_raw_rows_and_read_does_not_write(self):
+        expected = occupancy_totals()
+        self.assertFalse(RollupWatermark.objects.exists())
+        self.assertEqual(expected[0]['total_records'], 40)
+
+        update_rollups()
+        totals = occupancy_totals()
+        self.assertEqual(totals[0]['total_records'], 40)
+        self.assertEqual(totals[0]['peak_occupancy'], expected[0]['peak_occupancy'])
+        self.assertAlmostEqual(totals[0]['avg_occupancy'], expected[0]['avg_occupancy'], places=9)
+
+    def test_update_rollups_is_incremental(self):
+        self.assertEqual(update_rollups()[0], 40)
+        self.assertEqual(update_rollups(), (0, 0, 0))
+        self.assertEqual(HourlyRollup.objects.aggregate(**ROLLUP_AGGREGATES)['samples'], 40)
+
+    def test_small_chunks_merge_into_the_same_rollups(self):
+        def snapshot():
+            hourly = list(HourlyRollup.objects.order_by('hour').values(
+                'hour', 'samples', 'person_sum', 'person_min', 'person_max', 'occupancy_max'))
+            daily = list(DailyReport.objects.order_by('date').values(
+                'date', 'avg_occupancy', 'peak_occupancy', 'total_detections'))
+            return hourly, daily
+
+        update_rollups()
+        expected = snapshot()
+        HourlyRollup.objects.all().delete()
+        DailyReport.objects.all().delete()
+        RollupWatermark.objects.all().delete()
+
+        # Tramos de 3 ids: cada hora se fusiona en varias pasadas
+        update_rollups(chunk_size=3)
+        self.assertEqual(snapshot(), expected)
+        self.assertEqual(sum(r['total_detections'] for r in expected[1]), 40)
+
+
+class BucketedOccupancyTest(TestCase):
+    def setUp(self):
+        camera = Camera.objects.create(name='aula-1', stream_url='http://example.com/stream')
+        self.start = datetime(2026, 3, 1, 8, tzinfo=dt_timezone.utc)
+        # Una muestra por minuto durante dos horas
+        DetectionRecord.objects.bulk_create([
+            DetectionRecord(camera=camera, person_count=i % 10, chair_count=10, occupancy_rate=(i % 10) * 10.0,
+                            timestamp=self.start + timedelta(minutes=i, seconds=30))
+            for i in range(120)
+        ])
+
+    def test_parse_bucket(self):
+        self.assertEqual([parse_bucket(v) for v in ('5m', '1h', '1D', '900')], [300, 3600, 86400, 900])
+        for value in ('30', '2d', '90s', 'abc', '0m'):
+            with self.assertRaises(ValueError, msg=value):
+                parse_bucket(value)
+
+    def test_align_range(self):
+        start, end = align_range(self.start + timedelta(minutes=7), self.start + timedelta(minutes=61), 900)
+        self.assertEqual((start, end), (self.start, self.start + timedelta(minutes=75)))
+        with self.assertRaises(ValueError):
+            align_range(self.start, self.start + timedelta(days=30), 60)
+
+    def test_buckets_aggregate_raw_and_rolled_up_rows(self):
+        end = self.start + timedelta(hours=2)
+        quarter = bucketed_occupancy(self.start, end, 900)['cameras']['aula-1']
+        self.assertEqual(len(quarter), 8)
+        self.assertEqual(quarter[0]['samples'], 15)
+        self.assertEqual((quarter[0]['max_persons'], quarter[0]['min_persons']), (9, 0))
+
+        hourly = bucketed_occupancy(self.start, end, 3600)
+        update_rollups()
+        self.assertEqual(bucketed_occupancy(self.start, end, 3600), hourly)
+        self.assertEqual([b['avg_persons'] for b in hourly['cameras']['aula-1']], [4.5, 4.5])
+
+    def test_endpoint(self):
+        response = self.client.get('/api/occupancy/buckets/', {
+            'from_date': '2026-03-01', 'to_date': '2026-03-01', 'bucket': '1h', 'storage': 'db'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['cameras']['aula-1']), 2)
+        response = self.client.get('/api/occupancy/buckets/', {
+            'from_date': '2026-03-01', 'to_date': '2026-03-01', 'bucket': '7s'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/occupancy/buckets/').status_code, 400)
+
+
+class DetectionHistoryApiTest(TestCase):
+    def setUp(self):
+        camera = Camera.objects.create(name='aula-1', stream_url='http://example.com/stream')
+        start = timezone.now() - timedelta(hours=1)
+        DetectionRecord.objects.bulk_create([
+            DetectionRecord(camera=camera, person_count=i, chair_count=10, occupancy_rate=i * 10.0,
+                            timestamp=start + timedelta(seconds=i))
+            for i in range(5)
+        ])
+
+    def test_rejects_non_positive_or_invalid_page_size(self):
+        for value in ('0', '-1', 'abc'):
+            response = self.client.get('/api/history/aula-1/', {'source': 'db', 'page_size': value})
+            self.assertEqual(response.status_code, 400, value)
+        response = self.client.get('/api/history/aula-1/', {'source': 'db', 'limit': '0'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_pages_by_name_or_pk(self):
+        pk = Camera.objects.get(name='aula-1').pk
+        for camera_id in ('aula-1', str(pk)):
+            first = self.client.get(f'/api/history/{camera_id}/', {'source': 'db', 'page_size': 3}).json()
+            self.assertEqual([r['person_count'] for r in first['database_records']], [0, 1, 2])
+            rest = self.client.get(f'/api/history/{camera_id}/', {
+                'source': 'db', 'page_size': 3, 'cursor': first['next_cursor']}).json()
+            self.assertEqual([r['person_count'] for r in rest['database_records']], [3, 4])
+            self.assertIsNone(rest['next_cursor'])
+
+
+class PaginationTest(TestCase):
+    def setUp(self):
+        camera = Camera.objects.create(name='aula-1', stream_url='http://example.com/stream')
+        self.moment = datetime(2026, 3, 1, 8, tzinfo=dt_timezone.utc)
+        # Cinco filas con el mismo timestamp: el desempate es el id
+        DetectionRecord.objects.bulk_create([
+            DetectionRecord(camera=camera, person_count=i, chair_count=10, occupancy_rate=0.0,
+                            timestamp=self.moment + timedelta(seconds=i // 5))
+            for i in range(12)
+        ])
+        self.queryset = DetectionRecord.objects.filter(camera=camera)
+
+    def test_cursor_round_trip(self):
+        cursor = pagination.encode_cursor(self.moment, 42)
+        self.assertNotIn('=', cursor)
+        self.assertEqual(pagination.decode_cursor(cursor), (self.moment, 42))
+        with self.assertRaises(ValueError):
+            pagination.decode_cursor('no-es-un-cursor')
+
+    def test_parse_range_includes_whole_end_day(self):
+        start, end = parse_range('2026-03-01', '2026-03-01')
+        self.assertEqual(end - start, timedelta(days=1))
+        self.assertEqual(start.tzinfo, dt_timezone.utc)
+        self.assertEqual(parse_range(), (None, None))
+
+    def test_keyset_pages_do_not_skip_ties(self):
+        seen, cursor = [], None
+        while True:
+            rows, next_cursor = keyset_page(self.queryset, cursor, page_size=4)
+            seen.extend(row[1] for row in rows)
+            if next_cursor is None:
+                break
+            cursor = pagination.decode_cursor(next_cursor)
+        self.assertEqual(seen, list(range(12)))
+
+        chunks = list(iter_keyset(self.queryset, chunk_size=5))
+        self.assertEqual([len(c) for c in chunks], [5, 5, 2])
+
+    def test_streamed_json_is_valid(self):
+        body = ''.join(stream_json_array(iter_keyset(self.queryset, chunk_size=5),
+                                         header={'camera': 'aula-1'}, camera_name='aula-1'))
+        data = json.loads(body)
+        self.assertEqual((data['camera'], data['count'], len(data['records'])), ('aula-1', 12, 12))
+        self.assertEqual(data['records'][0]['camera_name'], 'aula-1')
+        self.assertEqual(json.loads(''.join(stream_json_array([])))['count'], 0)
+
+
+class TimeSeriesStoreTest(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = TimeSeriesStore(self.tmp.name)
+        # 23:00 a 01:00 UTC: dos archivos de día
+        self.start = datetime(2026, 1, 1, 23, tzinfo=dt_timezone.utc)
+
+    def _records(self, first, count, step=60):
+        base = int(self.start.timestamp()) * 10**9
+        records = np.zeros(count, dtype=SAMPLE_DTYPE)
+        records['ts_ns'] = base + (first + np.arange(count)) * step * 10**9
+        records['person_count'] = np.arange(first, first + count) % 7
+        records['chair_count'] = 10
+        records['occupancy'] = records['person_count'] * 10
+        return records
+
+    def test_read_page_walks_range_across_days(self):
+        self.store.append('aula-1', self._records(0, 120))
+        seen, cursor = [], None
+        while True:
+            page, cursor = self.store.read_page('aula-1', cursor=cursor, limit=50)
+            seen.extend(page['ts_ns'].tolist())
+            if cursor is None:
+                break
+            cursor = decode_cursor(encode_cursor(cursor))
+        self.assertEqual(seen, self._records(0, 120)['ts_ns'].tolist())
+
+    def test_read_page_keeps_repeated_timestamps(self):
+        records = self._records(0, 10)
+        records['ts_ns'] = records['ts_ns'][0]
+        self.store.append('aula-1', records)
+        first, cursor = self.store.read_page('aula-1', limit=4)
+        rest, end = self.store.read_page('aula-1', cursor=cursor, limit=10)
+        self.assertEqual(len(first) + len(rest), 10)
+        self.assertIsNone(end)
+
+    def test_read_page_rejects_zero_limit(self):
+        with self.assertRaises(ValueError):
+            self.store.read_page('aula-1', limit=0)
+
+    def test_summary(self):
+        records = self._records(0, 90)
+        self.store.append('aula-1', records)
+        summary = self.store.summary('aula-1')
+        self.assertEqual(summary['total_records'], 90)
+        self.assertEqual(summary['peak_occupancy'], int(records['person_count'].max()))
+        self.assertAlmostEqual(summary['avg_occupancy'], float(records['occupancy'].mean()), places=4)
+
+    def test_other_instance_sees_new_days(self):
+        reader = TimeSeriesStore(self.tmp.name)
+        self.store.append('aula-1', self._records(0, 30))
+        self.assertEqual(reader.count('aula-1'), 30)
+        # Más muestras (y un día nuevo) escritas por otra instancia
+        self.store.append('aula-1', self._records(30, 90))
+        self.assertEqual(reader.count('aula-1'), 120)
+        end = self.start + timedelta(hours=2)
+        self.assertEqual(len(reader.read('aula-1', self.start + timedelta(hours=1), end)), 60)
+
+
+def _person_batch(persons, ts, others=0, camera_id='aula-1'):
+    """DetectionBatch con `persons` personas y `others` sillas en el instante `ts`"""
+    cls = [0] * persons + [56] * others
+    xyxy = np.array([[10 * i, 0, 10 * i + 8, 20] for i in range(len(cls))], dtype=np.float32)
+    return DetectionBatch(camera_id, xyxy.reshape(-1, 4), np.full(len(cls), 0.8, dtype=np.float32),
+                          np.array(cls, dtype=np.int16), ts, {0: 'person', 56: 'chair'})
+
+
+class _ListWriter:
+    """Escritor en memoria con la interfaz de DetectionWriter.submit()"""
+
+    def __init__(self):
+        self.samples = []
+
+    def submit(self, sample):
+        self.samples.append(sample)
+
+
+class CameraPassTest(SimpleTestCase):
+    def setUp(self):
+        self.camera = LiveCamera('aula-1', 'clase.mp4', tracking=False, classes=[0])
+        self.camera.writer = _ListWriter()
+
+    def test_failed_pass_is_not_recorded(self):
+        self.camera._record_pass(_person_batch(1, time.time(), others=2), time.time())
+        self.camera._record_failure()
+        self.assertEqual(self.camera.failed_passes, 1)
+        self.assertEqual(len(self.camera.history), 1)
+        self.assertEqual(self.camera.stats.get_stats()['passes'], 1)
+        self.assertEqual(len(self.camera._inference_times), 1)
+        self.assertEqual(len(self.camera.writer.samples), 1)
+        self.assertEqual(len(self.camera.last_detections), 0)
+
+    def test_persisted_sample_counts_chairs(self):
+        self.assertIn(56, dict(self.camera.predict_options())['classes'])
+        self.camera._record_pass(_person_batch(2, time.time(), others=4), time.time())
+        sample = self.camera.writer.samples[0]
+        self.assertEqual((sample.person_count, sample.chair_count, sample.occupancy_rate), (2, 4, 50.0))
+
+
+class _FakeCapture:
+    """VideoCapture en memoria: frames negros a `interval` segundos"""
+
+    def __init__(self, interval=0.002, fps=0.0):
+        self.interval = interval
+        self.fps = fps
+        self.frame = np.zeros((48, 64, 3), dtype=np.uint8)
+
+    def grab(self):
+        time.sleep(self.interval)
+        return True
+
+    def retrieve(self):
+        return True, self.frame
+
+    def read(self):
+        self.grab()
+        return self.retrieve()
+
+    def get(self, prop):
+        return self.fps
+
+    def release(self):
+        pass
+
+
+class CaptureHandoffTest(SimpleTestCase):
+    def test_slow_detection_drops_frames_without_blocking_capture(self):
+        camera = LiveCamera('aula-1', '0', detection_interval=0.0, capture_mode='read',
+                            motion_gating=False, tracking=False)
+        camera._open_capture = _FakeCapture
+
+        def slow_detection(frame, roi=None, offset=(0, 0)):
+            time.sleep(0.1)
+            return DetectionBatch.empty('aula-1')
+
+        camera._run_detection = slow_detection
+        camera.start()
+        time.sleep(0.6)
+        camera.stop()
+
+        passes = camera.stats.get_stats()['passes']
+        self.assertGreater(passes, 0)
+        # La captura sigue a su ritmo; YOLO solo ve el frame más reciente
+        self.assertGreater(camera.frames_decoded, passes * 5)
+        self.assertGreater(camera.frames_dropped, 0)
+
+
+class GrabDecodeTest(SimpleTestCase):
+    def setUp(self):
+        self.camera = LiveCamera('aula-1', 'clase.mp4', detection_interval=5.0, display_fps=2.0)
+
+    def test_first_packet_is_decoded(self):
+        self.assertTrue(self.camera._needs_decode())
+
+    def test_decodes_only_for_detection_or_viewers(self):
+        camera = self.camera
+        camera.frame_seq = 1
+        camera._last_detection_time = time.time()
+        self.assertFalse(camera._needs_decode())
+
+        # Le toca detectar
+        camera._last_detection_time = 0.0
+        self.assertTrue(camera._needs_decode())
+
+        # Detección ocupada: solo decodifica para un visor, a display_fps
+        camera._detect_busy = True
+        self.assertFalse(camera._needs_decode())
+        camera.mark_viewer()
+        self.assertTrue(camera._needs_decode())
+        self.assertFalse(camera._needs_decode())
+
+    def test_file_sources_are_paced(self):
+        camera = self.camera
+        camera._capture = _FakeCapture(fps=20.0)
+        self.assertAlmostEqual(camera._source_frame_period(), 0.05)
+        camera._capture = _FakeCapture(fps=0.0)
+        self.assertAlmostEqual(camera._source_frame_period(), 1.0 / 25.0)
+
+        for source in ('0', 'rtsp://10.0.0.5/stream', 'RTMP://live/aula'):
+            camera.source = source
+            self.assertTrue(camera._is_live_source())
+            self.assertEqual(camera._source_frame_period(), 0.0)
+
+
+def _publish_frame(camera, value=0):
+    """Simula el hilo de captura: nuevo frame crudo con la siguiente secuencia"""
+    with camera._lock:
+        camera._latest_raw = np.full((48, 64, 3), value, dtype=np.uint8)
+        camera._latest_raw_time = time.time()
+        camera.frame_seq += 1
+
+
+class JpegCacheTest(SimpleTestCase):
+    def test_encodes_once_per_frame(self):
+        camera = LiveCamera('aula-1', '0')
+        self.assertIsNone(camera.get_jpeg())
+
+        _publish_frame(camera)
+        first = camera.get_jpeg()
+        self.assertTrue(first.startswith(b'\xff\xd8'))
+        self.assertIs(camera.get_jpeg(), first)
+
+        _publish_frame(camera, 255)
+        self.assertIsNot(camera.get_jpeg(), first)
+        stats = camera.jpeg_cache_stats()
+        self.assertEqual((stats['jpeg_requests'], stats['jpeg_encodes'], stats['jpeg_cache_hits']), (4, 2, 1))
+
+
+class AnnotatedCacheTest(SimpleTestCase):
+    def test_renders_once_per_frame_and_detections(self):
+        camera = LiveCamera('aula-1', '0', tracking=False)
+        _publish_frame(camera)
+        # Sin detecciones se sirve el JPEG crudo
+        self.assertEqual(camera.get_annotated_jpeg(), camera.get_jpeg())
+        self.assertEqual(camera.annotated_renders, 0)
+
+        camera._record_pass(_person_batch(2, time.time()), time.time())
+        first = camera.get_annotated_jpeg()
+        self.assertIs(camera.get_annotated_jpeg(), first)
+        self.assertNotEqual(first, camera.get_jpeg())
+
+        # Nuevas detecciones o nuevo frame invalidan el render
+        camera._record_pass(_person_batch(1, time.time()), time.time())
+        camera.get_annotated_jpeg()
+        _publish_frame(camera)
+        camera.get_annotated_jpeg()
+        self.assertEqual((camera.annotated_renders, camera.annotated_cache_hits), (3, 1))
+
+
+class _FakeModel:
+    """Modelo con la interfaz de ultralytics: registra el tamaño de cada lote"""
+
+    names = {0: 'person'}
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, frames, verbose=False, **kwargs):
+        self.calls.append((len(frames), kwargs))
+        return [None] * len(frames)
+
+
+class BatchInferenceTest(SimpleTestCase):
+    def test_groups_frames_by_predict_options(self):
+        model = _FakeModel()
+        service = BatchInferenceService(lambda: model, max_batch_size=4, max_wait=0.2)
+        frame = np.zeros((8, 8, 3), dtype=np.uint8)
+        people = predict_options(classes=[0])
+        try:
+            futures = [service.submit(frame, people) for _ in range(3)]
+            futures.append(service.submit(frame, predict_options(imgsz=320)))
+            results = [f.result(timeout=5.0) for f in futures]
+        finally:
+            service.stop()
+
+        self.assertEqual(sorted(n for n, _ in model.calls), [1, 3])
+        self.assertIn((3, {'classes': [0]}), model.calls)
+        self.assertEqual([len(xyxy) for xyxy, _, _ in results], [0, 0, 0, 0])
+        self.assertEqual(service.get_stats()['images'], 4)
+
+    def test_full_batch_does_not_wait(self):
+        model = _FakeModel()
+        service = BatchInferenceService(lambda: model, max_batch_size=2, max_wait=10.0)
+        frame = np.zeros((8, 8, 3), dtype=np.uint8)
+        try:
+            futures = [service.submit(frame) for _ in range(2)]
+            for future in futures:
+                future.result(timeout=2.0)
+        finally:
+            service.stop()
+        self.assertEqual(model.calls, [(2, {})])
+
+
+class _Tensor:
+    """Tensor mínimo con la interfaz .cpu().numpy() de torch"""
+
+    def __init__(self, values):
+        self.values = np.asarray(values)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+
+class _Boxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy, self.conf, self.cls = _Tensor(xyxy), _Tensor(conf), _Tensor(cls)
+
+    def __len__(self):
+        return len(self.conf.values)
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class ResultArraysTest(SimpleTestCase):
+    def test_extracts_compact_arrays(self):
+        boxes = _Boxes(np.array([[1.5, 2, 30, 40], [5, 6, 7, 8]], dtype=np.float64),
+                       np.array([0.9, 0.4], dtype=np.float64), np.array([0.0, 56.0]))
+        xyxy, conf, cls = result_to_arrays(_Result(boxes))
+        self.assertEqual((xyxy.dtype, conf.dtype, cls.dtype), (np.float32, np.float32, np.int16))
+        self.assertEqual(xyxy.shape, (2, 4))
+        self.assertEqual(cls.tolist(), [0, 56])
+        np.testing.assert_allclose(conf, [0.9, 0.4], rtol=1e-6)
+
+    def test_empty_result(self):
+        for result in (_Result(None), _Result(_Boxes(np.zeros((0, 4)), [], []))):
+            xyxy, conf, cls = result_to_arrays(result)
+            self.assertEqual((xyxy.shape, conf.shape, cls.shape), ((0, 4), (0,), (0,)))
+
+
+class DetectionBatchTest(SimpleTestCase):
+    def test_counts_and_serialization(self):
+        batch = _person_batch(2, 1_700_000_000.5, others=1)
+        batch.records['track_id'] = [7, -1, -1]
+        self.assertEqual(batch.label_counts(), {'person': 2, 'chair': 1})
+        self.assertEqual((batch.person_count, batch.count('chair'), batch.count('dog')), (2, 1, 0))
+
+        dicts = batch.to_dicts()
+        self.assertEqual(dicts[0], {
+            'id': 'aula-1_1700000000500_0',
+            'track_id': 7,
+            'label': 'person',
+            'confidence': 0.8,
+            'bbox': [0, 0, 8, 20],
+            'timestamp': '2023-11-14T22:13:20.500000Z',
+        })
+        self.assertIsNone(dicts[2]['track_id'])
+        self.assertEqual(len(batch.to_dicts(limit=1)), 1)
+
+    def test_head_is_a_view(self):
+        batch = _person_batch(3, 1.0)
+        head = batch.head(2)
+        self.assertEqual(len(head), 2)
+        self.assertTrue(np.shares_memory(head.records, batch.records))
+        self.assertIs(batch.head(10), batch)
+
+    def test_empty_batch(self):
+        batch = DetectionBatch.empty('aula-1')
+        self.assertEqual((len(batch), batch.person_count, batch.to_dicts()), (0, 0, []))
+        self.assertEqual(batch.avg_confidence(), 0.0)
+
+
+class PredictOptionsTest(SimpleTestCase):
+    def test_options_are_a_normalized_key(self):
+        options = predict_options(classes=[56, 0], conf=0.4, imgsz=320.0)
+        self.assertEqual(options, (('classes', (0, 56)), ('conf', 0.4), ('imgsz', 320)))
+        self.assertEqual(options, predict_options(classes=(0, 56), conf=0.4, imgsz=320))
+        self.assertEqual(predict_options(), ())
+        self.assertEqual(predict_kwargs(options), {'classes': [0, 56], 'conf': 0.4, 'imgsz': 320})
+
+    def test_camera_options(self):
+        camera = LiveCamera('aula-1', '0', classes=[0], conf_threshold=0.3, imgsz=416)
+        self.assertEqual(camera.predict_options(), (('classes', (0,)), ('conf', 0.3), ('imgsz', 416)))
+        # Al persistir hace falta contar sillas para la ocupación
+        camera.writer = _ListWriter()
+        self.assertEqual(dict(camera.predict_options())['classes'], (0, 56))
+        camera.classes = None
+        self.assertNotIn('classes', dict(camera.predict_options()))
+
+
+class ModelRegistryTest(SimpleTestCase):
+    def tearDown(self):
+        for key in (('pesos.pt', 'torch'), ('pesos.pt', 'bogus')):
+            model_registry._models.pop(key, None)
+            model_registry._errors.pop(key, None)
+
+    def test_model_is_shared(self):
+        model = object()
+        model_registry._models[('pesos.pt', 'torch')] = model
+        self.assertTrue(model_registry.is_loaded('pesos.pt', 'torch'))
+        self.assertIs(model_registry.get_model('pesos.pt', 'torch'), model)
+        self.assertIs(model_registry.get_model('pesos.pt', 'torch'), model)
+        self.assertIn({'weights': 'pesos.pt', 'engine': 'torch'}, model_registry.loaded_models())
+
+    def test_failed_load_marks_model_unavailable(self):
+        self.assertFalse(model_registry.is_loaded('pesos.pt', 'bogus'))
+        with self.assertRaises(ValueError):
+            model_registry.get_model('pesos.pt', 'bogus')
+        self.assertFalse(model_registry.is_available('pesos.pt', 'bogus'))
+        self.assertIn('bogus', model_registry.get_error('pesos.pt', 'bogus'))
+        self.assertIsNone(model_registry.warmup('pesos.pt', 'bogus'))
+
+
+class EnginesTest(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.settings = override_settings(YOLO_EXPORT_DIR=self.tmp.name)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def test_export_paths(self):
+        self.assertEqual(export_path('models/yolov8n.pt', 'onnx', 320).name, 'yolov8n_320.onnx')
+        self.assertEqual(export_path('yolov8n.pt', 'onnx-int8').name, 'yolov8n_640_int8.onnx')
+        self.assertEqual(export_path('yolov8n.pt', 'openvino').name, 'yolov8n_640_openvino_model')
+        with self.assertRaises(ValueError):
+            export_path('yolov8n.pt', 'torch')
+
+    def test_model_path(self):
+        self.assertEqual(model_path('yolov8n.pt'), 'yolov8n.pt')
+        with self.assertRaises(ValueError):
+            model_path('yolov8n.pt', 'tensorrt')
+
+    def test_cached_export_is_reused(self):
+        cached = export_path('yolov8n.pt', 'onnx', 416)
+        cached.write_bytes(b'onnx')
+        # Sin ultralytics instalado: solo funciona si no intenta exportar
+        self.assertEqual(ensure_exported('yolov8n.pt', 'onnx', 416), cached)
+        self.assertEqual(model_path('yolov8n.pt', 'onnx', 416), str(cached))
+
+    def test_map50(self):
+        boxes = np.array([[0, 0, 10, 10], [20, 20, 30, 30]], dtype=np.float32)
+        conf = np.array([0.9, 0.8], dtype=np.float32)
+        cls = np.array([0, 0], dtype=np.int16)
+        reference = [(boxes, conf, cls)]
+        self.assertEqual(box_iou(boxes, boxes).diagonal().tolist(), [1.0, 1.0])
+        self.assertAlmostEqual(map50(reference, reference), 1.0)
+        # Solo una de las dos cajas: recall máximo 0.5
+        self.assertAlmostEqual(map50(reference, [(boxes[:1], conf[:1], cls[:1])]), 0.5)
+
+
+class MotionGateTest(SimpleTestCase):
+    def setUp(self):
+        self.gate = MotionGate(threshold=0.05, max_staleness=30.0)
+        self.still = np.zeros((120, 160, 3), dtype=np.uint8)
+
+    def test_static_scene_is_skipped(self):
+        gate = self.gate
+        self.assertTrue(gate.should_detect(self.still, now=0.0))
+        self.assertEqual(gate.last_decision, 'first')
+        self.assertFalse(gate.should_detect(self.still, now=1.0))
+        self.assertFalse(gate.should_detect(self.still, now=2.0))
+        self.assertEqual(gate.get_stats()['skipped'], 2)
+
+    def test_motion_and_staleness_force_inference(self):
+        gate = self.gate
+        gate.should_detect(self.still, now=0.0)
+        moved = self.still.copy()
+        moved[:, :80] = 255
+        self.assertTrue(gate.should_detect(moved, now=1.0))
+        self.assertEqual(gate.last_decision, 'motion')
+
+        gate.reset()
+        gate.should_detect(self.still, now=0.0)
+        self.assertFalse(gate.should_detect(self.still, now=29.0))
+        self.assertTrue(gate.should_detect(self.still, now=30.0))
+        self.assertEqual(gate.last_decision, 'stale')
+
+
+class SchedulerTest(SimpleTestCase):
+    def setUp(self):
+        self.cameras = [
+            LiveCamera('alta', '0', detection_interval=1.0, priority=5.0),
+            LiveCamera('media', '0', detection_interval=0.5, priority=1.0),
+            LiveCamera('baja', '0', detection_interval=1.0, priority=0.0),
+        ]
+        for camera in self.cameras:
+            camera._running = True
+        self.scheduler = DetectionScheduler(lambda: self.cameras, budget=2.0, min_rate=0.1)
+
+    def test_budget_goes_to_high_priority_first(self):
+        self.scheduler.rebalance()
+        rates = {name: stats['rate'] for name, stats in self.scheduler.get_stats()['cameras'].items()}
+        self.assertEqual(rates, {'alta': 1.0, 'media': 0.9, 'baja': 0.1})
+        self.assertTrue(self.scheduler.overloaded)
+        self.assertAlmostEqual(self.scheduler.interval_for(self.cameras[2]), 10.0)
+        # Nunca más rápido que lo pedido por la cámara
+        self.assertEqual(self.scheduler.interval_for(self.cameras[0]), 1.0)
+
+    def test_viewers_raise_priority(self):
+        self.cameras[2].mark_viewer()
+        self.scheduler.rebalance()
+        rates = {name: stats['rate'] for name, stats in self.scheduler.get_stats()['cameras'].items()}
+        self.assertEqual(rates, {'alta': 1.0, 'media': 0.1, 'baja': 0.9})
+        self.assertGreater(self.scheduler.priority_of(self.cameras[2]), self.scheduler.priority_of(self.cameras[1]))
+
+    def test_no_overload_within_budget(self):
+        self.scheduler.budget = 10.0
+        self.scheduler.rebalance()
+        self.assertFalse(self.scheduler.overloaded)
+        for camera in self.cameras:
+            self.assertEqual(self.scheduler.interval_for(camera), camera.detection_interval)
+
+
+class RegionMaskTest(SimpleTestCase):
+    def setUp(self):
+        # Mitad inferior de un frame de 640x480
+        self.roi = RegionMask([[(0, 240), (640, 240), (640, 480), (0, 480)]])
+
+    def test_points_in_polygon(self):
+        triangle = [(0, 0), (10, 0), (0, 10)]
+        inside = points_in_polygon([(1, 1), (6, 6), (-1, 2), (2, 7)], triangle)
+        self.assertEqual(inside.tolist(), [True, False, False, True])
+        self.assertEqual(points_in_polygon([(1, 1)], [(0, 0), (1, 1)]).tolist(), [False])
+
+    def test_crop_is_a_view_with_offset(self):
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        region, offset = self.roi.crop(frame)
+        self.assertEqual((region.shape[:2], offset), ((240, 640), (0, 240)))
+        self.assertTrue(np.shares_memory(region, frame))
+
+    def test_filter_uses_anchor_in_frame_coordinates(self):
+        # Cajas en coordenadas del recorte: una vez desplazadas, la primera
+        # tiene los pies dentro de la región y la segunda por encima
+        xyxy = np.array([[10, 0, 50, 100], [10, 0, 50, 100]], dtype=np.float32)
+        xyxy[1] -= (0, 240, 0, 240)
+        kept, conf, cls = self.roi.filter(xyxy, [0.9, 0.8], [0, 0], offset=(0, 240))
+        self.assertEqual(kept.tolist(), [[10, 240, 50, 340]])
+        self.assertEqual(conf.tolist(), [0.9])
+        self.assertEqual((self.roi.kept, self.roi.dropped), (1, 1))
+
+        center = RegionMask(self.roi.polygons, anchor='center')
+        self.assertEqual(center.contains([[0, 200, 20, 250]]).tolist(), [False])
+        self.assertEqual(self.roi.contains([[0, 200, 20, 250]]).tolist(), [True])
+
+    def test_invalid_regions(self):
+        with self.assertRaises(ValueError):
+            RegionMask([[(0, 0), (1, 1)]])
+        with self.assertRaises(ValueError):
+            RegionMask([[(0, 0), (1, 0), (0, 1)]], anchor='top')
+
+
+class PersistenceTest(TestCase):
+    def test_samples_are_bulk_saved_with_cached_cameras(self):
+        cameras = CameraCache()
+        samples = [sample_from_batch('aula-1', 'rtsp://aula-1', _person_batch(i, 1_700_000_000.0 + i, others=4))
+                   for i in range(3)]
+        self.assertEqual(samples[2].occupancy_rate, 50.0)
+        self.assertEqual(save_samples(samples, cameras), 3)
+        camera = Camera.objects.get(name='aula-1')
+        self.assertEqual(camera.stream_url, 'rtsp://aula-1')
+        self.assertEqual(list(DetectionRecord.objects.order_by('timestamp').values_list('person_count', flat=True)),
+                         [0, 1, 2])
+
+        # Cámara ya cacheada: no se vuelve a consultar detection_camera
+        with CaptureQueriesContext(connection) as queries:
+            save_samples(samples[:1], cameras)
+        self.assertFalse([q for q in queries.captured_queries if 'detection_camera' in q['sql']])
+
+    def test_full_queue_drops_after_timeout(self):
+        writer = DetectionWriter(max_queue=1, put_timeout=0.01)
+        writer._running = True   # sin hilo: nadie vacía la cola
+        sample = sample_from_batch('aula-1', '', _person_batch(1, 1.0))
+        self.assertTrue(writer.submit(sample))
+        self.assertFalse(writer.submit(sample))
+        self.assertEqual((writer.get_stats()['queued'], writer.dropped), (1, 1))
+        with self.assertRaises(ValueError):
+            DetectionWriter(backend='redis')
+
+
+class TrackerTest(SimpleTestCase):
+    def _update(self, tracker, xyxy, conf, ts, cls=None):
+        cls = np.zeros(len(conf), dtype=np.int16) if cls is None else cls
+        return tracker.update(np.array(xyxy, dtype=np.float32), np.array(conf, dtype=np.float32), cls, ts)
+
+    def test_ids_are_stable_across_passes(self):
+        tracker = Tracker()
+        first = self._update(tracker, [[0, 0, 20, 40], [100, 0, 120, 40]], [0.9, 0.9], 0.0)
+        # Se mueven un poco y llegan en otro orden
+        second = self._update(tracker, [[102, 0, 122, 40], [2, 0, 22, 40]], [0.9, 0.9], 1.0)
+        self.assertEqual(second.tolist(), first[::-1].tolist())
+
+    def test_low_confidence_does_not_open_tracks(self):
+        tracker = Tracker()
+        ids = self._update(tracker, [[0, 0, 20, 40]], [0.2], 0.0)
+        self.assertEqual(ids.tolist(), [-1])
+        self.assertEqual(tracker.active_count(), 0)
+
+    def test_count_uses_confirmed_tracks(self):
+        tracker = Tracker(min_hits=2)
+        self._update(tracker, [[0, 0, 20, 40]], [0.9], 0.0)
+        self.assertEqual(tracker.confirmed_count(0), 0)
+        self._update(tracker, [[0, 0, 20, 40], [200, 0, 220, 40]], [0.9, 0.9], 1.0)
+        # El segundo solo se ha visto una vez: vivo pero sin confirmar
+        self.assertEqual(tracker.active_count(0), 2)
+        self.assertEqual(tracker.confirmed_count(0), 1)
+        # Un parpadeo de una pasada no baja el conteo
+        self._update(tracker, np.zeros((0, 4)), [], 2.0)
+        self.assertEqual(tracker.confirmed_count(0), 1)
+
+    def test_overlay_keeps_unmatched_detections(self):
+        camera = LiveCamera('aula-1', 'clase.mp4', tracking=True, classes=[0])
+        xyxy = np.array([[0, 0, 20, 40], [100, 0, 120, 40]], dtype=np.float32)
+        batch = DetectionBatch('aula-1', xyxy, np.array([0.9, 0.3], dtype=np.float32),
+                               np.zeros(2, dtype=np.int16), 10.0, {0: 'person'})
+        camera._record_pass(batch, 10.0)
+        self.assertEqual(batch.track_ids.tolist(), [1, -1])
+
+        drawn = camera.tracked_detections(camera.last_detections, 10.5)
+        self.assertEqual(len(drawn), 2)
+        self.assertEqual(drawn.track_ids.tolist(), [1, -1])
+        np.testing.assert_allclose(drawn.xyxy[1], xyxy[1])
+        # Solo el track confirmado entra en las estadísticas (aún ninguno)
+        self.assertEqual(camera.stats.get_stats()['person_count'], 0)
+
+
+class RollingStatsTest(SimpleTestCase):
+    def test_windows_accumulate_and_evict(self):
+        stats = RollingStats(tau=60.0)
+        t0 = 1_000_000.0
+        for i in range(10):
+            stats.update(_person_batch(i % 4, t0 + i), now=t0 + i)
+
+        snapshot = stats.get_stats(now=t0 + 10)
+        self.assertEqual(snapshot['windows']['1m']['passes'], 10)
+        self.assertEqual(snapshot['windows']['1m']['peak_persons'], 3)
+        self.assertEqual(snapshot['windows']['1m']['labels'], {'person': sum(i % 4 for i in range(10))})
+        self.assertEqual(snapshot['windows']['1h']['passes'], 10)
+
+        # Pasado un minuto el bucket de 1m ya no tiene nada; 15m y 1h sí
+        later = stats.get_stats(now=t0 + 75)
+        self.assertEqual(later['windows']['1m']['passes'], 0)
+        self.assertEqual(later['windows']['1m']['avg_persons'], 0.0)
+        self.assertEqual(later['windows']['15m']['passes'], 10)
+
+        # Más de una hora después todo ha caducado, pero los totales de vida se conservan
+        gone = stats.get_stats(now=t0 + 3700)
+        self.assertEqual(gone['windows']['1h']['passes'], 0)
+        self.assertEqual(gone['last_hour_count'], 0)
+        self.assertEqual(gone['passes'], 10)
+
+    def test_eviction_only_removes_expired_buckets(self):
+        stats = RollingStats()
+        t0 = 2_000_000.0
+        stats.update(_person_batch(5, t0), now=t0)
+        stats.update(_person_batch(1, t0 + 45), now=t0 + 45)
+        window = stats.get_stats(now=t0 + 61)['windows']['1m']
+        self.assertEqual(window['passes'], 1)
+        self.assertEqual(window['peak_persons'], 1)
+        self.assertEqual(window['avg_persons'], 1.0)
+
+    def test_snapshot_is_cached_until_update(self):
+        stats = RollingStats()
+        stats.update(_person_batch(2, 10.0), now=10.0)
+        first = stats.get_stats(now=10.2)
+        self.assertIs(stats.get_stats(now=10.4), first)
+        stats.update(_person_batch(3, 10.5), now=10.5)
+        self.assertEqual(stats.get_stats(now=10.6)['person_count'], 3)
+
+
+    def test_ewma_and_person_override(self):
+        stats = RollingStats(tau=60.0)
+        stats.update(_person_batch(4, 0.0), now=0.0)
+        self.assertEqual(stats.get_stats(now=0.0)['ewma_persons'], 4.0)
+        # Tras una constante de tiempo se recorre ~63% de la distancia
+        stats.update(_person_batch(0, 60.0), now=60.0)
+        self.assertAlmostEqual(stats.get_stats(now=60.0)['ewma_persons'], 4 * math.exp(-1), places=2)
+
+        # Conteo de tracks confirmados en lugar del del batch
+        stats.update(_person_batch(3, 61.0), now=61.0, persons=2)
+        snapshot = stats.get_stats(now=61.0)
+        self.assertEqual(snapshot['person_count'], 2)
+        self.assertEqual(snapshot['labels'], {'person': 3})
+
+    def test_stats_api_reads_snapshot(self):
+        camera = LiveCamera('aula-stats', '0', tracking=False)
+        camera_manager.cameras[camera.camera_id] = camera
+        self.addCleanup(camera_manager.cameras.pop, camera.camera_id)
+        camera._record_pass(_person_batch(2, time.time(), others=1), time.time())
+
+        response = camera_stats_api(RequestFactory().get('/'), 'aula-stats')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual((data['person_count'], data['total_detections']), (2, 3))
+        self.assertEqual(data['object_counts'], {'person': 2, 'chair': 1})
+        self.assertEqual(camera_stats_api(RequestFactory().get('/'), 'no-existe').status_code, 404)
+
+
+class DetectionHistoryTest(SimpleTestCase):
+    def test_ring_evicts_oldest_and_keeps_totals(self):
+        history = DetectionHistory(max_frames=3, max_age=None)
+        now = time.time()
+        for i in range(5):
+            history.append(_person_batch(i + 1, now + i))
+        self.assertEqual(len(history), 3)
+        self.assertEqual([b.person_count for b in history.query()], [3, 4, 5])
+        stats = history.get_stats()
+        self.assertEqual(stats['detections'], 3 + 4 + 5)
+        self.assertEqual(stats['nbytes'], sum(b.nbytes for b in history.query()))
+
+    def test_query_by_time_range_and_limit(self):
+        history = DetectionHistory(max_frames=10, max_age=None)
+        now = time.time()
+        for i in range(6):
+            history.append(_person_batch(i, now + i))
+        self.assertEqual([b.person_count for b in history.query(now + 1, now + 3)], [1, 2, 3])
+        self.assertEqual([b.person_count for b in history.query(limit=2)], [4, 5])
+
+    def test_expired_entries_leave_the_totals(self):
+        history = DetectionHistory(max_frames=10, max_age=60)
+        now = time.time()
+        history.append(_person_batch(4, now - 120))
+        history.append(_person_batch(2, now))
+        self.assertEqual(len(history.query()), 1)
+        self.assertEqual(history.get_stats()['detections'], 2)
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        camera = Camera.objects.create(name='aula-1', stream_url='http://example.com/stream')
+        start = timezone.now() - timedelta(hours=1)
+        DetectionRecord.objects.bulk_create([
+            DetectionRecord(camera=camera, person_count=i, chair_count=10, occupancy_rate=i * 10.0,
+                            timestamp=start + timedelta(minutes=i))
+            for i in range(7)
+        ])
+
+    def test_csv_is_written_in_chunks(self):
+        chunks = list(iter_export('csv', chunk_size=3))
+        self.assertGreaterEqual(len(chunks), 3)
+        rows = list(csv.reader(io.StringIO(b''.join(chunks).decode())))
+        self.assertEqual(tuple(rows[0]), COLUMNS)
+        self.assertEqual([int(row[2]) for row in rows[1:]], list(range(7)))
+        self.assertTrue(all(row[1] == 'aula-1' for row in rows[1:]))
+
+    def test_api_reads_file_format_and_rejects_unavailable_formats(self):
+        response = self.client.get('/api/export/', {'file_format': 'csv', 'cameras': 'aula-1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 8)
+
+        response = self.client.get('/api/export/', {'file_format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+        if 'parquet' not in available_formats():
+            response = self.client.get('/api/export/', {'file_format': 'parquet'})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('pyarrow', response.json()['error'])
+
+
+class ProcessInferenceFailureTest(SimpleTestCase):
+    def test_dead_workers_fail_pending_jobs_and_return_slots(self):
+        # Pesos inexistentes: el worker falla al cargar (o muere si falta
+        # ultralytics); en ambos casos el Future no puede quedarse colgado
+        service = ProcessInferenceService('/nonexistent/weights.pt', num_workers=1, num_slots=2,
+                                          slot_bytes=32 * 32 * 3)
+        self.addCleanup(service.stop)
+        future = service.submit(np.zeros((32, 32, 3), dtype=np.uint8))
+        with self.assertRaises(RuntimeError):
+            future.result(timeout=60)
+
+        deadline = time.time() + 60
+        while service.available and time.time() < deadline:
+            time.sleep(0.2)
+        self.assertFalse(service.available)
+        self.assertEqual(service.get_stats()['free_slots'], 2)
+        self.assertEqual(service.get_stats()['in_flight'], 0)
+        with self.assertRaises(RuntimeError):
+            service.submit(np.zeros((32, 32, 3), dtype=np.uint8))
+
+
+class SeatMapTest(SimpleTestCase):
+    def setUp(self):
+        self.detector = AttendanceDetector(imgsz=320)
+        self.detector.add_camera('aula-1', 'http://example.com/frame.jpg')
+        self.camera = self.detector.cameras['aula-1']
+        self.seats = np.array([[0, 0, 10, 10], [20, 0, 30, 10], [40, 0, 50, 10]], dtype=np.float32)
+
+    def test_assign_seats_uses_overlap_threshold(self):
+        persons = np.array([[1, 1, 9, 12], [41, 8, 49, 20], [100, 100, 110, 110]], dtype=np.float32)
+        assigned, occupied = assign_seats(persons, self.seats, threshold=0.3)
+        # La segunda persona solo cubre el 16% de su asiento
+        self.assertEqual(assigned.tolist(), [0, -1, -1])
+        self.assertEqual(occupied.tolist(), [True, False, False])
+
+    def test_occupancy_rate_keeps_persons_over_chairs(self):
+        self.camera['seat_map'] = self.seats
+        persons = np.array([[1, 1, 9, 12], [200, 0, 210, 10], [300, 0, 310, 10]], dtype=np.float32)
+        self.detector._update_occupancy(self.camera, persons)
+        self.assertEqual(self.camera['occupancy_rate'], 100.0)
+        self.assertEqual(self.camera['seat_occupancy_rate'], 33.33)
+        self.assertEqual(self.camera['occupied_seats'], 1)
+
+    def test_refresh_keeps_seats_hidden_by_people(self):
+        frame = np.zeros((60, 80, 3), dtype=np.uint8)
+        self.assertTrue(self.detector._seat_map_stale(self.camera, frame))
+        self.detector._update_seat_map(self.camera, frame, self.seats, np.zeros((0, 4), dtype=np.float32))
+        self.assertFalse(self.detector._seat_map_stale(self.camera, frame))
+
+        # Una persona tapa el primer asiento y el detector ya no lo ve
+        person = np.array([[0, 0, 10, 15]], dtype=np.float32)
+        self.detector._update_seat_map(self.camera, frame, self.seats[1:], person)
+        self.assertEqual(len(self.camera['seat_map']), 3)
@@ -0,0 +1,360 @@
+# detection/timeseries.py - Almacén append-only de muestras de ocupación (memmap)
+#
+# Un archivo por cámara y día (TIMESERIES_DIR/<cámara>/<AAAA-MM-DD>.bin) con
+# registros de ancho fijo, más un índice pequeño por cámara con los días y
+# sus offsets. Las lecturas usan numpy.memmap: los rangos y agregados se
+# calculan con operaciones vectorizadas, sin objetos del ORM.
+import base64
+import re
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from .conf import setting
+
+SAMPLE_DTYPE = np.dtype([
+    ('ts_ns', np.int64),
+    ('person_count', np.int32),
+    ('chair_count', np.int32),
+    ('occupancy', np.float32),
+])
+
+INDEX_DTYPE = np.dtype([
+    ('day', np.int32),        # días desde epoch (UTC)
+    ('offset', np.int64),     # registros de los días anteriores
+    ('count', np.int64),
+    ('first_ns', np.int64),
+    ('last_ns', np.int64),
+])
+
+DAY_NS = 86400 * 10**9
+
+
+def _safe_name(camera):
+    return re.sub(r'[^\w.-]', '_', str(camera))
+
+
+def _day_path(camera_dir, day):
+    date = datetime.fromtimestamp(day * 86400, tz=timezone.utc).date()
+    return camera_dir / f"{date.isoformat()}.bin"
+
+
+class TimeSeriesStore:
+    """
+    append() agrupa las muestras por (cámara, día) y las añade al final de
+    cada archivo; read() y aggregate() mapean solo los días del rango y
+    localizan los extremos con búsqueda binaria sobre ts_ns (los archivos
+    se mantienen ordenados porque solo se añade al final).
+    """
+
+    def __init__(self, root=None):
+        self.root = Path(root or setting('TIMESERIES_DIR', 'timeseries'))
+        self._lock = threading.Lock()
+        self._index = {}   # cámara -> (clave de stat de index.npy, índice)
+
+    def _camera_dir(self, camera):
+        return self.root / _safe_name(camera)
+
+    def cameras(self):
+        if not self.root.is_dir():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if p.is_dir())
+
+    # ------------------------------------------------------------
+    # Índice
+    # ------------------------------------------------------------
+
+    def _index_key(self, camera):
+        """
+        Identidad de index.npy (inodo, mtime, tamaño): cambia en cada
+        _save_index(), también cuando escribe otro proceso (gunicorn,
+        comandos de manage.py), y entonces el índice en caché se recarga.
+        """
+        try:
+            st = (self._camera_dir(camera) / 'index.npy').stat()
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _load_index(self, camera):
+        key = self._index_key(camera)
+        cached = self._index.get(camera)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        if key is not None:
+            index = np.load(self._camera_dir(camera) / 'index.npy')
+        else:
+            index = self._rebuild_index(camera)
+        self._index[camera] = (key, index)
+        return index
+
+    def _rebuild_index(self, camera):
+        """Reconstruye el índice a partir de los archivos de días"""
+        camera_dir = self._camera_dir(camera)
+        entries = []
+        for path in sorted(camera_dir.glob('*.bin')) if camera_dir.is_dir() else []:
+            data = self._map(path)
+            if data is None or not len(data):
+                continue
+            day = int(data['ts_ns'][0] // DAY_NS)
+            entries.append((day, 0, len(data), int(data['ts_ns'][0]), int(data['ts_ns'][-1])))
+        index = np.array(entries, dtype=INDEX_DTYPE)
+        if len(index):
+            index['offset'] = np.concatenate([[0], np.cumsum(index['count'])[:-1]])
+        return index
+
+    def _save_index(self, camera, index):
+        camera_dir = self._camera_dir(camera)
+        tmp = camera_dir / 'index.tmp.npy'
+        np.save(tmp, index)
+        tmp.replace(camera_dir / 'index.npy')
+        self._index[camera] = (self._index_key(camera), index)
+
+    # ------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------
+
+    def append(self, camera, records):
+        """Añade registros SAMPLE_DTYPE (ordenados por ts_ns) de una cámara"""
+        records = np.asarray(records, dtype=SAMPLE_DTYPE)
+        if not len(records):
+            return 0
+        with self._lock:
+            camera_dir = self._camera_dir(camera)
+            camera_dir.mkdir(parents=True, exist_ok=True)
+            index = self._load_index(camera)
+
+            # Mantener el orden aunque lleguen muestras atrasadas
+            records = np.sort(records, order='ts_ns')
+            if len(index):
+                records['ts_ns'] = np.maximum(records['ts_ns'], int(index['last_ns'].max()))
+
+            days = records['ts_ns'] // DAY_NS
+            bounds = np.flatnonzero(np.diff(days)) + 1
+            entries = {int(d): i for i, d in enumerate(index['day'])}
+            rows = [tuple(r) for r in index]
+            for chunk in np.split(records, bounds):
+                day = int(chunk['ts_ns'][0] // DAY_NS)
+                with open(_day_path(camera_dir, day), 'ab') as out:
+                    chunk.tofile(out)
+                if day in entries:
+                    d, offset, count, first_ns, _ = rows[entries[day]]
+                    rows[entries[day]] = (d, offset, count + len(chunk), first_ns, int(chunk['ts_ns'][-1]))
+                else:
+                    entries[day] = len(rows)
+                    rows.append((day, 0, len(chunk), int(chunk['ts_ns'][0]), int(chunk['ts_ns'][-1])))
+
+            index = np.array(rows, dtype=INDEX_DTYPE)
+            index['offset'] = np.concatenate([[0], np.cumsum(index['count'])[:-1]])
+            self._save_index(camera, index)
+            return len(records)
+
+    def append_samples(self, samples):
+        """Añade OccupancySample (de persistence) agrupadas por cámara"""
+        by_camera = {}
+        for s in samples:
+            by_camera.setdefault(s.camera_name, []).append(
+                (int(s.timestamp.timestamp() * 1e9), s.person_count, s.chair_count, s.occupancy_rate)
+            )
+        return sum(self.append(camera, np.array(rows, dtype=SAMPLE_DTYPE))
+                   for camera, rows in by_camera.items())
+
+    # ------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _map(path):
+        size = path.stat().st_size // SAMPLE_DTYPE.itemsize
+        if not size:
+            return None
+        # Un registro a medio escribir al final se ignora
+        return np.memmap(path, dtype=SAMPLE_DTYPE, mode='r', shape=(size,))
+
+    def _slices(self, camera, start_ns=None, end_ns=None):
+        """Vistas memmap de cada día con start_ns <= ts_ns < end_ns"""
+        with self._lock:
+            index = self._load_index(camera)
+        if not len(index):
+            return []
+        mask = np.ones(len(index), dtype=bool)
+        if start_ns is not None:
+            mask &= index['last_ns'] >= start_ns
+        if end_ns is not None:
+            mask &= index['first_ns'] < end_ns
+        camera_dir = self._camera_dir(camera)
+        out = []
+        for day in index['day'][mask]:
+            data = self._map(_day_path(camera_dir, int(day)))
+            if data is None:
+                continue
+            lo = int(np.searchsorted(data['ts_ns'], start_ns, side='left')) if start_ns is not None else 0
+            hi = int(np.searchsorted(data['ts_ns'], end_ns, side='left')) if end_ns is not None else len(data)
+            if hi > lo:
+                out.append(data[lo:hi])
+        return out
+
+    def read(self, camera, start=None, end=None, limit=None):
+        """Registros en [start, end) (datetimes) como un array SAMPLE_DTYPE; con limit, los primeros"""
+        start_ns = int(start.timestamp() * 1e9) if start else None
+        end_ns = int(end.timestamp() * 1e9) if end else None
+        return self._read_ns(camera, start_ns, end_ns, limit)
+
+    def read_page(self, camera, start=None, end=None, cursor=None, limit=500):
+        """
+        Una página de registros en [start, end) y el cursor de la siguiente
+        (None si no hay más). El cursor es (ts_ns, n): se reanuda en ts_ns
+        saltando los n registros con ese mismo ts_ns ya devueltos (append()
+        puede dejar timestamps repetidos al ordenar muestras atrasadas).
+        """
+        if limit < 1:
+            raise ValueError('limit must be >= 1')
+        start_ns = int(start.timestamp() * 1e9) if start else None
+        end_ns = int(end.timestamp() * 1e9) if end else None
+        cursor_ns, skip = cursor or (None, 0)
+        if cursor_ns is None or (start_ns is not None and start_ns > cursor_ns):
+            skip = 0
+        else:
+            start_ns = cursor_ns
+        records = self._read_ns(camera, start_ns, end_ns, limit + skip + 1)[skip:]
+        if len(records) <= limit:
+            return records, None
+        records = records[:limit]
+        last_ns = int(records['ts_ns'][-1])
+        repeated = int(np.count_nonzero(records['ts_ns'] == last_ns))
+        if last_ns == cursor_ns:
+            repeated += skip
+        return records, (last_ns, repeated)
+
+    def _read_ns(self, camera, start_ns=None, end_ns=None, limit=None):
+        parts, total = [], 0
+        for part in self._slices(camera, start_ns, end_ns):
+            if limit is not None and total + len(part) > limit:
+                part = part[:limit - total]
+            parts.append(np.array(part))
+            total += len(part)
+            if limit is not None and total >= limit:
+                break
+        if not parts:
+            return np.zeros(0, dtype=SAMPLE_DTYPE)
+        return np.concatenate(parts)
+
+    def count(self, camera):
+        with self._lock:
+            index = self._load_index(camera)
+        return int(index['count'].sum()) if len(index) else 0
+
+    def summary(self, camera, start=None, end=None):
+        """Muestras, media de ocupación y pico de personas en el rango"""
+        start_ns = int(start.timestamp() * 1e9) if start else None
+        end_ns = int(end.timestamp() * 1e9) if end else None
+        samples = occupancy_sum = 0.0
+        peak = 0
+        for part in self._slices(camera, start_ns, end_ns):
+            samples += len(part)
+            occupancy_sum += float(part['occupancy'].sum(dtype=np.float64))
+            peak = max(peak, int(part['person_count'].max()))
+        return {
+            'camera__name': camera,
+            'avg_occupancy': occupancy_sum / samples if samples else None,
+            'peak_occupancy': peak,
+            'total_records': int(samples),
+        }
+
+    def aggregate(self, camera, start, end, bucket_seconds):
+        """
+        Media/máximo/mínimo de personas y ocupación por bucket en [start, end),
+        con buckets alineados a múltiplos de bucket_seconds (UTC).
+        """
+        bucket_ns = int(bucket_seconds) * 10**9
+        out = []
+        for part in self._slices(camera, int(start.timestamp() * 1e9), int(end.timestamp() * 1e9)):
+            keys = part['ts_ns'] // bucket_ns
+            # ts_ns está ordenado: cada bucket es un tramo contiguo
+            starts = np.concatenate([[0], np.flatnonzero(np.diff(keys)) + 1])
+            counts = np.diff(np.append(starts, len(part)))
+            persons = part['person_count']
+            occupancy = part['occupancy']
+            columns = zip(
+                keys[starts].tolist(), counts.tolist(),
+                np.add.reduceat(persons.astype(np.int64), starts).tolist(),
+                np.maximum.reduceat(persons, starts).tolist(),
+                np.minimum.reduceat(persons, starts).tolist(),
+                np.add.reduceat(occupancy.astype(np.float64), starts).tolist(),
+                np.maximum.reduceat(occupancy, starts).tolist(),
+                np.minimum.reduceat(occupancy, starts).tolist(),
+            )
+            for key, n, p_sum, p_max, p_min, o_sum, o_max, o_min in columns:
+                if out and out[-1]['_key'] == key:
+                    # Un bucket de más de un día continúa en el archivo siguiente
+                    prev = out[-1]
+                    prev['_p_sum'] += p_sum
+                    prev['_o_sum'] += o_sum
+                    prev['samples'] += n
+                    prev['max_persons'] = max(prev['max_persons'], p_max)
+                    prev['min_persons'] = min(prev['min_persons'], p_min)
+                    prev['max_occupancy'] = max(prev['max_occupancy'], o_max)
+                    prev['min_occupancy'] = min(prev['min_occupancy'], o_min)
+                    continue
+                out.append({
+                    '_key': key, '_p_sum': p_sum, '_o_sum': o_sum, 'samples': n,
+                    'max_persons': p_max, 'min_persons': p_min,
+                    'max_occupancy': o_max, 'min_occupancy': o_min,
+                })
+        for bucket in out:
+            key = bucket.pop('_key')
+            n = bucket['samples']
+            bucket['start'] = datetime.fromtimestamp(key * bucket_seconds, tz=timezone.utc).isoformat()
+            bucket['avg_persons'] = round(bucket.pop('_p_sum') / n, 2)
+            bucket['avg_occupancy'] = round(bucket.pop('_o_sum') / n, 2)
+            bucket['max_occupancy'] = round(bucket['max_occupancy'], 2)
+            bucket['min_occupancy'] = round(bucket['min_occupancy'], 2)
+        return out
+
+
+def encode_cursor(cursor):
+    ts_ns, skip = cursor
+    return base64.urlsafe_b64encode(f"{ts_ns}|{skip}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """Cursor opaco de read_page -> (ts_ns, n); ValueError si no es válido"""
+    try:
+        padded = value + '=' * (-len(value) % 4)
+        ts_ns, skip = base64.urlsafe_b64decode(padded).decode().split('|')
+        return int(ts_ns), int(skip)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def records_to_dicts(camera, records):
+    """Registros SAMPLE_DTYPE -> dicts con el formato de database_records"""
+    stamps = records['ts_ns'].tolist()
+    return [
+        {
+            'camera_name': camera,
+            'person_count': persons,
+            'chair_count': chairs,
+            'occupancy_rate': round(rate, 2),
+            'timestamp': datetime.fromtimestamp(ts / 1e9, tz=timezone.utc).isoformat(),
+        }
+        for ts, persons, chairs, rate in zip(
+            stamps, records['person_count'].tolist(), records['chair_count'].tolist(),
+            records['occupancy'].tolist(),
+        )
+    ]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Instancia compartida (una sola caché de índices por proceso)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TimeSeriesStore()
+        return _store
@@ -0,0 +1,203 @@
+# detection/tracker.py - Tracker multi-objeto ligero (estilo ByteTrack)
+#
+# Asigna ids estables a las detecciones entre pasadas de YOLO y predice la
+# posición de cada caja en los frames intermedios con un filtro alfa-beta
+# (Kalman simplificado de velocidad constante).
+import threading
+import time
+
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except Exception:
+    linear_sum_assignment = None
+
+from .engines import box_iou
+
+
+def _xyxy_to_cxcywh(xyxy):
+    xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+    wh = xyxy[:, 2:] - xyxy[:, :2]
+    return np.concatenate([xyxy[:, :2] + wh / 2, wh], axis=1)
+
+
+def _cxcywh_to_xyxy(state):
+    half = state[:, 2:] / 2
+    return np.concatenate([state[:, :2] - half, state[:, :2] + half], axis=1)
+
+
+def _match(iou, threshold):
+    """Asociación por IoU: húngaro si hay scipy, greedy vectorizado si no"""
+    if iou.size == 0:
+        return np.zeros((0, 2), dtype=np.intp)
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(-iou)
+        keep = iou[rows, cols] >= threshold
+        return np.stack([rows[keep], cols[keep]], axis=1)
+
+    order = np.argsort(-iou, axis=None)
+    rows, cols = np.unravel_index(order, iou.shape)
+    used_r = np.zeros(iou.shape[0], dtype=bool)
+    used_c = np.zeros(iou.shape[1], dtype=bool)
+    pairs = []
+    for r, c in zip(rows.tolist(), cols.tolist()):
+        if iou[r, c] < threshold:
+            break
+        if not used_r[r] and not used_c[c]:
+            used_r[r] = used_c[c] = True
+            pairs.append((r, c))
+    return np.asarray(pairs, dtype=np.intp).reshape(-1, 2)
+
+
+class Tracker:
+    """
+    Tracker de dos etapas: primero asocia las detecciones de alta confianza
+    con todos los tracks, luego las de baja confianza con los tracks que
+    quedaron libres. Solo las de alta confianza abren tracks nuevos.
+    """
+
+    def __init__(self, high_thresh: float = 0.5, match_thresh: float = 0.3,
+                 low_match_thresh: float = 0.5, max_misses: int = 3,
+                 alpha: float = 0.8, beta: float = 0.3, max_predict: float = 2.0,
+                 min_hits: int = 2):
+        self.high_thresh = high_thresh
+        self.match_thresh = match_thresh
+        self.low_match_thresh = low_match_thresh
+        self.max_misses = max_misses
+        self.alpha = alpha
+        self.beta = beta
+        self.max_predict = max_predict
+        self.min_hits = min_hits
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._reset_arrays()
+
+    def _reset_arrays(self):
+        self.ids = np.zeros(0, dtype=np.int32)
+        self.state = np.zeros((0, 4), dtype=np.float32)   # cx, cy, w, h
+        self.vel = np.zeros((0, 4), dtype=np.float32)     # por segundo
+        self.cls = np.zeros(0, dtype=np.int16)
+        self.conf = np.zeros(0, dtype=np.float32)
+        self.ts = np.zeros(0, dtype=np.float64)
+        self.misses = np.zeros(0, dtype=np.int16)
+        self.hits = np.zeros(0, dtype=np.int32)
+
+    def reset(self):
+        with self._lock:
+            self._reset_arrays()
+
+    def _predict_state(self, ts):
+        dt = np.clip(ts - self.ts, 0.0, self.max_predict).astype(np.float32)[:, None]
+        state = self.state + self.vel * dt
+        state[:, 2:] = np.maximum(state[:, 2:], 1.0)
+        return state
+
+    def update(self, xyxy, conf, cls, ts=None):
+        """Actualiza con las detecciones de un frame; devuelve el track id de cada una (-1 sin track)"""
+        ts = time.time() if ts is None else ts
+        conf = np.asarray(conf, dtype=np.float32)
+        cls = np.asarray(cls, dtype=np.int16)
+        det_state = _xyxy_to_cxcywh(xyxy)
+        n_det = len(det_state)
+        track_ids = np.full(n_det, -1, dtype=np.int32)
+
+        with self._lock:
+            predicted = self._predict_state(ts)
+            pred_xyxy = _cxcywh_to_xyxy(predicted)
+            det_xyxy = _cxcywh_to_xyxy(det_state)
+
+            # IoU solo entre misma clase
+            iou = box_iou(pred_xyxy, det_xyxy)
+            if iou.size:
+                iou = np.where(self.cls[:, None] == cls[None, :], iou, 0.0)
+
+            high = conf >= self.high_thresh
+            track_free = np.ones(len(self.ids), dtype=bool)
+            det_matched = np.zeros(n_det, dtype=bool)
+            matched_tracks, matched_dets = [], []
+
+            for det_mask, thresh in ((high, self.match_thresh), (~high, self.low_match_thresh)):
+                t_idx = np.flatnonzero(track_free)
+                d_idx = np.flatnonzero(det_mask & ~det_matched)
+                pairs = _match(iou[np.ix_(t_idx, d_idx)], thresh)
+                if len(pairs):
+                    t_sel, d_sel = t_idx[pairs[:, 0]], d_idx[pairs[:, 1]]
+                    track_free[t_sel] = False
+                    det_matched[d_sel] = True
+                    matched_tracks.append(t_sel)
+                    matched_dets.append(d_sel)
+
+            if matched_tracks:
+                t_sel = np.concatenate(matched_tracks)
+                d_sel = np.concatenate(matched_dets)
+                dt = np.maximum(ts - self.ts[t_sel], 1e-3).astype(np.float32)[:, None]
+                residual = det_state[d_sel] - predicted[t_sel]
+                new_state = predicted[t_sel] + self.alpha * residual
+                self.vel[t_sel] = self.vel[t_sel] + self.beta * residual / dt
+                self.state[t_sel] = new_state
+                self.ts[t_sel] = ts
+                self.conf[t_sel] = conf[d_sel]
+                self.misses[t_sel] = 0
+                self.hits[t_sel] += 1
+                track_ids[d_sel] = self.ids[t_sel]
+
+            # Tracks sin pareja: se mantienen unas pasadas y luego se eliminan
+            self.misses[track_free] += 1
+            keep = self.misses <= self.max_misses
+
+            # Detecciones de alta confianza sin track: abrir tracks nuevos
+            new = np.flatnonzero(high & ~det_matched)
+            new_ids = np.arange(self._next_id, self._next_id + len(new), dtype=np.int32)
+            self._next_id += len(new)
+            track_ids[new] = new_ids
+
+            self.ids = np.concatenate([self.ids[keep], new_ids])
+            self.state = np.concatenate([self.state[keep], det_state[new]])
+            self.vel = np.concatenate([self.vel[keep], np.zeros((len(new), 4), dtype=np.float32)])
+            self.cls = np.concatenate([self.cls[keep], cls[new]])
+            self.conf = np.concatenate([self.conf[keep], conf[new]])
+            self.ts = np.concatenate([self.ts[keep], np.full(len(new), ts)])
+            self.misses = np.concatenate([self.misses[keep], np.zeros(len(new), dtype=np.int16)])
+            self.hits = np.concatenate([self.hits[keep], np.ones(len(new), dtype=np.int32)])
+
+        return track_ids
+
+    def predict(self, ts=None):
+        """Cajas previstas en `ts` para los tracks vistos en la última pasada"""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            visible = self.misses == 0
+            state = self._predict_state(ts)[visible]
+            return (_cxcywh_to_xyxy(state), self.conf[visible].copy(),
+                    self.cls[visible].copy(), self.ids[visible].copy())
+
+    def predict_ids(self, track_ids, ts=None):
+        """Cajas previstas en `ts` para `track_ids` (NaN si el id ya no tiene track)"""
+        ts = time.time() if ts is None else ts
+        track_ids = np.asarray(track_ids, dtype=np.int32)
+        out = np.full((len(track_ids), 4), np.nan, dtype=np.float32)
+        with self._lock:
+            if not len(self.ids) or not len(track_ids):
+                return out
+            order = np.argsort(self.ids)
+            pos = np.searchsorted(self.ids, track_ids, sorter=order).clip(0, len(self.ids) - 1)
+            idx = order[pos]
+            found = self.ids[idx] == track_ids
+            out[found] = _cxcywh_to_xyxy(self._predict_state(ts)[idx[found]])
+        return out
+
+    def active_count(self, class_id=None):
+        """Tracks vivos (incluye los perdidos hace pocas pasadas): conteo estable"""
+        with self._lock:
+            if class_id is None:
+                return int(len(self.ids))
+            return int(np.count_nonzero(self.cls == class_id))
+
+    def confirmed_count(self, class_id=None):
+        """Tracks vivos con al menos `min_hits` detecciones: no cuenta falsos positivos de una pasada"""
+        with self._lock:
+            confirmed = self.hits >= self.min_hits
+            if class_id is not None:
+                confirmed &= self.cls == class_id
+            return int(np.count_nonzero(confirmed))
@@ -91,7 +91,7 @@ def dashboard(request):
             stats = camera_manager.get_detection_statistics(name)
             
             # Contar personas
-            person_count = sum(1 for d in detections if d.get('label') == 'person')
+            person_count = stats['person_count']
 
             status.update({
                 'original_name': cam_data['original_name'],
@@ -99,7 +99,7 @@ def dashboard(request):
                 'name': cam_data['original_name'],
                 'stream_url': cam_data['stream_url'],
                 'person_count': person_count,
-                'recent_detections': detections,
+                'recent_detections': detections.to_dicts(),
                 'detection_count': len(detections),
                 'detection_stats': stats,
                 'running': status.get('running', False)
@@ -276,7 +276,7 @@ def camera_frame_view(request, camera_id):
 def camera_detections_view(request, camera_id):
     """API: Detecciones"""
     detections = camera_manager.get_camera_detections(camera_id, limit=20)
-    return JsonResponse({'camera_id': camera_id, 'detections': detections})
+    return JsonResponse({'camera_id': camera_id, 'detections': detections.to_dicts()})
 
 # ============================================================
 # NUEVAS FUNCIONES - STREAMING CON YOLO BOUNDING BOXES
@@ -288,12 +288,17 @@ def video_feed(request, camera_id):
     Este endpoint retorna un stream MJPEG que el navegador puede mostrar en un <img>
     """
     def generate():
+        last_sent = None
         while True:
             try:
                 # Obtener frame CON bounding boxes dibujados
                 frame_bytes = camera_manager.get_camera_frame(camera_id, with_boxes=True)
                 
-                if frame_bytes:
+                if frame_bytes is not None and frame_bytes is last_sent:
+                    # Mismo frame cacheado: no reenviarlo
+                    time.sleep(0.02)
+                elif frame_bytes:
+                    last_sent = frame_bytes
                     # Enviar frame en formato MJPEG
                     yield (b'--frame\r\n'
                            b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
@@ -321,25 +326,18 @@ def camera_stats_api(request, camera_id):
         if not status:
             return JsonResponse({'error': 'Camera not found'}, status=404)
         
-        # Obtener detecciones actuales
-        detections = camera_manager.get_camera_detections(camera_id)
-        
-        # Contar personas (solo objetos de clase 'person')
-        person_count = sum(1 for d in detections if d.get('label') == 'person')
-        
-        # Contar por tipo de objeto
-        object_counts = {}
-        for d in detections:
-            label = d.get('label', 'unknown')
-            object_counts[label] = object_counts.get(label, 0) + 1
+        # Estadísticas incrementales (snapshot cacheado por cámara)
+        stats = camera_manager.get_detection_statistics(camera_id)
         
         return JsonResponse({
             'camera_id': camera_id,
             'running': status.get('running', False),
             'fps': status.get('fps', 0),
-            'total_detections': len(detections),
-            'person_count': person_count,
-            'object_counts': object_counts,
+            'total_detections': stats['total_detections'],
+            'person_count': stats['person_count'],
+            'object_counts': stats['label_counts'],
+            'avg_persons_15m': stats['windows']['15m']['avg_persons'],
+            'peak_persons_1h': stats['peak_persons_1h'],
             'yolo_enabled': status.get('yolo_enabled', False),
             'timestamp': time.time()
         })
@@ -1,24 +1,70 @@
 # detection/yolo_detector.py
 import cv2
 import numpy as np
-from ultralytics import YOLO
 import threading
 import time
 from datetime import datetime
 import requests
 from django.utils import timezone
+from . import model_registry
+from .conf import setting
+from .engines import box_iou
+from .inference import CHAIR_CLASS, PERSON_CLASS, result_to_arrays
 from .youtube_utils import YouTubeStreamExtractor
 
+# Ancho de la miniatura en gris usada para detectar cambios de escena
+SCENE_WIDTH = 32
+
+
+def _scene_thumbnail(frame):
+    h, w = frame.shape[:2]
+    small = cv2.resize(frame, (SCENE_WIDTH, max(1, int(round(h * SCENE_WIDTH / w)))),
+                       interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+
+def seat_overlap(persons, seats):
+    """Fracción de cada asiento cubierta por cada persona: matriz (personas, asientos)"""
+    if not len(persons) or not len(seats):
+        return np.zeros((len(persons), len(seats)), dtype=np.float32)
+    tl = np.maximum(persons[:, None, :2], seats[None, :, :2])
+    br = np.minimum(persons[:, None, 2:], seats[None, :, 2:])
+    inter = np.clip(br - tl, 0, None).prod(axis=2)
+    area = (seats[:, 2:] - seats[:, :2]).clip(0).prod(axis=1)
+    return inter / np.maximum(area[None, :], 1e-9)
+
+
+def assign_seats(persons, seats, threshold=0.3):
+    """Asiento ocupado por cada persona (-1 si ninguno) y máscara de asientos ocupados"""
+    overlap = seat_overlap(persons, seats)
+    occupied = np.zeros(len(seats), dtype=bool)
+    if not overlap.size:
+        return np.full(len(persons), -1, dtype=np.intp), occupied
+    best = overlap.argmax(axis=1)
+    assigned = np.where(overlap[np.arange(len(persons)), best] >= threshold, best, -1)
+    occupied[assigned[assigned >= 0]] = True
+    return assigned, occupied
+
+
 class AttendanceDetector:
-    def __init__(self):
-        # Cargar modelo YOLO pre-entrenado
-        print("🔧 Inicializando modelo YOLO...")
-        self.model = YOLO('yolov8n.pt')  # Modelo nano - rápido y eficiente
+    def __init__(self, weights=None, imgsz=None):
+        # El modelo se carga al primer uso y se comparte con CameraManager
+        self.weights = weights or model_registry.default_weights()
+        self.imgsz = imgsz or setting('YOLO_IMGSZ', 640)
+        # Mapa de asientos: las sillas casi no se mueven durante una sesión,
+        # así que se detectan cada SEAT_MAP_INTERVAL segundos o al cambiar la escena
+        self.seat_map_interval = setting('SEAT_MAP_INTERVAL', 300.0)
+        self.scene_change_threshold = setting('SEAT_MAP_SCENE_CHANGE', 0.3)
+        self.seat_overlap_threshold = setting('SEAT_OVERLAP_THRESHOLD', 0.3)
         self.cameras = {}
         self.running = False
         self.detection_threads = []
         self.youtube_extractor = YouTubeStreamExtractor()
-        print("✅ Modelo YOLO cargado correctamente")
+    
+    @property
+    def model(self):
+        """Modelo YOLO compartido del registro (carga perezosa)"""
+        return model_registry.get_model(self.weights)
     
     def add_camera(self, name, stream_url):
         """Agregar cámara ESP32 al sistema"""
@@ -30,7 +76,13 @@ class AttendanceDetector:
             'last_update': datetime.now(),
             'status': 'disconnected',
             'last_frame': None,
-            'fps': 0
+            'fps': 0,
+            'seat_map': np.zeros((0, 4), dtype=np.float32),
+            'seat_occupancy': np.zeros(0, dtype=bool),
+            'occupied_seats': 0,
+            'seat_occupancy_rate': 0,
+            'seat_map_time': 0.0,
+            'seat_map_scene': None,
         }
         print(f"📹 Cámara '{name}' agregada: {stream_url}")
     
@@ -96,15 +148,18 @@ class AttendanceDetector:
                 if frame is not None:
                     frame_count += 1
                     
-                    # Ejecutar YOLO en el frame
-                    results = self.model(frame, verbose=False, conf=0.5)
+                    # Ejecutar YOLO en el frame: sillas solo al refrescar el mapa
+                    refresh = self._seat_map_stale(camera, frame)
+                    classes = [PERSON_CLASS, CHAIR_CLASS] if refresh else [PERSON_CLASS]
+                    results = self.model(frame, verbose=False, conf=0.5,
+                                         classes=classes, imgsz=self.imgsz)
+                    xyxy, confs, cls = result_to_arrays(results[0])
+                    persons = xyxy[(cls == PERSON_CLASS) & (confs > 0.5)]
+                    if refresh:
+                        chairs = xyxy[(cls == CHAIR_CLASS) & (confs > 0.5)]
+                        self._update_seat_map(camera, frame, chairs, persons)
                     
-                    # Contar personas y sillas
-                    person_count = self._count_objects(results, 0)   # class 0 = person
-                    chair_count = self._count_objects(results, 56)   # class 56 = chair
-                    
-                    # Calcular tasa de ocupación
-                    occupancy_rate = person_count / chair_count if chair_count > 0 else 0
+                    self._update_occupancy(camera, persons)
                     
                     # Calcular FPS
                     current_time = time.time()
@@ -114,16 +169,14 @@ class AttendanceDetector:
                         start_time = current_time
                     
                     # Actualizar datos de la cámara
-                    camera['person_count'] = person_count
-                    camera['chair_count'] = chair_count
-                    camera['occupancy_rate'] = round(occupancy_rate * 100, 2)  # Porcentaje
                     camera['last_update'] = datetime.now()
                     camera['status'] = 'connected'
                     camera['last_frame'] = frame
                     
                     # Log de detección
-                    if person_count > 0:
-                        print(f"👥 {camera_name}: {person_count} personas, {chair_count} sillas ({camera['occupancy_rate']}% ocupación)")
+                    if camera['person_count'] > 0:
+                        print(f"👥 {camera_name}: {camera['person_count']} personas, {camera['chair_count']} sillas "
+                              f"({camera['occupancy_rate']}% ocupación, {camera['occupied_seats']} asientos ocupados)")
                     
                 else:
                     camera['status'] = 'no_frame'
@@ -135,18 +188,66 @@ class AttendanceDetector:
                 camera['status'] = f'error: {str(e)}'
                 time.sleep(5)  # Esperar antes de reintentar
     
-    def _count_objects(self, results, class_id):
-        """Contar objetos de una clase específica"""
-        count = 0
-        for result in results:
-            if result.boxes is not None and result.boxes.cls is not None:
-                for i, cls in enumerate(result.boxes.cls):
-                    if int(cls) == class_id:
-                        # Verificar confianza
-                        if result.boxes.conf[i] > 0.5:
-                            count += 1
-        return count
-    
+    def _update_occupancy(self, camera, persons):
+        """
+        occupancy_rate conserva su significado (personas / sillas, en %), que
+        es el que usan los dashboards y DailyReport. La ocupación por asiento
+        (asientos con alguien encima / asientos) va aparte en
+        seat_occupancy_rate.
+        """
+        # Ocupación por asiento: asignación persona -> asiento vectorizada
+        _, occupied = assign_seats(persons, camera['seat_map'], self.seat_overlap_threshold)
+        person_count = len(persons)
+        chair_count = len(camera['seat_map'])
+        camera['seat_occupancy'] = occupied
+        camera['occupied_seats'] = int(occupied.sum())
+        camera['person_count'] = person_count
+        camera['chair_count'] = chair_count
+        camera['occupancy_rate'] = round(person_count / chair_count * 100, 2) if chair_count else 0
+        camera['seat_occupancy_rate'] = (round(camera['occupied_seats'] / chair_count * 100, 2)
+                                         if chair_count else 0)
+
+    def _seat_map_stale(self, camera, frame):
+        """True si toca volver a detectar sillas (sin mapa, caducado o escena distinta)"""
+        if camera['seat_map_scene'] is None:
+            return True
+        if time.time() - camera['seat_map_time'] >= self.seat_map_interval:
+            return True
+        thumb = _scene_thumbnail(frame)
+        reference = camera['seat_map_scene']
+        if thumb.shape != reference.shape:
+            return True
+        changed = np.abs(thumb - reference) > 40
+        return float(changed.mean()) >= self.scene_change_threshold
+
+    def _update_seat_map(self, camera, frame, chairs, persons):
+        """
+        Sustituye el mapa de asientos por las sillas detectadas, conservando
+        los asientos anteriores que ahora no se ven porque hay alguien encima.
+        """
+        previous = camera['seat_map']
+        if len(previous):
+            seen = np.zeros(len(previous), dtype=bool)
+            if len(chairs):
+                seen = box_iou(previous, chairs).max(axis=1) >= 0.5
+            _, covered = assign_seats(persons, previous, self.seat_overlap_threshold)
+            chairs = np.concatenate([chairs, previous[~seen & covered]])
+        camera['seat_map'] = chairs.astype(np.float32, copy=False)
+        camera['seat_map_time'] = time.time()
+        camera['seat_map_scene'] = _scene_thumbnail(frame)
+
+    def get_seat_map(self, camera_name):
+        """Asientos de una cámara con su estado de ocupación"""
+        camera = self.cameras.get(camera_name)
+        if camera is None:
+            return []
+        seats = camera['seat_map'].astype(int).tolist()
+        occupancy = camera['seat_occupancy'].tolist()
+        if len(occupancy) != len(seats):
+            occupancy = [False] * len(seats)
+        return [{'seat': i, 'bbox': bbox, 'occupied': occupied}
+                for i, (bbox, occupied) in enumerate(zip(seats, occupancy))]
+
     def start_detection(self, camera_name):
         """Iniciar detección para una cámara específica"""
         if camera_name not in self.cameras:
@@ -175,6 +276,7 @@ class AttendanceDetector:
         """Iniciar todas las cámaras"""
         self.running = True
         started_count = 0
+        model_registry.warmup(self.weights)
         
         for camera_name in self.cameras.keys():
             if self.start_detection(camera_name):